@@ -0,0 +1,1120 @@
+#!/usr/bin/env python
+# -*- encoding: utf8 -*-
+"""benchmarks of indexing and search
+
+    python benchmark.py spimi [-f 1,10,100] [-b <budget MB>] [--in-memory]
+        peak memory and time of making inverted index by SPIMI over the
+        preprocessed cars corpus replicated some times
+
+    python benchmark.py ingest [-j <workers>]
+        files/sec, documents/sec and peak memory of parsing xml files of
+        data-set once by lxml and by pool of worker processes (0 for number
+        of cpu cores), same sha1 means same documents with same doc ids
+
+    python benchmark.py codecs [-f 1]
+        index size, time of writing index and decode throughput of posting
+        lists for each posting codec over the preprocessed cars corpus
+        replicated some times, same sha1 means same decoded postings
+
+    python benchmark.py maxscore [-q <query>]... [-k 10] [-n 20]
+                                 [--scorer=bm25|tfidf]
+        postings scored and latency of exhaustive and MaxScore ranked
+        retrieval over data-files/inverted-index.bin
+
+    python benchmark.py wildcard [-q <pattern>]... [-n 20]
+        build time and latency of k-gram wildcard index against aho-corasick
+        automaton (prefix walk and regular expression filter) and linear scan
+        of vocabulary
+
+    python benchmark.py startup [-n 3]
+        seconds of loading index, spell checker, wildcard and fuzzy index on
+        cold start (caches made again) and warm start (caches loaded)
+
+    python benchmark.py fuzzy [-q <misspelled word>]... [-n 20]
+        corrections and latency of fuzzy spelling index against spell checker
+        for misspelled words of car reviews
+
+    python benchmark.py analyzer [-n 5000]
+        documents/sec of Analyzer over parsed cars corpus, whole pipeline
+        and tokenize/position/filter hot path
+
+    python benchmark.py vectorized [-q <query>]... [-k 10] [-n 20]
+                                   [--scorer=bm25|tfidf]
+        latency of ranking 1, 3 and 10 term queries by walking nested
+        dictionaries of inverted-index.json, by ranking.rank over binary
+        index and by numpy arrays (cold with arrays made from posting lists
+        and warm from cache), same means same documents
+
+    python benchmark.py stages [-f 1,10] [--stages=parse,preprocess,index]
+                               [-j <workers>] [-b <budget MB>] [--in-memory]
+                               [--json=<path>]
+        seconds, documents/sec and peak memory of each stage of making
+        inverted index over xml files of data-set replicated some times, each
+        stage runs in a child process; index stage reads replicated
+        preprocessed cars corpus if preprocess stage is not run
+
+    python benchmark.py queries [-c 1,4,16] [-n 5] [--kinds=term,wildcard,
+                                misspelled,ranked] [--server=<host:port>]
+                                [--cache] [--json=<path>]
+        p50/p95/p99 latency and queries/sec of replaying a workload of single
+        term, wildcard, misspelled and ranked queries by some concurrent
+        clients against loaded index or search server, result cache is
+        disabled unless --cache is given
+
+    results of stages and queries are written in json with commit of
+    repository by --json so runs of two commits can be compared
+
+    __author__ = "Erfan Rahnemoon"
+    __version__ = "0.0.1"
+    __maintainer__ = "Erfan Rahnemoon"
+    __email__ = "erfan@rahnemoon.name"
+"""
+import getopt
+import hashlib
+import json
+import math
+import os
+import random
+import resource
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+from multiprocessing.pool import ThreadPool
+
+import index_storage
+import inverted_index_maker
+import posting_codecs
+import ranking
+
+PATH_SOURCE = 'data-files/cars'
+PATH_PARSED = 'data-files/json_data/cars/parsed/'
+PATH_PREPROCESSED = 'data-files/json_data/cars/preprocessed/'
+PATH_INDEX = 'data-files/inverted-index.bin'
+PATH_INDEX_JSON = 'data-files/inverted-index.json'
+WILDCARD_QUERIES = ['*mobile', 'tran*ion', 'hy*r*d', 'comf*', '*ness',
+                    'c?r', '*ee*', 'eng*e', '?a*e?']
+MISSPELLED_QUERIES = ['transmision', 'acceleraton', 'milage', 'comfortible',
+                      'upholstry', 'suspention', 'hybird', 'reliabilty',
+                      'steerign', 'windsheild', 'convertable', 'warrenty',
+                      'delarship', 'engien', 'exellent', 'handeling',
+                      'interier', 'brakse']
+RANKED_QUERIES = ['car drive mileage', 'quiet cabin good mileage',
+                  'engine noise transmission problem', 'car drive',
+                  'great car comfortable seat gas mileage',
+                  'brake rattle dealer warranty repair']
+# queries of 1, 3 and 10 terms
+VECTORIZED_QUERIES = ['car', 'mileage', 'brake',
+                      'engine noise transmission', 'quiet cabin seat',
+                      'dealer warranty problem',
+                      'great car comfortable seat gas mileage quiet cabin '
+                      'good drive',
+                      'engine noise transmission problem brake dealer '
+                      'warranty car drive mileage']
+SINGLE_TERM_QUERIES = ['mileage', 'transmission', 'noise', 'engine', 'seat',
+                       'brake', 'cabin', 'dealer', 'comfortable', 'warranty']
+# kind of query in workload: endpoint of search and its queries
+WORKLOAD = {'term': ('search', SINGLE_TERM_QUERIES),
+            'wildcard': ('wildcard', WILDCARD_QUERIES),
+            'misspelled': ('search', MISSPELLED_QUERIES),
+            'ranked': ('ranked', RANKED_QUERIES)}
+STAGES = ('parse', 'preprocess', 'index')
+
+
+def peak_rss():
+    """peak resident memory of this process
+
+    Returns:
+        int -- peak resident memory in KB
+    """
+
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+
+
+def peak_rss_children():
+    """peak resident memory of biggest waited child process of this process,
+    like worker processes of a pool
+
+    Returns:
+        int -- peak resident memory in KB
+    """
+
+    return resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss
+
+
+def git_commit():
+    """commit of repository which benchmark is run on
+
+    Returns:
+        (str, bool) -- hash of commit and if tracked files are changed, None
+        and None if it is not a git repository
+    """
+
+    with open(os.devnull, 'w') as devnull:
+        try:
+            commit = subprocess.check_output(['git', 'rev-parse', 'HEAD'],
+                                             stderr=devnull).strip()
+            changes = subprocess.check_output(
+                ['git', 'status', '--porcelain', '--untracked-files=no'],
+                stderr=devnull)
+        except (OSError, subprocess.CalledProcessError):
+            return None, None
+    return commit, bool(changes.strip())
+
+
+def write_report(path, name, options, results):
+    """write results of benchmark in json with commit of repository and time
+    of run, so results of two commits can be compared
+
+    Arguments:
+        path {str} -- path of json file
+        name {str} -- name of benchmark
+        options {dictionary} -- options of benchmark
+        results {list} -- results of benchmark
+    """
+
+    commit, changed = git_commit()
+    report = {'benchmark': name, 'commit': commit, 'changed': changed,
+              'time': time.strftime('%Y-%m-%dT%H:%M:%S'),
+              'python': sys.version.split()[0], 'options': options,
+              'results': results}
+    with open(path, 'w') as json_file:
+        json.dump(report, json_file, indent=2, sort_keys=True)
+    print 'results written in', path
+
+
+def iter_replicated_docs(factor, path_preproc=PATH_PREPROCESSED):
+    """yield preprocessed documents of corpus some times, doc ids of each copy
+    are shifted so they stay unique
+
+    Arguments:
+        factor {int} -- number of copies of corpus
+
+    Keyword Arguments:
+        path_preproc {str} -- path to preprocessed files
+        (default: {PATH_PREPROCESSED})
+
+    Returns:
+        generator -- preprocessed document dictionaries
+    """
+
+    max_doc_id = 0
+    for dic_doc in inverted_index_maker.iter_preprocessed_files(path_preproc):
+        max_doc_id = max(max_doc_id, int(dic_doc['doc_id']))
+    for copy in xrange(factor):
+        shift = copy * (max_doc_id + 1)
+        for dic_doc in inverted_index_maker.iter_preprocessed_files(
+                path_preproc):
+            dic_doc['doc_id'] = int(dic_doc['doc_id']) + shift
+            yield dic_doc
+
+
+def spimi_run(factor, memory_budget, in_memory):
+    """make inverted index of replicated corpus once and print statistics in
+    json, run in a child process so peak memory belongs to one run
+
+    Arguments:
+        factor {int} -- number of copies of corpus
+        memory_budget {int} -- memory budget of SPIMI in bytes
+        in_memory {bool} -- make index by in-memory dictionary instead of SPIMI
+    """
+
+    stats = {'docs': 0}
+
+    def counted(iter_docs):
+        for dic_doc in iter_docs:
+            stats['docs'] += 1
+            yield dic_doc
+
+    path_index = tempfile.mktemp(suffix='.bin', dir='data-files')
+    start = time.time()
+    try:
+        if in_memory:
+            inverted_index_maker.index_storage.write_binary_index(
+                inverted_index_maker.build_inverted_index(
+                    counted(iter_replicated_docs(factor))), path_index)
+        else:
+            inverted_index_maker.make_inverted_index_spimi(
+                counted(iter_replicated_docs(factor)), path_index,
+                memory_budget, 'data-files')
+        stats['seconds'] = time.time() - start
+        stats['index_bytes'] = os.path.getsize(path_index)
+    finally:
+        if os.path.exists(path_index):
+            os.remove(path_index)
+    stats['peak_rss_kb'] = peak_rss()
+    print json.dumps(stats)
+
+
+def spimi_benchmark(factors, memory_budget, in_memory):
+    """run spimi_run for each replication factor in a child process and print
+    table of results
+
+    Arguments:
+        factors {list} -- replication factors of corpus
+        memory_budget {int} -- memory budget of SPIMI in bytes
+        in_memory {bool} -- make index by in-memory dictionary instead of SPIMI
+    """
+
+    if not os.path.isdir(PATH_PREPROCESSED):
+        print 'preprocessed files not found, run',
+        print 'search.py --stream --keep-artifacts -m first'
+        sys.exit(1)
+    print '{:>7} {:>10} {:>10} {:>14} {:>14}'.format(
+        'factor', 'docs', 'seconds', 'index MB', 'peak RSS MB')
+    for factor in factors:
+        command = [sys.executable, __file__, 'spimi-run', '-f', str(factor),
+                   '-b', str(memory_budget // (1024 * 1024))]
+        if in_memory:
+            command.append('--in-memory')
+        stats = json.loads(subprocess.check_output(command).splitlines()[-1])
+        print '{:>7} {:>10} {:>10.2f} {:>14.1f} {:>14.1f}'.format(
+            factor, stats['docs'], stats['seconds'],
+            stats['index_bytes'] / 1048576.0, stats['peak_rss_kb'] / 1024.0)
+
+
+def ingest_run(workers=None):
+    """parse all xml files of data-set once and print statistics in json, run
+    in a child process so peak memory belongs to one parser
+
+    Keyword Arguments:
+        workers {int} -- parse files by pool of this number of worker
+        processes, peak memory is of main process (default: {None})
+    """
+
+    import parser
+
+    dic_file_path = parser.get_all_file_by_path(PATH_SOURCE)
+    stats = {'files': sum(len(list_of_path)
+                          for list_of_path in dic_file_path.itervalues()),
+             'docs': 0}
+    digest = hashlib.sha1()
+    start = time.time()
+    for _, dic_doc in parser.iter_docs(dic_file_path, workers):
+        digest.update(json.dumps(dic_doc, sort_keys=True))
+        stats['docs'] += 1
+    stats['seconds'] = time.time() - start
+    stats['sha1'] = digest.hexdigest()
+    stats['peak_rss_kb'] = peak_rss()
+    print json.dumps(stats)
+
+
+def ingest_benchmark(workers):
+    """run ingest_run once and by pool of worker processes in a child process
+    and print table of results, same sha1 means both give same documents
+
+    Arguments:
+        workers {int} -- number of worker processes of pool, 0 for number of
+        cpu cores
+    """
+
+    if not os.path.isdir(PATH_SOURCE):
+        print 'xml files of data-set not found in', PATH_SOURCE
+        sys.exit(1)
+    print '{:<14} {:>7} {:>8} {:>9} {:>10} {:>10} {:>12}  {}'.format(
+        'parser', 'files', 'docs', 'seconds', 'files/sec', 'docs/sec',
+        'peak RSS MB', 'sha1')
+    for name, options in (('lxml', []),
+                          ('lxml -j %d' % workers, ['-j', str(workers)])):
+        command = [sys.executable, __file__, 'ingest-run'] + options
+        stats = json.loads(subprocess.check_output(command).splitlines()[-1])
+        print '{:<14} {:>7} {:>8} {:>9.2f} {:>10.1f} {:>10.1f} {:>12.1f}' \
+            '  {}'.format(name, stats['files'], stats['docs'],
+                          stats['seconds'], stats['files'] / stats['seconds'],
+                          stats['docs'] / stats['seconds'],
+                          stats['peak_rss_kb'] / 1024.0, stats['sha1'][:12])
+
+
+def decode_postings(inverted_index):
+    """decode doc ids, term frequencies and positions of all posting lists
+
+    Arguments:
+        inverted_index {obj} -- reader of binary inverted index
+
+    Returns:
+        (int, int, str) -- number of decoded numbers, bytes of posting lists
+        and sha1 of decoded postings
+    """
+
+    numbers = 0
+    postings_bytes = 0
+    digest = hashlib.sha1()
+    for info in inverted_index.iter_term_infos():
+        postings = inverted_index.posting_list(info.term)
+        # doc ids, term frequencies and byte lengths of position blocks
+        numbers += 3 * len(postings)
+        postings_bytes += info.length
+        digest.update(info.term)
+        digest.update(str(postings.doc_ids))
+        for idx in xrange(len(postings)):
+            list_pos = postings.positions(idx)
+            numbers += len(list_pos)
+            digest.update(str(list_pos))
+    return numbers, postings_bytes, digest.hexdigest()
+
+
+def codecs_benchmark(factor):
+    """write inverted index of replicated corpus by each posting codec and
+    print table of index size, write time and decode throughput
+
+    Arguments:
+        factor {int} -- number of copies of corpus
+    """
+
+    if not os.path.isdir(PATH_PREPROCESSED):
+        print 'preprocessed files not found, run',
+        print 'search.py --stream --keep-artifacts -m first'
+        sys.exit(1)
+    inverted_index = inverted_index_maker.build_inverted_index(
+        iter_replicated_docs(factor))
+    print '{:<7} {:>10} {:>12} {:>9} {:>10} {:>14}  {}'.format(
+        'codec', 'index MB', 'postings MB', 'write s', 'decode s',
+        'M numbers/s', 'sha1')
+    for name in sorted(posting_codecs.CODECS,
+                       key=lambda name: posting_codecs.CODECS[name].codec_id):
+        path_index = tempfile.mktemp(suffix='.bin', dir='data-files')
+        try:
+            start = time.time()
+            index_storage.write_binary_index(inverted_index, path_index, name)
+            write_seconds = time.time() - start
+            index_bytes = os.path.getsize(path_index)
+            reader = index_storage.BinaryIndexReader(path_index)
+            start = time.time()
+            numbers, postings_bytes, sha1 = decode_postings(reader)
+            decode_seconds = time.time() - start
+            reader.close()
+        finally:
+            if os.path.exists(path_index):
+                os.remove(path_index)
+        print '{:<7} {:>10.2f} {:>12.2f} {:>9.2f} {:>10.2f} {:>14.2f}' \
+            '  {}'.format(name, index_bytes / 1048576.0,
+                          postings_bytes / 1048576.0, write_seconds,
+                          decode_seconds, numbers / decode_seconds / 1e6,
+                          sha1[:12])
+
+
+def time_call(function, repeats):
+    """run function some times and measure mean latency
+
+    Arguments:
+        function {function} -- function without argument
+        repeats {int} -- number of runs
+
+    Returns:
+        (obj, float) -- result of last run and mean latency in milliseconds
+    """
+
+    start = time.time()
+    for _ in xrange(repeats):
+        result = function()
+    return result, (time.time() - start) * 1000.0 / repeats
+
+
+def maxscore_benchmark(queries, k, repeats, scorer):
+    """compare exhaustive and MaxScore ranked retrieval for each query
+
+    Arguments:
+        queries {list} -- list of queries
+        k {int} -- number of results
+        repeats {int} -- number of runs of each query
+        scorer {str} -- name of scorer, bm25 or tfidf
+    """
+
+    inverted_index = index_storage.BinaryIndexReader(PATH_INDEX)
+    print '{:<40} {:>10} {:>10} {:>10} {:>10} {:>6}'.format(
+        'query', 'exh post', 'exh ms', 'max post', 'max ms', 'same')
+    for query in queries:
+        terms = ranking.query_terms(query)
+        exhaustive_stats = {}
+        pruned_stats = {}
+        exhaustive, exhaustive_ms = time_call(
+            lambda: ranking.rank(inverted_index, terms, k, scorer,
+                                 exhaustive_stats), repeats)
+        pruned, pruned_ms = time_call(
+            lambda: ranking.rank_maxscore(inverted_index, terms, k, scorer,
+                                          pruned_stats), repeats)
+        same = [doc_id for _, doc_id in exhaustive] == \
+            [doc_id for _, doc_id in pruned]
+        print '{:<40} {:>10} {:>10.2f} {:>10} {:>10.2f} {:>6}'.format(
+            query[:40], exhaustive_stats['postings_scored'], exhaustive_ms,
+            pruned_stats['postings_scored'], pruned_ms, str(same))
+
+
+def dict_rank(dic_index, inverted_index, doc_lengths, terms, k, scorer):
+    """rank documents by walking nested dictionaries of inverted index like
+    inverted-index.json, collection statistics are read from binary index
+
+    Arguments:
+        dic_index {dictionary} -- inverted index made by inverted_index_maker
+        inverted_index {obj} -- reader of binary inverted index
+        doc_lengths {dictionary} -- length of each doc id
+        terms {list} -- terms of query
+        k {int} -- number of results
+        scorer {str} -- name of scorer, bm25 or tfidf
+
+    Returns:
+        list -- (score, doc_id) of best documents sorted by score
+    """
+
+    idf_fun, weight_fun = ranking.term_scorer(scorer)
+    avg_doc_length = inverted_index.avg_doc_length
+    accumulators = {}
+    for term in terms:
+        entry = dic_index.get(term)
+        if entry is None:
+            continue
+        idf = idf_fun(inverted_index.num_docs, entry['number_of_doc'])
+        for dic_docs in entry['posting_list'].itervalues():
+            for doc_id, dic_posting in dic_docs.iteritems():
+                # doc ids are str in json
+                doc_id = int(doc_id)
+                accumulators[doc_id] = accumulators.get(doc_id, 0.0) + \
+                    idf * weight_fun(dic_posting['number_of_frequency'],
+                                     doc_lengths[doc_id], avg_doc_length)
+    return ranking.top_k(k, accumulators.iteritems())
+
+
+def vectorized_benchmark(queries, k, repeats, scorer):
+    """compare ranking by nested dictionaries, by ranking.rank and by numpy
+    arrays for queries of some terms
+
+    Arguments:
+        queries {list} -- list of queries
+        k {int} -- number of results
+        repeats {int} -- number of runs of each query
+        scorer {str} -- name of scorer, bm25 or tfidf
+    """
+
+    import vector_index
+
+    inverted_index = index_storage.BinaryIndexReader(PATH_INDEX)
+    if os.path.isfile(PATH_INDEX_JSON):
+        print 'nested dictionaries read from', PATH_INDEX_JSON
+        dic_index = inverted_index_maker.read_json(PATH_INDEX_JSON)
+    elif os.path.isdir(PATH_PREPROCESSED):
+        print 'nested dictionaries made from', PATH_PREPROCESSED
+        dic_index = inverted_index_maker.build_inverted_index(
+            inverted_index_maker.iter_preprocessed_files(PATH_PREPROCESSED))
+    else:
+        print 'inverted-index.json and preprocessed files not found, run',
+        print 'search.py --stream --keep-artifacts -m first'
+        sys.exit(1)
+    doc_lengths = dict((doc_id, length) for doc_id, _, length
+                       in inverted_index.iter_docs())
+    array_index = vector_index.ArrayIndex(inverted_index)
+    print '\n{:>5} {:<30} {:>8} {:>9} {:>9} {:>9} {:>9} {:>8} {:>5}'.format(
+        'terms', 'query', 'postings', 'dict ms', 'rank ms', 'cold ms',
+        'numpy ms', 'speedup', 'same')
+    for query in queries:
+        terms = ranking.query_terms(query)
+        stats = {}
+        walked, dict_ms = time_call(
+            lambda: dict_rank(dic_index, inverted_index, doc_lengths, terms,
+                              k, scorer), repeats)
+        ranked, rank_ms = time_call(
+            lambda: ranking.rank(inverted_index, terms, k, scorer), repeats)
+        array_index.array_cache.clear()
+        _, cold_ms = time_call(
+            lambda: vector_index.rank_vectorized(array_index, terms, k,
+                                                 scorer), 1)
+        vectorized, numpy_ms = time_call(
+            lambda: vector_index.rank_vectorized(array_index, terms, k,
+                                                 scorer, stats), repeats)
+        same = [doc_id for _, doc_id in walked] == \
+            [doc_id for _, doc_id in ranked] == \
+            [doc_id for _, doc_id in vectorized]
+        print '{:>5} {:<30} {:>8} {:>9.3f} {:>9.3f} {:>9.3f} {:>9.3f}' \
+            ' {:>8.1f} {:>5}'.format(
+                len(terms), query[:30], stats['postings_scored'], dict_ms,
+                rank_ms, cold_ms, numpy_ms, dict_ms / numpy_ms, str(same))
+
+
+def wildcard_benchmark(patterns, repeats):
+    """compare wildcard index with aho-corasick automaton and linear scan over
+    vocabulary of inverted index
+
+    Arguments:
+        patterns {list} -- wildcard patterns
+        repeats {int} -- number of runs of each pattern
+    """
+
+    import ahocorasick
+    import wildcard_index
+
+    def make_automaton(terms):
+        tree = ahocorasick.Automaton()
+        for idx, term in enumerate(terms):
+            tree.add_word(str(term), (idx, str(term)))
+        return tree
+
+    terms = index_storage.BinaryIndexReader(PATH_INDEX).keys()
+    tree, tree_ms = time_call(lambda: make_automaton(terms), 1)
+    kgram, kgram_ms = time_call(lambda: wildcard_index.KGramIndex(terms), 1)
+    print '{} terms, automaton made in {:.2f} ms,'.format(len(terms), tree_ms),
+    print 'k-gram index made in {:.2f} ms\n'.format(kgram_ms)
+
+    def automaton_expand(pattern):
+        regex = wildcard_index.pattern_regex(pattern)
+        return sorted(key for key in
+                      tree.keys(wildcard_index.literal_prefix(pattern))
+                      if regex.match(key))
+
+    def scan_expand(pattern):
+        regex = wildcard_index.pattern_regex(pattern)
+        return [term for term in terms if regex.match(term)]
+
+    print '{:<16} {:>8} {:>12} {:>12} {:>12} {:>6}'.format(
+        'pattern', 'terms', 'k-gram ms', 'automaton ms', 'scan ms', 'same')
+    for pattern in patterns:
+        expanded, expand_ms = time_call(lambda: kgram.expand(pattern), repeats)
+        walked, walk_ms = time_call(lambda: automaton_expand(pattern), repeats)
+        scanned, scan_ms = time_call(lambda: scan_expand(pattern), repeats)
+        print '{:<16} {:>8} {:>12.3f} {:>12.3f} {:>12.3f} {:>6}'.format(
+            pattern[:16], len(expanded), expand_ms, walk_ms, scan_ms,
+            str(expanded == walked == scanned))
+
+
+def fuzzy_benchmark(words, repeats):
+    """compare corrections and latency of fuzzy spelling index and spell
+    checker for misspelled words
+
+    Arguments:
+        words {list} -- misspelled words
+        repeats {int} -- number of runs of each word
+    """
+
+    import search
+
+    inverted_index = index_storage.BinaryIndexReader(PATH_INDEX)
+    spell, _, fuzzy_index, _ = search.load_dictionary_structures(
+        inverted_index)
+    print '{:<14} {:<14} {:>10} {:<14} {:>10}'.format(
+        'word', 'fuzzy', 'fuzzy ms', 'spell checker', 'spell ms')
+    for word in words:
+        suggested, fuzzy_ms = time_call(
+            lambda: fuzzy_index.lookup(
+                word, time_budget_ms=search.FUZZY_TIME_BUDGET_MS), repeats)
+        (corrected, _), spell_ms = time_call(
+            lambda: search.spell_checking(spell, word), repeats)
+        print '{:<14} {:<14} {:>10.3f} {:<14} {:>10.3f}'.format(
+            word, suggested[0][0] if suggested else '-', fuzzy_ms,
+            corrected, spell_ms)
+
+
+def startup_run(cold):
+    """load structures of search once and print time in json, run in a child
+    process so nothing is shared with other runs
+
+    Arguments:
+        cold {bool} -- make spell checker, wildcard and fuzzy index caches again
+    """
+
+    import search
+
+    start = time.time()
+    search.init(rebuild_cache=cold)
+    print json.dumps({'seconds': time.time() - start})
+
+
+def startup_benchmark(repeats):
+    """compare cold and warm start of search
+
+    Arguments:
+        repeats {int} -- number of runs of each start
+    """
+
+    if not index_storage.is_binary_index(PATH_INDEX):
+        print 'inverted index not found, run search.py -m first'
+        sys.exit(1)
+    print '{:<10} {:>10}'.format('start', 'seconds')
+    for name, cold in (('cold', True), ('warm', False)):
+        command = [sys.executable, __file__, 'startup-run']
+        if cold:
+            command.append('--cold')
+        for _ in xrange(repeats):
+            stats = json.loads(
+                subprocess.check_output(command).splitlines()[-1])
+            print '{:<10} {:>10.2f}'.format(name, stats['seconds'])
+
+
+def read_parsed_docs(limit):
+    """read documents of parsed files
+
+    Arguments:
+        limit {int} -- maximum number of documents
+
+    Returns:
+        list -- (root, dictionary of document) pairs
+    """
+
+    list_root_docs = []
+    for file_name in sorted(os.listdir(PATH_PARSED)):
+        for dic_doc in inverted_index_maker.read_json(PATH_PARSED + file_name):
+            if len(list_root_docs) == limit:
+                return list_root_docs
+            list_root_docs.append((file_name, dic_doc))
+    return list_root_docs
+
+
+def analyzer_benchmark(limit):
+    """documents/sec of Analyzer, whole pipeline of batch tagging and
+    normalization and tokenize/position/filter hot path
+
+    Arguments:
+        limit {int} -- number of documents to preprocess
+    """
+
+    import tokenizers_normalizer as tn
+
+    if not os.path.isdir(PATH_PARSED):
+        print 'parsed files not found, run parser.py first'
+        sys.exit(1)
+    tn.prepare_nltk()
+    list_root_docs = read_parsed_docs(limit)
+    analyzer = tn.Analyzer(tn.read_stop_word(tn.PATH_STOP_WORDS))
+    tn.wordnet.ensure_loaded()
+    batches = [list_root_docs[start:start + tn.TAG_BATCH_SIZE]
+               for start in xrange(0, len(list_root_docs), tn.TAG_BATCH_SIZE)]
+
+    def analyzer_pipeline():
+        for batch in batches:
+            analyzer.preprocess_documents([dic_doc for _, dic_doc in batch],
+                                          batch[0][0])
+
+    def analyzer_hot_path():
+        stop_words = analyzer.stop_words
+        for _, dic_doc in list_root_docs:
+            [token for token in analyzer.tokenize(dic_doc)
+             if token.text not in stop_words]
+
+    print '{:<30} {:>12} {:>12}'.format('path', 'seconds', 'docs/sec')
+    for name, function in (('analyzer pipeline', analyzer_pipeline),
+                           ('analyzer hot path', analyzer_hot_path)):
+        tn.LEMMA_CACHE.clear()
+        _, elapsed = time_call(function, 1)
+        print '{:<30} {:>12.2f} {:>12.1f}'.format(
+            name, elapsed / 1000.0, len(list_root_docs) / (elapsed / 1000.0))
+
+
+def replicate_corpus(factor, path_corpus, path_source=PATH_SOURCE):
+    """make data-set replicated some times by symbolic links to its xml
+    files, copies of a file are in directory of its year so documents of a
+    year are still in one parsed file
+
+    Arguments:
+        factor {int} -- number of copies of data-set
+        path_corpus {str} -- directory of replicated data-set
+
+    Keyword Arguments:
+        path_source {str} -- path to xml files of data-set
+        (default: {PATH_SOURCE})
+    """
+
+    for year in sorted(os.listdir(path_source)):
+        path_year = os.path.join(path_source, year)
+        if not os.path.isdir(path_year):
+            continue
+        os.makedirs(os.path.join(path_corpus, year))
+        for file_name in sorted(os.listdir(path_year)):
+            path_file = os.path.abspath(os.path.join(path_year, file_name))
+            for copy in xrange(factor):
+                os.symlink(path_file, os.path.join(
+                    path_corpus, year, '%s_%d' % (file_name, copy)))
+
+
+def count_docs(path_json):
+    """number of documents in json files of directory
+
+    Arguments:
+        path_json {str} -- directory of parsed or preprocessed files
+
+    Returns:
+        int -- number of documents
+    """
+
+    return sum(len(inverted_index_maker.read_json(
+        os.path.join(path_json, file_name)))
+        for file_name in os.listdir(path_json))
+
+
+def stage_run(stage, path_work, factor, workers, memory_budget, in_memory):
+    """run one stage of making inverted index over replicated data-set in
+    work directory and print statistics in json, run in a child process so
+    peak memory belongs to one stage
+
+    Arguments:
+        stage {str} -- parse, preprocess or index
+        path_work {str} -- work directory of replicated data-set
+        factor {int} -- number of copies of data-set
+        workers {int} -- number of worker processes of parse and preprocess,
+        None for default of each stage
+        memory_budget {int} -- memory budget of SPIMI in bytes
+        in_memory {bool} -- make index by in-memory dictionary instead of SPIMI
+    """
+
+    path_json = os.path.join(path_work, 'json') + '/'
+    stats = {'docs': 0}
+
+    def counted(iter_docs):
+        for dic_doc in iter_docs:
+            stats['docs'] += 1
+            yield dic_doc
+
+    start = time.time()
+    if stage == 'parse':
+        import parser
+
+        os.mkdir(path_json)
+        parser.parsing(os.path.join(path_work, 'cars'), path_json + 'parsed',
+                       workers)
+    elif stage == 'preprocess':
+        import tokenizers_normalizer
+
+        tokenizers_normalizer.make_preprocessed_file(workers, path_json)
+    elif stage == 'index':
+        path_index = os.path.join(path_work, 'inverted-index.bin')
+        if os.path.isdir(path_json + 'preprocessed'):
+            iter_docs = inverted_index_maker.iter_preprocessed_files(
+                path_json + 'preprocessed/')
+        else:
+            iter_docs = iter_replicated_docs(factor)
+        if in_memory:
+            index_storage.write_binary_index(
+                inverted_index_maker.build_inverted_index(counted(iter_docs)),
+                path_index)
+        else:
+            inverted_index_maker.make_inverted_index_spimi(
+                counted(iter_docs), path_index, memory_budget, path_work)
+    else:
+        raise ValueError('unknown stage: %s' % stage)
+    stats['seconds'] = time.time() - start
+    stats['peak_rss_kb'] = peak_rss()
+    stats['workers_peak_rss_kb'] = peak_rss_children()
+    if stage == 'index':
+        stats['index_bytes'] = os.path.getsize(path_index)
+    else:
+        stats['docs'] = count_docs(path_json + {
+            'parse': 'parsed', 'preprocess': 'preprocessed'}[stage])
+    print json.dumps(stats)
+
+
+def stages_benchmark(factors, stages, workers, memory_budget, in_memory):
+    """replicate data-set for each replication factor and run each stage of
+    making inverted index in a child process, print table of results
+
+    Arguments:
+        factors {list} -- replication factors of data-set
+        stages {list} -- stages to run in order, parse, preprocess and index
+        workers {int} -- number of worker processes of parse and preprocess
+        memory_budget {int} -- memory budget of SPIMI in bytes
+        in_memory {bool} -- make index by in-memory dictionary instead of SPIMI
+
+    Returns:
+        list -- statistics of each stage for each factor
+    """
+
+    if not os.path.isdir(PATH_SOURCE):
+        print 'xml files of data-set not found in', PATH_SOURCE
+        sys.exit(1)
+    if 'index' in stages and 'preprocess' not in stages and \
+            not os.path.isdir(PATH_PREPROCESSED):
+        print 'preprocessed files not found, run',
+        print 'search.py --stream --keep-artifacts -m first'
+        sys.exit(1)
+    print '{:>7} {:<11} {:>9} {:>9} {:>10} {:>12} {:>14}'.format(
+        'factor', 'stage', 'docs', 'seconds', 'docs/sec', 'peak RSS MB',
+        'workers RSS MB')
+    results = []
+    for factor in factors:
+        path_work = tempfile.mkdtemp(prefix='benchmark-', dir='data-files')
+        try:
+            replicate_corpus(factor, os.path.join(path_work, 'cars'))
+            for stage in stages:
+                command = [sys.executable, __file__, 'stage-run',
+                           '--stage=' + stage, '--work=' + path_work,
+                           '-f', str(factor),
+                           '-b', str(memory_budget // (1024 * 1024))]
+                if workers is not None:
+                    command += ['-j', str(workers)]
+                if in_memory:
+                    command.append('--in-memory')
+                stats = json.loads(
+                    subprocess.check_output(command).splitlines()[-1])
+                stats.update(factor=factor, stage=stage,
+                             docs_per_sec=stats['docs'] / stats['seconds'])
+                results.append(stats)
+                print '{:>7} {:<11} {:>9} {:>9.2f} {:>10.1f} {:>12.1f}' \
+                    ' {:>14.1f}'.format(
+                        factor, stage, stats['docs'], stats['seconds'],
+                        stats['docs_per_sec'], stats['peak_rss_kb'] / 1024.0,
+                        stats['workers_peak_rss_kb'] / 1024.0)
+        finally:
+            shutil.rmtree(path_work)
+    return results
+
+
+def make_workload(kinds, rounds):
+    """list of queries of workload, queries of all kinds are shuffled by a
+    fixed seed so every run replays the same order
+
+    Arguments:
+        kinds {list} -- kinds of queries, keys of WORKLOAD
+        rounds {int} -- number of times each query is asked
+
+    Returns:
+        list -- (kind, endpoint, query) tuples
+    """
+
+    workload = [(kind, WORKLOAD[kind][0], query)
+                for _ in xrange(rounds)
+                for kind in kinds for query in WORKLOAD[kind][1]]
+    random.Random(0).shuffle(workload)
+    return workload
+
+
+def percentile(sorted_values, percent):
+    """nearest-rank percentile
+
+    Arguments:
+        sorted_values {list} -- sorted values, not empty
+        percent {float} -- percentile between 0 and 100
+
+    Returns:
+        float -- value which percent of values are not bigger than it
+    """
+
+    rank = int(math.ceil(percent / 100.0 * len(sorted_values)))
+    return sorted_values[max(rank - 1, 0)]
+
+
+def latency_stats(latencies):
+    """summary of latencies of queries
+
+    Arguments:
+        latencies {list} -- latencies in milliseconds
+
+    Returns:
+        dictionary -- number of queries, mean, p50, p95, p99 and max latency
+        in milliseconds
+    """
+
+    latencies = sorted(latencies)
+    return {'queries': len(latencies),
+            'mean_ms': sum(latencies) / len(latencies),
+            'p50_ms': percentile(latencies, 50),
+            'p95_ms': percentile(latencies, 95),
+            'p99_ms': percentile(latencies, 99),
+            'max_ms': latencies[-1]}
+
+
+def queries_benchmark(kinds, rounds, concurrencies, server, cache):
+    """replay workload of queries by some concurrent clients for each
+    concurrency and print table of latency percentiles and queries/sec
+
+    Arguments:
+        kinds {list} -- kinds of queries, keys of WORKLOAD
+        rounds {int} -- number of times each query is asked
+        concurrencies {list} -- numbers of concurrent clients
+        server {str} -- address of search server as host:port, None to
+        answer queries in this process
+        cache {bool} -- keep result cache, otherwise it is disabled so each
+        query is answered by index
+
+    Returns:
+        list -- statistics of each concurrency
+    """
+
+    import search
+
+    for kind in kinds:
+        if kind not in WORKLOAD:
+            print 'unknown kind of query:', kind
+            sys.exit(2)
+    if server is None:
+        if not cache:
+            search.set_cache_sizes(result_bytes=0)
+        structures = search.init()
+
+        def ask(endpoint, query):
+            result = search.query_result(endpoint, {'q': query}, *structures)
+            return 'error' not in result
+    else:
+        def ask(endpoint, query):
+            return search.query_server(server, endpoint,
+                                       {'q': query}) is not None
+
+    def timed(job):
+        kind, endpoint, query = job
+        start = time.time()
+        answered = ask(endpoint, query)
+        return kind, (time.time() - start) * 1000.0, answered
+
+    # load lazy structures like analyzer before latencies are measured
+    for job in make_workload(kinds, 1):
+        timed(job)
+    workload = make_workload(kinds, rounds)
+    print '{:>6} {:<11} {:>8} {:>7} {:>9} {:>9} {:>9} {:>9} {:>9}'.format(
+        'conc', 'kind', 'queries', 'errors', 'p50 ms', 'p95 ms', 'p99 ms',
+        'max ms', 'QPS')
+    results = []
+    for concurrency in concurrencies:
+        pool = ThreadPool(concurrency)
+        try:
+            start = time.time()
+            answers = pool.map(timed, workload, chunksize=1)
+            seconds = time.time() - start
+        finally:
+            pool.close()
+            pool.join()
+        stats = latency_stats([latency for _, latency, _ in answers])
+        stats.update(concurrency=concurrency, seconds=seconds,
+                     qps=len(answers) / seconds,
+                     errors=sum(1 for _, _, answered in answers
+                                if not answered),
+                     kinds={})
+        for kind in kinds:
+            kind_answers = [answer for answer in answers if answer[0] == kind]
+            stats['kinds'][kind] = latency_stats(
+                [latency for _, latency, _ in kind_answers])
+            stats['kinds'][kind]['errors'] = sum(
+                1 for _, _, answered in kind_answers if not answered)
+        results.append(stats)
+        for kind, kind_stats, qps in \
+                [(kind, stats['kinds'][kind], '') for kind in kinds] + \
+                [('all', stats, '{:.1f}'.format(stats['qps']))]:
+            print '{:>6} {:<11} {:>8} {:>7} {:>9.2f} {:>9.2f} {:>9.2f}' \
+                ' {:>9.2f} {:>9}'.format(
+                    concurrency, kind, kind_stats['queries'],
+                    kind_stats['errors'], kind_stats['p50_ms'],
+                    kind_stats['p95_ms'], kind_stats['p99_ms'],
+                    kind_stats['max_ms'], qps)
+    return results
+
+
+def main(argv):
+    """run benchmark which its name is first argument
+
+    Arguments:
+        argv {list} -- argument read from terminal
+    """
+
+    if not argv:
+        print __doc__
+        sys.exit(2)
+    name = argv[0]
+    try:
+        opts, _ = getopt.getopt(argv[1:], 'f:b:q:k:n:j:c:',
+                                ['factors=', 'budget=', 'in-memory',
+                                 'query=', 'top=', 'repeats=', 'scorer=',
+                                 'cold', 'jobs=', 'stages=',
+                                 'stage=', 'work=', 'concurrency=', 'kinds=',
+                                 'server=', 'cache', 'json='])
+    except getopt.GetoptError:
+        print __doc__
+        sys.exit(2)
+    factors = None
+    memory_budget = 32 * 1024 * 1024
+    in_memory = False
+    queries = []
+    top_k = 10
+    repeats = None
+    scorer = 'bm25'
+    cold = False
+    workers = None
+    stages = list(STAGES)
+    stage = None
+    path_work = None
+    concurrencies = [1, 4, 16]
+    kinds = ['term', 'wildcard', 'misspelled', 'ranked']
+    server = None
+    cache = False
+    path_json = None
+    for opt, arg in opts:
+        if opt in ('-f', '--factors'):
+            factors = [int(factor) for factor in arg.split(',')]
+        elif opt in ('-b', '--budget'):
+            memory_budget = int(arg) * 1024 * 1024
+        elif opt == '--in-memory':
+            in_memory = True
+        elif opt in ('-q', '--query'):
+            queries.append(arg)
+        elif opt in ('-k', '--top'):
+            top_k = int(arg)
+        elif opt in ('-n', '--repeats'):
+            repeats = int(arg)
+        elif opt == '--scorer':
+            scorer = arg
+        elif opt == '--cold':
+            cold = True
+        elif opt in ('-j', '--jobs'):
+            workers = int(arg)
+        elif opt == '--stages':
+            stages = [item for item in STAGES if item in arg.split(',')]
+        elif opt == '--stage':
+            stage = arg
+        elif opt == '--work':
+            path_work = arg
+        elif opt in ('-c', '--concurrency'):
+            concurrencies = [int(item) for item in arg.split(',')]
+        elif opt == '--kinds':
+            kinds = arg.split(',')
+        elif opt == '--server':
+            server = arg
+        elif opt == '--cache':
+            cache = True
+        elif opt == '--json':
+            path_json = arg
+    if name == 'spimi':
+        spimi_benchmark(factors or [1, 10, 100], memory_budget, in_memory)
+    elif name == 'spimi-run':
+        spimi_run(factors[0], memory_budget, in_memory)
+    elif name == 'ingest':
+        ingest_benchmark(workers or 0)
+    elif name == 'ingest-run':
+        ingest_run(workers)
+    elif name == 'codecs':
+        codecs_benchmark(factors[0] if factors and len(factors) == 1 else 1)
+    elif name == 'maxscore':
+        maxscore_benchmark(queries or RANKED_QUERIES, top_k, repeats or 20,
+                           scorer)
+    elif name == 'vectorized':
+        vectorized_benchmark(queries or VECTORIZED_QUERIES, top_k,
+                             repeats or 20, scorer)
+    elif name == 'wildcard':
+        wildcard_benchmark(queries or WILDCARD_QUERIES, repeats or 20)
+    elif name == 'fuzzy':
+        fuzzy_benchmark(queries or MISSPELLED_QUERIES, repeats or 20)
+    elif name == 'startup':
+        startup_benchmark(repeats or 3)
+    elif name == 'startup-run':
+        startup_run(cold)
+    elif name == 'analyzer':
+        analyzer_benchmark(repeats or 5000)
+    elif name == 'stages':
+        results = stages_benchmark(factors or [1], stages, workers,
+                                   memory_budget, in_memory)
+        if path_json:
+            write_report(path_json, name,
+                         {'factors': factors or [1], 'stages': stages,
+                          'workers': workers, 'in_memory': in_memory,
+                          'budget_mb': memory_budget // (1024 * 1024)},
+                         results)
+    elif name == 'stage-run':
+        stage_run(stage, path_work, factors[0], workers, memory_budget,
+                  in_memory)
+    elif name == 'queries':
+        results = queries_benchmark(kinds, repeats or 5, concurrencies,
+                                    server, cache)
+        if path_json:
+            write_report(path_json, name,
+                         {'kinds': kinds, 'rounds': repeats or 5,
+                          'concurrencies': concurrencies, 'server': server,
+                          'cache': cache}, results)
+    else:
+        print __doc__
+        sys.exit(2)
+
+
+if __name__ == '__main__':
+    main(sys.argv[1:])
@@ -0,0 +1,381 @@
+#!/usr/bin/env python
+# -*- encoding: utf8 -*-
+"""boolean query with AND, OR, NOT and parentheses over binary inverted index
+query is parsed to a tree of operators and evaluated by sorted doc-id lists,
+conjunctions are intersected smallest first by galloping search; terms are
+normalized by analyzer of queries if it is given
+
+    grammar:
+        or_expr  := and_expr (OR and_expr)*
+        and_expr := not_expr ([AND] not_expr)*
+        not_expr := NOT not_expr | atom
+        atom     := term | "phrase" | "phrase"~distance | ( or_expr )
+
+    __author__ = "Erfan Rahnemoon"
+    __version__ = "0.0.1"
+    __maintainer__ = "Erfan Rahnemoon"
+    __email__ = "erfan@rahnemoon.name"
+"""
+import re
+from bisect import bisect_left
+
+import phrase_query
+
+TOKEN_PATTERN = re.compile(r'\s*("[^"]*"(?:~\d+)?|\(|\)|[^\s()"]+)')
+OPERATORS = ('AND', 'OR', 'NOT')
+
+
+class QuerySyntaxError(ValueError):
+    """error in syntax of boolean query
+    """
+
+
+def gallop(doc_ids, doc_id, low):
+    """find first index not less than doc_id by exponential search from low,
+    far jumps over posting list work like skip pointers
+
+    Arguments:
+        doc_ids {list} -- sorted doc ids
+        doc_id {int} -- target doc id
+        low {int} -- index to start search
+
+    Returns:
+        int -- index of first doc id not less than doc_id
+    """
+
+    step = 1
+    high = low
+    while high < len(doc_ids) and doc_ids[high] < doc_id:
+        low = high + 1
+        high += step
+        step <<= 1
+    return bisect_left(doc_ids, doc_id, low, min(high, len(doc_ids)))
+
+
+def intersect(first, second):
+    """intersection of two sorted doc-id lists, shorter list drives galloping
+    search in longer one
+
+    Arguments:
+        first {list} -- sorted doc ids
+        second {list} -- sorted doc ids
+
+    Returns:
+        list -- sorted doc ids in both lists
+    """
+
+    if len(first) > len(second):
+        first, second = second, first
+    result = []
+    idx = 0
+    for doc_id in first:
+        idx = gallop(second, doc_id, idx)
+        if idx == len(second):
+            break
+        if second[idx] == doc_id:
+            result.append(doc_id)
+    return result
+
+
+def union(first, second):
+    """union of two sorted doc-id lists
+
+    Arguments:
+        first {list} -- sorted doc ids
+        second {list} -- sorted doc ids
+
+    Returns:
+        list -- sorted doc ids in any list
+    """
+
+    result = []
+    idx_first = idx_second = 0
+    while idx_first < len(first) and idx_second < len(second):
+        if first[idx_first] < second[idx_second]:
+            result.append(first[idx_first])
+            idx_first += 1
+        elif first[idx_first] > second[idx_second]:
+            result.append(second[idx_second])
+            idx_second += 1
+        else:
+            result.append(first[idx_first])
+            idx_first += 1
+            idx_second += 1
+    result.extend(first[idx_first:])
+    result.extend(second[idx_second:])
+    return result
+
+
+def difference(first, second):
+    """doc ids of first list which are not in second list
+
+    Arguments:
+        first {list} -- sorted doc ids
+        second {list} -- sorted doc ids
+
+    Returns:
+        list -- sorted doc ids
+    """
+
+    result = []
+    idx = 0
+    for doc_id in first:
+        idx = gallop(second, doc_id, idx)
+        if idx == len(second) or second[idx] != doc_id:
+            result.append(doc_id)
+    return result
+
+
+class TermNode(object):
+    """leaf of query tree, documents contain a term
+    """
+
+    def __init__(self, term, analyzer=None, vocabulary=None):
+        self.term = term.lower()
+        self.analyzer = analyzer
+        self.vocabulary = vocabulary
+
+    def index_term(self, inverted_index):
+        """term as it is in index, normalized form is chosen from vocabulary
+        if it is given, like whole collection for a shard, or from inverted
+        index; term is kept if analyzer does not make exactly one term of it
+
+        Arguments:
+            inverted_index {obj} -- reader of inverted index
+
+        Returns:
+            str -- term
+        """
+
+        if self.analyzer is None:
+            return self.term
+        vocabulary = self.vocabulary
+        if vocabulary is None:
+            vocabulary = inverted_index
+        terms = self.analyzer.analyze_query(self.term, vocabulary)
+        return terms[0][0] if len(terms) == 1 else self.term
+
+    def estimate(self, inverted_index):
+        """estimated number of result documents, used to order conjunctions
+        """
+
+        info = inverted_index.term_info(self.index_term(inverted_index))
+        return 0 if info is None else info.number_of_doc
+
+    def evaluate(self, inverted_index):
+        """sorted doc ids of documents match node
+        """
+
+        postings = inverted_index.posting_list(
+            self.index_term(inverted_index))
+        return [] if postings is None else postings.doc_ids
+
+    def __repr__(self):
+        return self.term
+
+
+class NotNode(object):
+    """documents do not match child
+    """
+
+    def __init__(self, child):
+        self.child = child
+
+    def estimate(self, inverted_index):
+        return inverted_index.num_docs - self.child.estimate(inverted_index)
+
+    def evaluate(self, inverted_index):
+        return difference(inverted_index.all_doc_ids(),
+                          self.child.evaluate(inverted_index))
+
+    def __repr__(self):
+        return '(NOT %r)' % self.child
+
+
+class AndNode(object):
+    """documents match all children, positive children are intersected
+    smallest first and negative children are subtracted at the end
+    """
+
+    def __init__(self, children):
+        self.children = children
+
+    def estimate(self, inverted_index):
+        return min(child.estimate(inverted_index) for child in self.children)
+
+    def evaluate(self, inverted_index):
+        positives = [child for child in self.children
+                     if not isinstance(child, NotNode)]
+        negatives = [child.child for child in self.children
+                     if isinstance(child, NotNode)]
+        if positives:
+            positives.sort(key=lambda child: child.estimate(inverted_index))
+            result = positives[0].evaluate(inverted_index)
+            for child in positives[1:]:
+                if not result:
+                    return []
+                result = intersect(result, child.evaluate(inverted_index))
+        else:
+            result = inverted_index.all_doc_ids()
+        for child in negatives:
+            if not result:
+                break
+            result = difference(result, child.evaluate(inverted_index))
+        return result
+
+    def __repr__(self):
+        return '(%s)' % ' AND '.join(repr(child) for child in self.children)
+
+
+class OrNode(object):
+    """documents match any child
+    """
+
+    def __init__(self, children):
+        self.children = children
+
+    def estimate(self, inverted_index):
+        return min(inverted_index.num_docs,
+                   sum(child.estimate(inverted_index)
+                       for child in self.children))
+
+    def evaluate(self, inverted_index):
+        result = []
+        for child in self.children:
+            result = union(result, child.evaluate(inverted_index))
+        return result
+
+    def __repr__(self):
+        return '(%s)' % ' OR '.join(repr(child) for child in self.children)
+
+
+def tokenize_query(query):
+    """split boolean query to parentheses, operators and terms
+
+    Arguments:
+        query {str} -- boolean query
+
+    Returns:
+        list -- tokens of query
+    """
+
+    return TOKEN_PATTERN.findall(query)
+
+
+class QueryParser(object):
+    """recursive descent parser of boolean query
+    """
+
+    def __init__(self, tokens, stop_words=(), analyzer=None, vocabulary=None):
+        self.tokens = tokens
+        self.stop_words = stop_words
+        self.analyzer = analyzer
+        self.vocabulary = vocabulary
+        self.idx = 0
+
+    def peek(self):
+        """token under parser or None at end of query
+        """
+
+        if self.idx < len(self.tokens):
+            return self.tokens[self.idx]
+        return None
+
+    def take(self):
+        """return token under parser and move to next one
+        """
+
+        token = self.peek()
+        self.idx += 1
+        return token
+
+    def parse(self):
+        """parse whole query
+
+        Returns:
+            obj -- root node of query tree
+        """
+
+        if self.peek() is None:
+            raise QuerySyntaxError('empty query')
+        node = self.parse_or()
+        if self.peek() is not None:
+            raise QuerySyntaxError('unexpected %r' % self.peek())
+        return node
+
+    def parse_or(self):
+        children = [self.parse_and()]
+        while self.peek() == 'OR':
+            self.take()
+            children.append(self.parse_and())
+        return children[0] if len(children) == 1 else OrNode(children)
+
+    def parse_and(self):
+        children = [self.parse_not()]
+        while self.peek() not in (None, 'OR', ')'):
+            if self.peek() == 'AND':
+                self.take()
+            children.append(self.parse_not())
+        return children[0] if len(children) == 1 else AndNode(children)
+
+    def parse_not(self):
+        if self.peek() == 'NOT':
+            self.take()
+            return NotNode(self.parse_not())
+        return self.parse_atom()
+
+    def parse_atom(self):
+        token = self.take()
+        if token is None:
+            raise QuerySyntaxError('unexpected end of query')
+        if token == '(':
+            node = self.parse_or()
+            if self.take() != ')':
+                raise QuerySyntaxError('missing )')
+            return node
+        if token == ')' or token in OPERATORS:
+            raise QuerySyntaxError('unexpected %r' % token)
+        if token.startswith('"'):
+            return phrase_query.PhraseNode(token, self.stop_words,
+                                           self.analyzer, self.vocabulary)
+        return TermNode(token, self.analyzer, self.vocabulary)
+
+
+def parse_query(query, stop_words=(), analyzer=None, vocabulary=None):
+    """parse boolean query to tree of operators
+
+    Arguments:
+        query {str} -- boolean query like "engine AND (noise OR rattle)"
+
+    Keyword Arguments:
+        stop_words {list} -- stop words removed from phrases (default: {()})
+        analyzer {obj} -- analyzer of queries which normalizes terms
+        (default: {None})
+        vocabulary {obj} -- terms which normalized form of terms is chosen
+        from, None for index which query is evaluated on (default: {None})
+
+    Returns:
+        obj -- root node of query tree
+    """
+
+    return QueryParser(tokenize_query(query), stop_words, analyzer,
+                       vocabulary).parse()
+
+
+def boolean_search(inverted_index, query, stop_words=(), analyzer=None):
+    """evaluate boolean query
+
+    Arguments:
+        inverted_index {obj} -- reader of inverted index
+        query {str} -- boolean query
+
+    Keyword Arguments:
+        stop_words {list} -- stop words removed from phrases (default: {()})
+        analyzer {obj} -- analyzer of queries which normalizes terms
+        (default: {None})
+
+    Returns:
+        list -- sorted doc ids of documents match query
+    """
+
+    return parse_query(query, stop_words, analyzer).evaluate(inverted_index)
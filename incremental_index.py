@@ -0,0 +1,459 @@
+#!/usr/bin/env python
+# -*- encoding: utf8 -*-
+"""incremental indexing of new and changed xml files of data-set
+
+a manifest keeps modification time, size, hash and range of doc ids of each
+indexed xml file. update finds new, changed and removed files, parses and
+preprocesses just new and changed ones to a new segment (a small binary
+inverted index) and gives their documents new doc ids after the biggest one,
+so doc ids of unchanged files never change. documents of changed and removed
+files are marked deleted. segments are merged with inverted index and
+deleted documents are purged in background; merged index replaces old one at
+once so searches never see a half written index
+
+    python incremental_index.py --update [--foreground]
+                                [--memory-budget=<MB>]
+    python incremental_index.py --merge
+
+    __author__ = "Erfan Rahnemoon"
+    __version__ = "0.0.1"
+    __maintainer__ = "Erfan Rahnemoon"
+    __email__ = "erfan@rahnemoon.name"
+"""
+import errno
+import getopt
+import hashlib
+import heapq
+import itertools
+import json
+import os
+import subprocess
+import sys
+import time
+
+import index_storage
+import inverted_index_maker
+import parser
+import posting_codecs
+import tokenizers_normalizer
+
+PATH_SOURCE = 'data-files/cars'
+PATH_INDEX = 'data-files/inverted-index.bin'
+PATH_MANIFEST = 'data-files/index-manifest.json'
+PATH_SEGMENTS = 'data-files/segments'
+LOCK_POLL = 0.1
+
+
+class FileLock(object):
+    """lock between processes by a file which is created exclusively and has
+    pid of owner, lock of a process which is not running anymore is removed
+    """
+
+    def __init__(self, path):
+        self.path = path
+
+    def __enter__(self):
+        while True:
+            try:
+                descriptor = os.open(self.path,
+                                     os.O_CREAT | os.O_EXCL | os.O_WRONLY)
+            except OSError as e:
+                if e.errno != errno.EEXIST:
+                    raise
+                if not self._owner_running():
+                    self._remove()
+                else:
+                    time.sleep(LOCK_POLL)
+                continue
+            os.write(descriptor, str(os.getpid()))
+            os.close(descriptor)
+            return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self._remove()
+
+    def _owner_running(self):
+        try:
+            with open(self.path, 'r') as reader:
+                pid = int(reader.read() or 0)
+        except (IOError, ValueError):
+            # lock is just created and pid is not written yet
+            return True
+        if not pid:
+            return True
+        try:
+            os.kill(pid, 0)
+        except OSError as e:
+            return e.errno != errno.ESRCH
+        return True
+
+    def _remove(self):
+        try:
+            os.remove(self.path)
+        except OSError as e:
+            if e.errno != errno.ENOENT:
+                raise
+
+
+def new_manifest():
+    """manifest of index which has no document yet, replace_index means
+    merge must not keep documents of current inverted index since they are
+    not in manifest
+
+    Returns:
+        dictionary -- empty manifest
+    """
+
+    return {'next_doc_id': 0, 'next_segment': 0, 'files': {},
+            'segments': [], 'deleted': [], 'replace_index': True}
+
+
+def read_manifest(path_manifest=PATH_MANIFEST):
+    """read manifest of incremental index
+
+    Keyword Arguments:
+        path_manifest {str} -- path to manifest (default: {PATH_MANIFEST})
+
+    Returns:
+        dictionary -- manifest or empty manifest if there is no manifest
+    """
+
+    if not os.path.isfile(path_manifest):
+        return new_manifest()
+    with open(path_manifest, 'r') as reader:
+        return json.load(reader)
+
+
+def write_manifest(manifest, path_manifest=PATH_MANIFEST):
+    """write manifest of incremental index, manifest is replaced at once
+
+    Arguments:
+        manifest {dictionary} -- manifest
+
+    Keyword Arguments:
+        path_manifest {str} -- path to manifest (default: {PATH_MANIFEST})
+    """
+
+    with open(path_manifest + '.tmp', 'w') as writer:
+        json.dump(manifest, writer, indent=1, sort_keys=True)
+    os.rename(path_manifest + '.tmp', path_manifest)
+
+
+def file_hash(path):
+    """sha1 of content of file
+
+    Arguments:
+        path {str} -- path to file
+
+    Returns:
+        str -- hex digest
+    """
+
+    digest = hashlib.sha1()
+    with open(path, 'rb') as reader:
+        for chunk in iter(lambda: reader.read(1 << 20), ''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def scan_source_files(base_source_path=PATH_SOURCE):
+    """all xml files of data-set in sorted order
+
+    Keyword Arguments:
+        base_source_path {str} -- path to xml files of data-set
+        (default: {PATH_SOURCE})
+
+    Returns:
+        list -- (directory name, path) of each xml file
+    """
+
+    dic_file = parser.get_all_file_by_path(base_source_path)
+    return [(name_directory, path)
+            for name_directory, list_of_path in sorted(dic_file.iteritems())
+            for path in list_of_path]
+
+
+def find_changes(manifest, source_files):
+    """find new, changed and removed files by modification time and size,
+    hash is computed just for files which time or size is changed so touched
+    files are not indexed again
+
+    Arguments:
+        manifest {dictionary} -- manifest of incremental index
+        source_files {list} -- (directory name, path) of each xml file
+
+    Returns:
+        list, list, dictionary -- (directory name, path, file entry) of new
+        and changed files, paths of removed files and new entries of touched
+        files
+    """
+
+    changed = []
+    touched = {}
+    for name_directory, path in source_files:
+        stat = os.stat(path)
+        entry = manifest['files'].get(path)
+        if entry is not None and entry['mtime'] == stat.st_mtime and \
+                entry['size'] == stat.st_size:
+            continue
+        new_entry = {'mtime': stat.st_mtime, 'size': stat.st_size,
+                     'sha1': file_hash(path)}
+        if entry is not None and entry['sha1'] == new_entry['sha1']:
+            new_entry['doc_ids'] = entry['doc_ids']
+            touched[path] = new_entry
+        else:
+            changed.append((name_directory, path, new_entry))
+    existing = set(path for _, path in source_files)
+    removed = [path for path in manifest['files'] if path not in existing]
+    return changed, removed, touched
+
+
+def iter_changed_docs(changed, manifest, deleted):
+    """parse changed files and yield their documents with new doc ids, entry
+    of each file in manifest is updated when its documents are yielded and
+    range of doc ids of its old version is added to deleted
+
+    Arguments:
+        changed {list} -- (directory name, path, file entry) of changed files
+        manifest {dictionary} -- manifest of incremental index
+        deleted {list} -- ranges of deleted doc ids as [first doc id, count]
+
+    Returns:
+        generator -- (root, dictionary of document) pairs
+    """
+
+    for name_directory, path, entry in changed:
+        first_doc_id = manifest['next_doc_id']
+        count = 0
+        for dic_doc in parser.iter_file_docs(path, first_doc_id):
+            count += 1
+            yield str(name_directory) + '.json', dic_doc
+        old_entry = manifest['files'].get(path)
+        if old_entry is not None:
+            deleted.append(old_entry['doc_ids'])
+        entry['doc_ids'] = [first_doc_id, count]
+        manifest['files'][path] = entry
+        manifest['next_doc_id'] = first_doc_id + count
+
+
+def update(base_source_path=PATH_SOURCE, path_manifest=PATH_MANIFEST,
+           memory_budget=None, background=True, path_index=PATH_INDEX):
+    """index new and changed files of data-set in a new segment and merge
+    segments with inverted index
+
+    Keyword Arguments:
+        base_source_path {str} -- path to xml files of data-set
+        (default: {PATH_SOURCE})
+        path_manifest {str} -- path to manifest (default: {PATH_MANIFEST})
+        memory_budget {int} -- if given make segment by SPIMI with this
+        memory budget in bytes (default: {None})
+        background {bool} -- merge in a background process
+        (default: {True})
+        path_index {str} -- path to binary inverted index which foreground
+        merge writes (default: {PATH_INDEX})
+    """
+
+    with FileLock(path_manifest + '.update.lock'):
+        manifest = read_manifest(path_manifest)
+        changed, removed, touched = find_changes(
+            manifest, scan_source_files(base_source_path))
+        if not changed and not removed and not touched:
+            print 'inverted index is up to date'
+            return
+        deleted = []
+        for path in removed:
+            deleted.append(manifest['files'].pop(path)['doc_ids'])
+        manifest['files'].update(touched)
+        segments = []
+        if changed:
+            if not os.path.isdir(PATH_SEGMENTS):
+                os.makedirs(PATH_SEGMENTS)
+            path_segment = os.path.join(
+                PATH_SEGMENTS, 'segment-%06d.bin' % manifest['next_segment'])
+            manifest['next_segment'] += 1
+            iter_preprocessed = tokenizers_normalizer.iter_preprocessed(
+                iter_changed_docs(changed, manifest, deleted))
+            if memory_budget:
+                inverted_index_maker.make_inverted_index_spimi(
+                    iter_preprocessed, path_segment, memory_budget,
+                    PATH_SEGMENTS)
+            else:
+                index_storage.write_binary_index(
+                    inverted_index_maker.build_inverted_index(
+                        iter_preprocessed), path_segment)
+            segments.append(path_segment)
+        # a merge may have changed segments and deleted meanwhile
+        with FileLock(path_manifest + '.lock'):
+            current = read_manifest(path_manifest)
+            for key in ('next_doc_id', 'next_segment', 'files'):
+                current[key] = manifest[key]
+            current['segments'].extend(segments)
+            current['deleted'].extend(deleted)
+            write_manifest(current, path_manifest)
+    print '{} new or changed and {} removed files'.format(len(changed),
+                                                          len(removed))
+    if background:
+        subprocess.Popen([sys.executable, os.path.abspath(__file__),
+                          '--merge'], close_fds=True)
+        print 'segments are merging in background'
+    else:
+        merge(path_index, path_manifest)
+
+
+def iter_reader_terms(reader, idx):
+    """iterate over terms of an index tagged by number of index
+
+    Arguments:
+        reader {obj} -- reader of binary inverted index
+        idx {int} -- number of index
+
+    Returns:
+        generator -- (term, idx, TermInfo) in sorted order of terms
+    """
+
+    for info in reader.iter_term_infos():
+        yield info.term, idx, info
+
+
+def merge_index_files(list_path, deleted, path_index):
+    """merge binary inverted indexes k-way by term and drop deleted documents,
+    token ids and posting codec of first index are kept and new terms take
+    next ids
+
+    Arguments:
+        list_path {list} -- paths to binary inverted indexes
+        deleted {set} -- deleted doc ids
+        path_index {str} -- path to merged binary inverted index
+    """
+
+    readers = [index_storage.BinaryIndexReader(path) for path in list_path]
+    codec = readers[0].codec.name if readers else \
+        posting_codecs.DEFAULT_CODEC
+    try:
+        with index_storage.BinaryIndexWriter(path_index, codec) as writer:
+            for reader in readers:
+                for doc_id, root, length in reader.iter_docs():
+                    if doc_id not in deleted:
+                        writer.add_doc(doc_id, root, length)
+            next_token_id = 0
+            if readers:
+                next_token_id = max([info.token_id for info
+                                     in readers[0].iter_term_infos()] or
+                                    [-1]) + 1
+            iter_terms = heapq.merge(*[iter_reader_terms(reader, idx)
+                                       for idx, reader in enumerate(readers)])
+            for term, group in itertools.groupby(iter_terms,
+                                                 key=lambda item: item[0]):
+                token_id = None
+                postings = []
+                for _, idx, info in group:
+                    if idx == 0:
+                        token_id = info.token_id
+                    posting_list = readers[idx].posting_list(term)
+                    for pos, doc_id in enumerate(posting_list.doc_ids):
+                        if doc_id not in deleted:
+                            postings.append((doc_id,
+                                             posting_list.positions(pos)))
+                if not postings:
+                    continue
+                if token_id is None:
+                    token_id = next_token_id
+                    next_token_id += 1
+                postings.sort()
+                writer.add_term(term, token_id, postings)
+    finally:
+        for reader in readers:
+            reader.close()
+
+
+def merge(path_index=PATH_INDEX, path_manifest=PATH_MANIFEST):
+    """merge segments of manifest with inverted index and purge deleted
+    documents, one merge runs at a time and updates can go on meanwhile
+
+    Keyword Arguments:
+        path_index {str} -- path to binary inverted index
+        (default: {PATH_INDEX})
+        path_manifest {str} -- path to manifest (default: {PATH_MANIFEST})
+    """
+
+    with FileLock(path_manifest + '.merge.lock'):
+        with FileLock(path_manifest + '.lock'):
+            manifest = read_manifest(path_manifest)
+        segments = list(manifest['segments'])
+        list_deleted = list(manifest['deleted'])
+        replace_index = manifest.get('replace_index', False)
+        if not segments and not list_deleted and not replace_index:
+            return
+        start = time.time()
+        deleted = set()
+        for first_doc_id, count in list_deleted:
+            deleted.update(xrange(first_doc_id, first_doc_id + count))
+        list_path = list(segments)
+        if not replace_index and index_storage.is_binary_index(path_index):
+            list_path.insert(0, path_index)
+        merge_index_files(list_path, deleted, path_index)
+        with FileLock(path_manifest + '.lock'):
+            current = read_manifest(path_manifest)
+            current['segments'] = [path for path in current['segments']
+                                   if path not in segments]
+            current['deleted'] = [doc_ids for doc_ids in current['deleted']
+                                  if doc_ids not in list_deleted]
+            current['replace_index'] = False
+            write_manifest(current, path_manifest)
+        for path in segments:
+            os.remove(path)
+    print '{} segments merged in {:.2f} s'.format(len(segments),
+                                                  time.time() - start)
+
+
+def reset(path_manifest=PATH_MANIFEST):
+    """forget manifest and unmerged segments, used when whole inverted index
+    is made again with doc ids which manifest does not know
+
+    Keyword Arguments:
+        path_manifest {str} -- path to manifest (default: {PATH_MANIFEST})
+    """
+
+    with FileLock(path_manifest + '.merge.lock'):
+        with FileLock(path_manifest + '.lock'):
+            manifest = read_manifest(path_manifest)
+            for path in manifest['segments']:
+                if os.path.isfile(path):
+                    os.remove(path)
+            if os.path.isfile(path_manifest):
+                os.remove(path_manifest)
+
+
+def main(argv):
+    """update or merge incremental index
+
+    Arguments:
+        argv {list} -- argument read from terminal
+    """
+
+    try:
+        opts, _ = getopt.getopt(argv, 'hum',
+                                ['help', 'update', 'merge', 'foreground',
+                                 'memory-budget='])
+    except getopt.GetoptError:
+        print __doc__
+        sys.exit(2)
+    memory_budget = None
+    background = True
+    for opt, arg in opts:
+        if opt == '--foreground':
+            background = False
+        elif opt == '--memory-budget':
+            memory_budget = int(arg) * 1024 * 1024
+    for opt, _ in opts:
+        if opt in ('-h', '--help'):
+            print __doc__
+            sys.exit()
+        elif opt in ('-u', '--update'):
+            update(memory_budget=memory_budget, background=background)
+        elif opt in ('-m', '--merge'):
+            merge()
+
+
+if __name__ == '__main__':
+    main(sys.argv[1:])
@@ -0,0 +1,200 @@
+#!/usr/bin/env python
+# -*- encoding: utf8 -*-
+"""export postings of inverted index as a table in tsv, csv or fixed-width
+text, one row per (token, document) written as soon as it is read so memory
+does not grow with size of index
+
+rows are token, token ID, doc ID, root file and term frequency, in order of
+tokens then doc ids; they can be limited to tokens start with a prefix or to
+documents of one root file. widths of fixed-width columns are found from
+term dictionary before writing, term frequency of a token in a document is
+never more than its frequency in corpus
+
+    __author__ = "Erfan Rahnemoon"
+    __version__ = "0.0.1"
+    __maintainer__ = "Erfan Rahnemoon"
+    __email__ = "erfan@rahnemoon.name"
+"""
+import csv
+import itertools
+import sys
+import time
+
+COLUMNS = ('token', 'token ID', 'doc ID', 'root file', 'term frequency')
+FORMATS = ('tsv', 'csv', 'fixed')
+EXTENSIONS = {'tsv': '.tsv', 'csv': '.csv', 'fixed': '.txt'}
+PROGRESS_INTERVAL = 1.0
+
+
+def column_widths(inverted_index, prefix='', root=None):
+    """width of each column of fixed-width table, read just term dictionary
+
+    Arguments:
+        inverted_index {obj} -- reader of inverted index
+
+    Keyword Arguments:
+        prefix {str} -- just tokens start with prefix (default: {''})
+        root {str} -- just documents of this root file (default: {None})
+
+    Returns:
+        list -- width of each column
+    """
+
+    widths = [len(column) for column in COLUMNS]
+    for info in inverted_index.iter_term_infos(prefix):
+        widths[0] = max(widths[0], len(info.term.decode('utf-8')))
+        widths[1] = max(widths[1], len(str(info.token_id)))
+        widths[4] = max(widths[4], len(str(info.frequency_token)))
+    doc_ids = inverted_index.all_doc_ids()
+    if len(doc_ids):
+        widths[2] = max(widths[2], len(str(doc_ids[-1])))
+    roots = [root] if root is not None else inverted_index.roots
+    widths[3] = max([widths[3]] + [len(name) for name in roots])
+    return widths
+
+
+def fixed_width_writer(stream, widths):
+    """make writer of rows in fixed-width columns, numbers are aligned right
+
+    Arguments:
+        stream {file} -- file to write in
+        widths {list} -- width of each column
+
+    Returns:
+        function -- write one row
+    """
+
+    template = u'{:<%d}  {:>%d}  {:>%d}  {:<%d}  {:>%d}\n' % tuple(widths)
+
+    def write_row(row):
+        stream.write(template.format(row[0].decode('utf-8'),
+                                     *row[1:]).encode('utf-8'))
+
+    stream.write(template.format(*COLUMNS).encode('utf-8'))
+    stream.write('  '.join('-' * width for width in widths) + '\n')
+    return write_row
+
+
+def delimited_writer(stream, delimiter):
+    """make writer of rows separated by delimiter, fields are quoted just if
+    they need
+
+    Arguments:
+        stream {file} -- file to write in
+        delimiter {str} -- ',' for csv or '\\t' for tsv
+
+    Returns:
+        function -- write one row
+    """
+
+    writer = csv.writer(stream, delimiter=delimiter, lineterminator='\n')
+    writer.writerow(COLUMNS)
+    return writer.writerow
+
+
+def make_row_writer(stream, fmt, inverted_index, prefix='', root=None):
+    """make writer of rows in format and write header of table
+
+    Arguments:
+        stream {file} -- file to write in
+        fmt {str} -- one of tsv, csv or fixed
+        inverted_index {obj} -- reader of inverted index
+
+    Keyword Arguments:
+        prefix {str} -- just tokens start with prefix (default: {''})
+        root {str} -- just documents of this root file (default: {None})
+
+    Returns:
+        function -- write one row
+    """
+
+    if fmt == 'tsv':
+        return delimited_writer(stream, '\t')
+    if fmt == 'csv':
+        return delimited_writer(stream, ',')
+    if fmt == 'fixed':
+        return fixed_width_writer(stream, column_widths(inverted_index,
+                                                        prefix, root))
+    raise ValueError('format must be one of %s' % ', '.join(FORMATS))
+
+
+def iter_term_rows(inverted_index, info, root=None):
+    """read posting list of one token and yield its rows
+
+    Arguments:
+        inverted_index {obj} -- reader of inverted index
+        info {TermInfo} -- information of token
+
+    Keyword Arguments:
+        root {str} -- just documents of this root file (default: {None})
+
+    Returns:
+        generator -- (token, token ID, doc ID, root file, term frequency)
+    """
+
+    postings = inverted_index.posting_list(info.term)
+    for doc_id, term_frequency in itertools.izip(postings.doc_ids,
+                                                 postings.tfs):
+        doc_root = inverted_index.doc_root(doc_id)
+        if root is None or doc_root == root:
+            yield info.term, info.token_id, doc_id, doc_root, term_frequency
+
+
+def report_progress(rows, terms, total_terms, start, done=False):
+    """write number of exported rows and tokens in stderr
+
+    Arguments:
+        rows {int} -- number of written rows
+        terms {int} -- number of exported tokens
+        total_terms {int} -- number of tokens to export
+        start {float} -- time export started
+
+    Keyword Arguments:
+        done {bool} -- export is finished (default: {False})
+    """
+
+    seconds = max(time.time() - start, 1e-6)
+    sys.stderr.write('\r{} rows, {}/{} tokens, {:.0f} rows/s'.format(
+        rows, terms, total_terms, rows / seconds))
+    if done:
+        sys.stderr.write('\n')
+    sys.stderr.flush()
+
+
+def export_postings(inverted_index, stream, fmt='tsv', prefix='', root=None,
+                    progress=True):
+    """write postings of inverted index in stream as table
+
+    Arguments:
+        inverted_index {obj} -- reader of inverted index
+        stream {file} -- file to write in
+
+    Keyword Arguments:
+        fmt {str} -- one of tsv, csv or fixed (default: {'tsv'})
+        prefix {str} -- just tokens start with prefix (default: {''})
+        root {str} -- just documents of this root file (default: {None})
+        progress {bool} -- report progress in stderr (default: {True})
+
+    Returns:
+        int -- number of written rows
+    """
+
+    if root is not None and root not in inverted_index.roots:
+        raise ValueError('root file must be one of %s'
+                         % ', '.join(inverted_index.roots))
+    write_row = make_row_writer(stream, fmt, inverted_index, prefix, root)
+    start_term, end_term = inverted_index.prefix_range(prefix)
+    total_terms = end_term - start_term
+    start = last_report = time.time()
+    rows = 0
+    terms = 0
+    for terms, info in enumerate(inverted_index.iter_term_infos(prefix), 1):
+        for row in iter_term_rows(inverted_index, info, root):
+            write_row(row)
+            rows += 1
+        if progress and time.time() - last_report >= PROGRESS_INTERVAL:
+            last_report = time.time()
+            report_progress(rows, terms, total_terms, start)
+    if progress:
+        report_progress(rows, terms, total_terms, start, done=True)
+    return rows
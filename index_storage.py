@@ -0,0 +1,638 @@
+#!/usr/bin/env python
+# -*- encoding: utf8 -*-
+"""binary on-disk inverted index, written by inverted_index_maker and read
+lazily by search through a memory-mapped reader
+
+layout of the file:
+    header       -- magic, version, id of posting codec and offsets of the
+                    other sections
+    postings     -- for each term: doc-id gaps, term frequencies, byte length
+                    of the position block of each doc, position gaps; numbers
+                    are encoded by posting codec of index (vbyte, gamma or
+                    pfor, see posting_codecs)
+    term strings -- utf-8 bytes of all terms, sorted
+    term entries -- fixed size records, one per term, sorted by term, with
+                    statistics of term and upper bound of its BM25 and TF-IDF
+                    weight in any document for dynamic pruning
+    doc table    -- sorted doc ids, id of their root file and their length
+                    (number of indexed tokens)
+    root table   -- names of root files
+
+    __author__ = "Erfan Rahnemoon"
+    __version__ = "0.0.1"
+    __maintainer__ = "Erfan Rahnemoon"
+    __email__ = "erfan@rahnemoon.name"
+"""
+import hashlib
+import mmap
+import os
+import struct
+from array import array
+from bisect import bisect_left
+from collections import namedtuple
+
+import posting_codecs
+import ranking
+from posting_codecs import decode_varint, encode_varint
+
+MAGIC = 'IRIX'
+VERSION = 3
+HEADER = struct.Struct('<4sHHIIQQQQQQ')
+TERM_ENTRY = struct.Struct('<IIIIIQIdd')
+
+TermInfo = namedtuple('TermInfo', ['term', 'token_id', 'number_of_doc',
+                                   'frequency_token', 'offset', 'length',
+                                   'max_bm25', 'max_tfidf'])
+
+
+class VarintFileReader(object):
+    """read varint numbers and bytes from a file sequentially through a
+    buffer, used for temporary files of index construction
+    """
+
+    def __init__(self, path, buffer_size=1 << 16):
+        self._reader = open(path, 'rb')
+        self._buffer_size = buffer_size
+        self._buf = bytearray()
+        self._offset = 0
+
+    def _fill(self, need):
+        if len(self._buf) - self._offset >= need:
+            return True
+        chunk = self._reader.read(max(self._buffer_size, need))
+        self._buf = self._buf[self._offset:] + bytearray(chunk)
+        self._offset = 0
+        return len(self._buf) >= need
+
+    def at_end(self):
+        """check all of file is read
+
+        Returns:
+            bool -- True if nothing remains in file
+        """
+
+        return not self._fill(1)
+
+    def read_varint(self):
+        """read one varint number
+
+        Returns:
+            int -- decoded number
+        """
+
+        self._fill(10)
+        number, self._offset = decode_varint(self._buf, self._offset)
+        return number
+
+    def read_bytes(self, length):
+        """read some bytes
+
+        Arguments:
+            length {int} -- number of bytes
+
+        Returns:
+            str -- bytes
+        """
+
+        self._fill(length)
+        data = str(self._buf[self._offset:self._offset + length])
+        self._offset += length
+        return data
+
+    def close(self):
+        """close file
+        """
+
+        self._reader.close()
+
+
+def encode_term(term):
+    """convert term to utf-8 bytes, terms are stored and compared as bytes
+
+    Arguments:
+        term {str} -- term as str or unicode
+
+    Returns:
+        str -- utf-8 bytes of term
+    """
+
+    if isinstance(term, unicode):
+        return term.encode('utf-8')
+    return term
+
+
+class PostingList(object):
+    """posting list of one term; doc ids and term frequencies are decoded
+    eagerly but positions of each doc decoded just when they are asked
+    """
+
+    def __init__(self, buf, number_of_doc, codec=posting_codecs.VByteCodec):
+        self._buf = buf
+        self._codec = codec
+        self.doc_ids, offset = codec.decode(buf, 0, number_of_doc)
+        for idx in xrange(1, number_of_doc):
+            self.doc_ids[idx] += self.doc_ids[idx - 1]
+        self.tfs, offset = codec.decode(buf, offset, number_of_doc)
+        block_lengths, offset = codec.decode(buf, offset, number_of_doc)
+        self._block_offsets = []
+        for length in block_lengths:
+            self._block_offsets.append(offset)
+            offset += length
+
+    def __len__(self):
+        return len(self.doc_ids)
+
+    def positions(self, idx):
+        """decode positions of idx-th doc of posting list
+
+        Arguments:
+            idx {int} -- index of doc in posting list (not doc id)
+
+        Returns:
+            list -- sorted positions of term in doc
+        """
+
+        list_pos, _ = self._codec.decode(self._buf, self._block_offsets[idx],
+                                         self.tfs[idx])
+        for i in xrange(1, len(list_pos)):
+            list_pos[i] += list_pos[i - 1]
+        return list_pos
+
+
+class BinaryIndexWriter(object):
+    """write binary inverted index streaming; terms must be added in sorted
+    order and just the term dictionary is kept in memory; documents must be
+    added before terms so upper bound of term weights can be computed. index
+    is written to a temporary file and renamed over path on close, so readers
+    which have old index memory-mapped, like search server, are not broken
+
+    upper bounds of term weights are computed by average length of documents
+    of index, or by avg_doc_length if given, like for a shard of a bigger
+    index which is scored by statistics of whole collection
+    """
+
+    def __init__(self, path, codec=posting_codecs.DEFAULT_CODEC,
+                 avg_doc_length=None):
+        self.path = path
+        self.codec = posting_codecs.get_codec(codec)
+        self._path_tmp = path + '.tmp'
+        self._writer = open(self._path_tmp, 'wb')
+        self._writer.write('\0' * HEADER.size)
+        self._offset = HEADER.size
+        self._entries = []
+        self._term_bytes = bytearray()
+        self._last_term = None
+        self._doc_ids = array('I')
+        self._doc_roots = array('I')
+        self._doc_lengths = array('I')
+        self._roots = []
+        self._root_ids = {}
+        self._docs_sorted = False
+        self._collection_avg_doc_length = avg_doc_length
+        self._avg_doc_length = 1.0
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        if exc_type is None:
+            self.close()
+        else:
+            self._writer.close()
+            os.remove(self._path_tmp)
+
+    def add_doc(self, doc_id, root, length=0):
+        """register document and its root file in doc table, each document
+        must be registered once and in order of doc ids if possible
+
+        Arguments:
+            doc_id {int} -- documnet ID
+            root {str} -- root file of document
+
+        Keyword Arguments:
+            length {int} -- number of indexed tokens of document (default: {0})
+        """
+
+        if self._last_term is not None:
+            raise ValueError('documents must be added before terms')
+        if root not in self._root_ids:
+            self._root_ids[root] = len(self._roots)
+            self._roots.append(root)
+        self._doc_ids.append(int(doc_id))
+        self._doc_roots.append(self._root_ids[root])
+        self._doc_lengths.append(length)
+
+    def add_term(self, term, token_id, postings):
+        """write posting list of a term
+
+        Arguments:
+            term {str} -- token
+            token_id {int} -- ID of token
+            postings {list} -- list of (doc_id, list_pos) sorted by doc_id
+        """
+
+        if not self._docs_sorted:
+            self._sort_docs()
+        term = encode_term(term)
+        if self._last_term is not None and term <= self._last_term:
+            raise ValueError('terms must be added in sorted order: %r' % term)
+        self._last_term = term
+        doc_gaps = []
+        tfs = []
+        block_lengths = []
+        pos_part = bytearray()
+        last_doc_id = 0
+        frequency_token = 0
+        max_bm25 = 0.0
+        max_tfidf = 0.0
+        for doc_id, list_pos in postings:
+            doc_id = int(doc_id)
+            doc_length = self._doc_length(doc_id)
+            max_bm25 = max(max_bm25, ranking.bm25_weight(
+                len(list_pos), doc_length, self._avg_doc_length))
+            max_tfidf = max(max_tfidf, ranking.tfidf_weight(
+                len(list_pos), doc_length, self._avg_doc_length))
+            doc_gaps.append(doc_id - last_doc_id)
+            last_doc_id = doc_id
+            tfs.append(len(list_pos))
+            block_start = len(pos_part)
+            pos_gaps = []
+            last_pos = 0
+            for pos in sorted(list_pos):
+                pos_gaps.append(pos - last_pos)
+                last_pos = pos
+            self.codec.encode(pos_gaps, pos_part)
+            block_lengths.append(len(pos_part) - block_start)
+            frequency_token += len(list_pos)
+        number_of_doc = len(doc_gaps)
+        head_part = bytearray()
+        for numbers in (doc_gaps, tfs, block_lengths):
+            self.codec.encode(numbers, head_part)
+        self._writer.write(head_part)
+        self._writer.write(pos_part)
+        length = len(head_part) + len(pos_part)
+        self._entries.append((len(self._term_bytes), len(term), token_id,
+                              number_of_doc, frequency_token, self._offset,
+                              length, max_bm25, max_tfidf))
+        self._term_bytes.extend(term)
+        self._offset += length
+
+    def _sort_docs(self):
+        doc_ids = self._doc_ids
+        if any(doc_ids[idx - 1] > doc_ids[idx]
+               for idx in xrange(1, len(doc_ids))):
+            docs = sorted(zip(doc_ids, self._doc_roots, self._doc_lengths))
+            self._doc_ids = array('I', [doc[0] for doc in docs])
+            self._doc_roots = array('I', [doc[1] for doc in docs])
+            self._doc_lengths = array('I', [doc[2] for doc in docs])
+        if self._collection_avg_doc_length:
+            self._avg_doc_length = self._collection_avg_doc_length
+        elif self._doc_ids:
+            self._avg_doc_length = float(sum(self._doc_lengths)) / \
+                len(self._doc_ids)
+        self._docs_sorted = True
+
+    def _doc_length(self, doc_id):
+        idx = bisect_left(self._doc_ids, doc_id)
+        if idx < len(self._doc_ids) and self._doc_ids[idx] == doc_id:
+            return self._doc_lengths[idx]
+        return self._avg_doc_length
+
+    def close(self):
+        """write term dictionary, doc table and root table, then header
+        """
+
+        strings_offset = self._offset
+        self._writer.write(self._term_bytes)
+        dict_offset = strings_offset + len(self._term_bytes)
+        for entry in self._entries:
+            self._writer.write(TERM_ENTRY.pack(*entry))
+        docs_offset = dict_offset + len(self._entries) * TERM_ENTRY.size
+        if not self._docs_sorted:
+            self._sort_docs()
+        doc_ids = self._doc_ids
+        doc_roots = self._doc_roots
+        doc_lengths = self._doc_lengths
+        self._writer.write(doc_ids.tostring())
+        self._writer.write(doc_roots.tostring())
+        self._writer.write(doc_lengths.tostring())
+        roots_offset = docs_offset + 12 * len(doc_ids)
+        root_part = bytearray()
+        for root in self._roots:
+            root = encode_term(root)
+            encode_varint(len(root), root_part)
+            root_part.extend(root)
+        self._writer.write(root_part)
+        self._writer.seek(0)
+        self._writer.write(HEADER.pack(MAGIC, VERSION, self.codec.codec_id,
+                                       len(self._entries), len(doc_ids),
+                                       HEADER.size, strings_offset,
+                                       dict_offset, docs_offset,
+                                       roots_offset, sum(doc_lengths)))
+        self._writer.close()
+        os.rename(self._path_tmp, self.path)
+
+
+def write_binary_index(inverted_index, path,
+                       codec=posting_codecs.DEFAULT_CODEC):
+    """write inverted index dictionary in binary format
+
+    Arguments:
+        inverted_index {dictionary} -- dictionary of tokens and posting-lists
+        path {str} -- path to binary index file
+
+    Keyword Arguments:
+        codec {str} -- posting codec, one of vbyte, gamma or pfor
+        (default: {posting_codecs.DEFAULT_CODEC})
+    """
+
+    dic_doc_root = {}
+    dic_doc_length = {}
+    for value in inverted_index.itervalues():
+        for root, dic_doc_id in value['posting_list'].iteritems():
+            for doc_id, posting in dic_doc_id.iteritems():
+                doc_id = int(doc_id)
+                dic_doc_root[doc_id] = root
+                dic_doc_length[doc_id] = dic_doc_length.get(doc_id, 0) + \
+                    posting['number_of_frequency']
+    with BinaryIndexWriter(path, codec) as writer:
+        for doc_id in sorted(dic_doc_root):
+            writer.add_doc(doc_id, dic_doc_root[doc_id],
+                           dic_doc_length[doc_id])
+        dic_doc_root = dic_doc_length = None
+        for term in sorted(inverted_index, key=encode_term):
+            value = inverted_index[term]
+            postings = []
+            for dic_doc_id in value['posting_list'].itervalues():
+                for doc_id, posting in dic_doc_id.iteritems():
+                    postings.append((int(doc_id), posting['list_pos']))
+            postings.sort()
+            writer.add_term(term, value['token_id'], postings)
+
+
+class BinaryIndexReader(object):
+    """memory-mapped reader of binary inverted index, term dictionary and
+    posting lists are read from file just when they are needed
+
+    reader behaves like dictionary of inverted index which made by
+    inverted_index_maker, so `token in reader` and `reader[token]` work
+    """
+
+    def __init__(self, path):
+        self.path = path
+        with open(path, 'rb') as reader:
+            self._mm = mmap.mmap(reader.fileno(), 0, access=mmap.ACCESS_READ)
+        (magic, version, codec_id, self.num_terms, self.num_docs,
+         self._postings_offset, self._strings_offset, self._dict_offset,
+         docs_offset, roots_offset, self.total_tokens) = \
+            HEADER.unpack_from(self._mm, 0)
+        if magic != MAGIC or version != VERSION:
+            raise ValueError('%s is not a binary inverted index' % path)
+        if codec_id not in posting_codecs.CODEC_IDS:
+            raise ValueError('%s has unknown posting codec %d' % (path,
+                                                                  codec_id))
+        self.codec = posting_codecs.CODEC_IDS[codec_id]
+        self._doc_ids = self._read_array(docs_offset)
+        self._doc_roots = self._read_array(docs_offset + 4 * self.num_docs)
+        self._doc_lengths = self._read_array(docs_offset + 8 * self.num_docs)
+        self.avg_doc_length = float(self.total_tokens) / max(self.num_docs, 1)
+        root_buf = bytearray(self._mm[roots_offset:])
+        self.roots = []
+        offset = 0
+        while offset < len(root_buf):
+            length, offset = decode_varint(root_buf, offset)
+            self.roots.append(str(root_buf[offset:offset + length]))
+            offset += length
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def _read_array(self, offset):
+        numbers = array('I')
+        numbers.fromstring(self._mm[offset:offset + 4 * self.num_docs])
+        return numbers
+
+    def close(self):
+        """close memory map of index file
+        """
+
+        self._mm.close()
+
+    def _entry(self, idx):
+        return TERM_ENTRY.unpack_from(self._mm,
+                                      self._dict_offset + idx * TERM_ENTRY.size)
+
+    def _term_at(self, idx):
+        entry = self._entry(idx)
+        start = self._strings_offset + entry[0]
+        return self._mm[start:start + entry[1]], entry
+
+    def _lower_bound(self, term):
+        low, high = 0, self.num_terms
+        while low < high:
+            mid = (low + high) // 2
+            if self._term_at(mid)[0] < term:
+                low = mid + 1
+            else:
+                high = mid
+        return low
+
+    def _find(self, term):
+        term = encode_term(term)
+        idx = self._lower_bound(term)
+        if idx < self.num_terms:
+            idx_term, entry = self._term_at(idx)
+            if idx_term == term:
+                return TermInfo(idx_term, *entry[2:])
+        return None
+
+    def prefix_range(self, prefix):
+        """range of indexes of sorted terms start with prefix
+
+        Arguments:
+            prefix {str} -- prefix of terms, empty for all terms
+
+        Returns:
+            (int, int) -- index of first term and index after last one
+        """
+
+        if not prefix:
+            return 0, self.num_terms
+        prefix = encode_term(prefix)
+        # utf-8 bytes are never 0xff, so it is after every term with prefix
+        return self._lower_bound(prefix), self._lower_bound(prefix + '\xff')
+
+    def term_info(self, term):
+        """statistics and place of posting list of term
+
+        Arguments:
+            term {str} -- token
+
+        Returns:
+            TermInfo -- information of term or None if term is not in index
+        """
+
+        return self._find(term)
+
+    def posting_list(self, term):
+        """read posting list of term
+
+        Arguments:
+            term {str} -- token
+
+        Returns:
+            PostingList -- posting list or None if term is not in index
+        """
+
+        info = self._find(term)
+        if info is None:
+            return None
+        return PostingList(bytearray(self._mm[info.offset:
+                                              info.offset + info.length]),
+                           info.number_of_doc, self.codec)
+
+    def doc_root(self, doc_id):
+        """root file of document
+
+        Arguments:
+            doc_id {int} -- documnet ID
+
+        Returns:
+            str -- name of root file
+        """
+
+        idx = bisect_left(self._doc_ids, doc_id)
+        if idx == len(self._doc_ids) or self._doc_ids[idx] != doc_id:
+            raise KeyError(doc_id)
+        return self.roots[self._doc_roots[idx]]
+
+    def doc_length(self, doc_id):
+        """number of indexed tokens of document
+
+        Arguments:
+            doc_id {int} -- documnet ID
+
+        Returns:
+            int -- length of document
+        """
+
+        idx = bisect_left(self._doc_ids, doc_id)
+        if idx == len(self._doc_ids) or self._doc_ids[idx] != doc_id:
+            raise KeyError(doc_id)
+        return self._doc_lengths[idx]
+
+    def all_doc_ids(self):
+        """sorted doc ids of all documents in index
+
+        Returns:
+            array -- sorted doc ids
+        """
+
+        return self._doc_ids
+
+    def iter_docs(self):
+        """iterate over all documents in order of doc id
+
+        Returns:
+            generator -- (doc_id, root, length) of each document
+        """
+
+        for idx, doc_id in enumerate(self._doc_ids):
+            yield (doc_id, self.roots[self._doc_roots[idx]],
+                   self._doc_lengths[idx])
+
+    def __contains__(self, term):
+        return self._find(term) is not None
+
+    def __getitem__(self, term):
+        info = self._find(term)
+        if info is None:
+            raise KeyError(term)
+        postings = self.posting_list(term)
+        dic_posting_list = {}
+        for idx, doc_id in enumerate(postings.doc_ids):
+            root = self.doc_root(doc_id)
+            dic_posting_list.setdefault(root, {})[str(doc_id)] = {
+                'number_of_frequency': postings.tfs[idx],
+                'list_pos': postings.positions(idx)
+            }
+        return {
+            'token_id': info.token_id,
+            'number_of_doc': info.number_of_doc,
+            'frequency_token': info.frequency_token,
+            'posting_list': dic_posting_list
+        }
+
+    def __len__(self):
+        return self.num_terms
+
+    def __iter__(self):
+        return self.iterkeys()
+
+    def iterkeys(self):
+        """iterate over all terms in sorted order
+        """
+
+        for idx in xrange(self.num_terms):
+            yield self._term_at(idx)[0]
+
+    def keys(self):
+        """list of all terms in sorted order
+        """
+
+        return list(self.iterkeys())
+
+    def dictionary_fingerprint(self):
+        """hash of header, sorted terms and term entries of index, structures
+        made just from term dictionary of index can be cached by it
+
+        Returns:
+            str -- hex digest of term dictionary
+        """
+
+        digest = hashlib.sha1(self._mm[:HEADER.size])
+        digest.update(self._mm[self._strings_offset:self._dict_offset +
+                               self.num_terms * TERM_ENTRY.size])
+        return digest.hexdigest()
+
+    def iter_term_infos(self, prefix=''):
+        """iterate over information of all terms in sorted order
+
+        Keyword Arguments:
+            prefix {str} -- just terms start with prefix (default: {''})
+
+        Returns:
+            generator -- TermInfo of each term
+        """
+
+        start, end = self.prefix_range(prefix)
+        for idx in xrange(start, end):
+            term, entry = self._term_at(idx)
+            yield TermInfo(term, *entry[2:])
+
+    def iteritems(self):
+        """iterate over terms and their entry like dictionary of inverted
+        index
+        """
+
+        for term in self.iterkeys():
+            yield term, self[term]
+
+
+def is_binary_index(path):
+    """check file is a binary inverted index
+
+    Arguments:
+        path {str} -- path to file
+
+    Returns:
+        bool -- True if file starts with magic of binary index
+    """
+
+    if not os.path.isfile(path):
+        return False
+    with open(path, 'rb') as reader:
+        return reader.read(len(MAGIC)) == MAGIC
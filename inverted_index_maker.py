@@ -1,6 +1,13 @@
 #!/usr/bin/env python
 # -*- encoding: utf8 -*-
 """make inverted index by preprocessed file which made by tokenizer_normalizer
+and store it in binary format, json format is optional for debugging
+for corpora larger than memory index is made by SPIMI, sorted blocks are
+flushed to disk when memory budget is reached and merged at the end
+numbers of posting lists are encoded by vbyte (default), gamma or pfor codec
+
+    python inverted_index_maker.py [--json] [--memory-budget=<MB>]
+                                   [--codec=vbyte|gamma|pfor] [--metrics]
     __author__ = "Erfan Rahnemoon"
     __version__ = "0.0.1"
     __maintainer__ = "Erfan Rahnemoon"
@@ -8,8 +15,21 @@
 """
 
 
+import heapq
 import json
 import os
+import shutil
+import sys
+import tempfile
+
+import index_storage
+import metrics
+import posting_codecs
+
+# estimated memory of each part of a SPIMI block in bytes
+TERM_MEMORY = 120
+POSTING_MEMORY = 100
+POSITION_MEMORY = 8
 
 
 def read_json(file_name):
@@ -26,6 +46,7 @@ def read_json(file_name):
         return json.load(reader)
 
 
+@metrics.timed('index_maker.write_json', memory=True)
 def write_json(dic_content, file_name):
     """write dictionary-data in file by json style
 
@@ -38,47 +59,366 @@ def write_json(dic_content, file_name):
         writer.close()
 
 
-def make_inverted_index(path_preproc='data-files/json_data/cars/preprocessed/'):
-    """read preprocessed file which made by tokenizer_normalizer and make
-    inverted index
+@metrics.timed('index_maker.write_binary', memory=True)
+def write_binary(dic_content, file_name, codec=posting_codecs.DEFAULT_CODEC):
+    """write inverted index in binary format which search can read lazily
 
     Arguments:
-        path_preproc {dictionary} -- inverted index
+        dic_content {dictionary} -- inverted index
+        file_name {str} -- name of binary file in data-files directory
+
+    Keyword Arguments:
+        codec {str} -- posting codec, one of vbyte, gamma or pfor
+        (default: {posting_codecs.DEFAULT_CODEC})
+    """
+
+    index_storage.write_binary_index(dic_content,
+                                     'data-files/' + file_name + '.bin',
+                                     codec)
+
+
+def iter_preprocessed_files(path_preproc):
+    """read preprocessed files one after another and yield their documents
+
+    Arguments:
+        path_preproc {str} -- path to preprocessed files
+
+    Returns:
+        generator -- preprocessed document dictionaries
+    """
+
+    for preprocessed_data in os.listdir(path_preproc):
+        for dic_doc in read_json(path_preproc + preprocessed_data):
+            yield dic_doc
+
+
+@metrics.timed('index_maker.build', memory=True)
+def build_inverted_index(iter_preprocessed_docs):
+    """make inverted index from stream of preprocessed documents
+
+    Arguments:
+        iter_preprocessed_docs {iterable} -- preprocessed document dictionaries
+
+    Returns:
+        dictionary -- inverted index
     """
 
     inverted_index = {}
     token_id = 0
-    for preprocessed_data in os.listdir(path_preproc):
-        list_docs_dic = read_json(path_preproc + preprocessed_data)
-        for dic_doc in list_docs_dic:
-            doc_id = dic_doc['doc_id']
-            list_of_tokens = dic_doc['list_of_token']
-            root_file = dic_doc['root']
-            for token, pos in list_of_tokens:
-                if token not in inverted_index:
-                    inverted_index[token] = {
-                        'token_id': token_id,
-                        'number_of_doc': 0,
-                        'frequency_token': 0,
-                        'posting_list': {}
-                    }
-                    token_id += 1
-                if root_file not in inverted_index[token]['posting_list']:
-                    inverted_index[token]['posting_list'][root_file] = {}
-                if doc_id not in inverted_index[token]['posting_list'][root_file]:
-                    inverted_index[token]['posting_list'][root_file][doc_id] = {
-                        'number_of_frequency': 0,
-                        'list_pos': []
-                    }
-                    inverted_index[token]['number_of_doc'] += 1
-                inverted_index[token]['posting_list'][root_file][doc_id]['list_pos'].append(pos)
-                inverted_index[token]['posting_list'][root_file][doc_id]['number_of_frequency'] += 1
-                inverted_index[token]['frequency_token'] += 1
-    write_json(inverted_index, 'inverted-index')
+    for dic_doc in iter_preprocessed_docs:
+        doc_id = dic_doc['doc_id']
+        list_of_tokens = dic_doc['list_of_token']
+        root_file = dic_doc['root']
+        for token, pos in list_of_tokens:
+            if token not in inverted_index:
+                inverted_index[token] = {
+                    'token_id': token_id,
+                    'number_of_doc': 0,
+                    'frequency_token': 0,
+                    'posting_list': {}
+                }
+                token_id += 1
+            if root_file not in inverted_index[token]['posting_list']:
+                inverted_index[token]['posting_list'][root_file] = {}
+            if doc_id not in inverted_index[token]['posting_list'][root_file]:
+                inverted_index[token]['posting_list'][root_file][doc_id] = {
+                    'number_of_frequency': 0,
+                    'list_pos': []
+                }
+                inverted_index[token]['number_of_doc'] += 1
+            inverted_index[token]['posting_list'][root_file][doc_id]['list_pos'].append(pos)
+            inverted_index[token]['posting_list'][root_file][doc_id]['number_of_frequency'] += 1
+            inverted_index[token]['frequency_token'] += 1
+    metrics.gauge('index_maker.terms', len(inverted_index))
+    return inverted_index
+
+
+def store_inverted_index(inverted_index, json_debug=False,
+                         codec=posting_codecs.DEFAULT_CODEC):
+    """write inverted index in binary format and if asked in json format
+
+    Arguments:
+        inverted_index {dictionary} -- inverted index
+
+    Keyword Arguments:
+        json_debug {bool} -- also write inverted index in json format
+        (default: {False})
+        codec {str} -- posting codec, one of vbyte, gamma or pfor
+        (default: {posting_codecs.DEFAULT_CODEC})
+    """
+
+    write_binary(inverted_index, 'inverted-index', codec)
+    if json_debug:
+        write_json(inverted_index, 'inverted-index')
+
+
+def write_json_from_index(path_index, file_name):
+    """write binary inverted index in json format term by term, so whole
+    index is never in memory
+
+    Arguments:
+        path_index {str} -- path to binary inverted index
+        file_name {str} -- name of json file in data-files directory
+    """
+
+    with index_storage.BinaryIndexReader(path_index) as reader:
+        with open('data-files/'+file_name+'.json', 'w+') as writer:
+            writer.write('{')
+            for idx, (term, value) in enumerate(reader.iteritems()):
+                if idx:
+                    writer.write(', ')
+                writer.write(json.dumps(term) + ': ' + json.dumps(value))
+            writer.write('}')
+
+
+class SpimiIndexer(object):
+    """single-pass in-memory indexer, postings of each block are collected in
+    a dictionary and when estimated memory of block reaches the budget, block
+    is sorted and flushed to a temporary file; at the end all blocks are
+    merged k-way into the binary inverted index
+    """
+
+    def __init__(self, path_index, memory_budget=64 * 1024 * 1024,
+                 path_blocks=None, codec=posting_codecs.DEFAULT_CODEC):
+        self.path_index = path_index
+        self.memory_budget = memory_budget
+        self.codec = codec
+        self.path_blocks = tempfile.mkdtemp(prefix='spimi-', dir=path_blocks)
+        self.list_blocks = []
+        self.token_ids = {}
+        self._block = {}
+        self._block_docs = []
+        self._block_memory = 0
+
+    def add_document(self, dic_doc):
+        """add postings of a preprocessed document to current block
+
+        Arguments:
+            dic_doc {dictionary} -- preprocessed document dictionary
+        """
+
+        doc_id = int(dic_doc['doc_id'])
+        self._block_docs.append((doc_id, dic_doc['root'],
+                                 len(dic_doc['list_of_token'])))
+        dic_doc_pos = {}
+        for token, pos in dic_doc['list_of_token']:
+            if token not in self.token_ids:
+                self.token_ids[token] = len(self.token_ids)
+            if token not in dic_doc_pos:
+                dic_doc_pos[token] = []
+            dic_doc_pos[token].append(pos)
+        for token, list_pos in dic_doc_pos.iteritems():
+            if token not in self._block:
+                self._block[token] = []
+                self._block_memory += TERM_MEMORY
+            self._block[token].append((doc_id, list_pos))
+            self._block_memory += POSTING_MEMORY + \
+                POSITION_MEMORY * len(list_pos)
+        if self._block_memory >= self.memory_budget:
+            self.flush_block()
+
+    @metrics.timed('index_maker.spimi_flush', memory=True)
+    def flush_block(self):
+        """write current block sorted by term and doc id in temporary files
+        and start new block
+        """
+
+        if not self._block_docs:
+            return
+        metrics.count('index_maker.spimi_blocks')
+        metrics.count('index_maker.docs', len(self._block_docs))
+        path_block = os.path.join(self.path_blocks,
+                                  'block-%d' % len(self.list_blocks))
+        with open(path_block + '.postings', 'wb') as writer:
+            for token in sorted(self._block, key=index_storage.encode_term):
+                buf = bytearray()
+                term = index_storage.encode_term(token)
+                index_storage.encode_varint(len(term), buf)
+                buf.extend(term)
+                postings = sorted(self._block[token])
+                index_storage.encode_varint(len(postings), buf)
+                for doc_id, list_pos in postings:
+                    index_storage.encode_varint(doc_id, buf)
+                    index_storage.encode_varint(len(list_pos), buf)
+                    for pos in list_pos:
+                        index_storage.encode_varint(pos, buf)
+                writer.write(buf)
+        with open(path_block + '.docs', 'wb') as writer:
+            buf = bytearray()
+            for doc_id, root, length in sorted(self._block_docs):
+                root = index_storage.encode_term(root)
+                index_storage.encode_varint(doc_id, buf)
+                index_storage.encode_varint(length, buf)
+                index_storage.encode_varint(len(root), buf)
+                buf.extend(root)
+            writer.write(buf)
+        self.list_blocks.append(path_block)
+        self._block = {}
+        self._block_docs = []
+        self._block_memory = 0
+
+    @staticmethod
+    def _iter_block_docs(path_block):
+        reader = index_storage.VarintFileReader(path_block + '.docs')
+        try:
+            while not reader.at_end():
+                doc_id = reader.read_varint()
+                length = reader.read_varint()
+                yield doc_id, reader.read_bytes(reader.read_varint()), length
+        finally:
+            reader.close()
+
+    @staticmethod
+    def _iter_block_terms(path_block):
+        reader = index_storage.VarintFileReader(path_block + '.postings')
+        try:
+            while not reader.at_end():
+                term = reader.read_bytes(reader.read_varint())
+                number_of_doc = reader.read_varint()
+                yield term, SpimiIndexer._iter_block_postings(reader,
+                                                               number_of_doc)
+        finally:
+            reader.close()
+
+    @staticmethod
+    def _iter_block_postings(reader, number_of_doc):
+        for _ in xrange(number_of_doc):
+            doc_id = reader.read_varint()
+            yield doc_id, [reader.read_varint()
+                           for _ in xrange(reader.read_varint())]
+
+    @metrics.timed('index_maker.spimi_merge', memory=True)
+    def merge(self):
+        """merge all blocks k-way into binary inverted index, postings of
+        each term are merged by doc id and written streaming
+        """
+
+        self.flush_block()
+        try:
+            with index_storage.BinaryIndexWriter(self.path_index,
+                                                 self.codec) as writer:
+                for doc_id, root, length in heapq.merge(
+                        *[self._iter_block_docs(path_block)
+                          for path_block in self.list_blocks]):
+                    writer.add_doc(doc_id, root, length)
+                heap = []
+                for idx, path_block in enumerate(self.list_blocks):
+                    self._push_term(heap, idx,
+                                    self._iter_block_terms(path_block))
+                while heap:
+                    term = heap[0][0]
+                    list_postings = []
+                    while heap and heap[0][0] == term:
+                        _, idx, postings, iter_terms = heapq.heappop(heap)
+                        list_postings.append((idx, postings, iter_terms))
+                    writer.add_term(term,
+                                    self.token_ids[term.decode('utf-8')],
+                                    heapq.merge(*[postings for _, postings, _
+                                                  in list_postings]))
+                    # postings of term are read so next term of each block
+                    for idx, _, iter_terms in list_postings:
+                        self._push_term(heap, idx, iter_terms)
+        finally:
+            shutil.rmtree(self.path_blocks, ignore_errors=True)
+
+    @staticmethod
+    def _push_term(heap, idx, iter_terms):
+        for term, postings in iter_terms:
+            heapq.heappush(heap, (term, idx, postings, iter_terms))
+            return
+
+
+def make_inverted_index_spimi(iter_preprocessed_docs, path_index,
+                              memory_budget=64 * 1024 * 1024,
+                              path_blocks=None,
+                              codec=posting_codecs.DEFAULT_CODEC):
+    """make binary inverted index from stream of preprocessed documents by
+    SPIMI, memory used for postings is bounded by memory budget
+
+    Arguments:
+        iter_preprocessed_docs {iterable} -- preprocessed document dictionaries
+        path_index {str} -- path to binary inverted index
+
+    Keyword Arguments:
+        memory_budget {int} -- memory budget of each block in bytes
+        (default: {64 MB})
+        path_blocks {str} -- directory of temporary block files, None for
+        temporary directory of system (default: {None})
+        codec {str} -- posting codec, one of vbyte, gamma or pfor
+        (default: {posting_codecs.DEFAULT_CODEC})
+    """
+
+    indexer = SpimiIndexer(path_index, memory_budget, path_blocks, codec)
+    for dic_doc in iter_preprocessed_docs:
+        indexer.add_document(dic_doc)
+    indexer.merge()
+
+
+def store_inverted_index_spimi(iter_preprocessed_docs, memory_budget,
+                               json_debug=False,
+                               codec=posting_codecs.DEFAULT_CODEC):
+    """make inverted index by SPIMI and store it in binary format and if asked
+    in json format
+
+    Arguments:
+        iter_preprocessed_docs {iterable} -- preprocessed document dictionaries
+        memory_budget {int} -- memory budget of each block in bytes
+
+    Keyword Arguments:
+        json_debug {bool} -- also write inverted index in json format
+        (default: {False})
+        codec {str} -- posting codec, one of vbyte, gamma or pfor
+        (default: {posting_codecs.DEFAULT_CODEC})
+    """
+
+    make_inverted_index_spimi(iter_preprocessed_docs,
+                              'data-files/inverted-index.bin', memory_budget,
+                              'data-files', codec)
+    if json_debug:
+        write_json_from_index('data-files/inverted-index.bin',
+                              'inverted-index')
+
+
+@metrics.profiled('index_maker.make_inverted_index')
+@metrics.timed('index_maker.make_inverted_index', memory=True)
+def make_inverted_index(path_preproc='data-files/json_data/cars/preprocessed/',
+                        json_debug=False, memory_budget=None,
+                        codec=posting_codecs.DEFAULT_CODEC):
+    """read preprocessed file which made by tokenizer_normalizer and make
+    inverted index
+
+    Keyword Arguments:
+        path_preproc {str} -- path to preprocessed files
+        (default: {'data-files/json_data/cars/preprocessed/'})
+        json_debug {bool} -- also write inverted index in json format
+        (default: {False})
+        memory_budget {int} -- if given make inverted index by SPIMI with this
+        memory budget in bytes (default: {None})
+        codec {str} -- posting codec, one of vbyte, gamma or pfor
+        (default: {posting_codecs.DEFAULT_CODEC})
+    """
+
+    if memory_budget:
+        store_inverted_index_spimi(iter_preprocessed_files(path_preproc),
+                                   memory_budget, json_debug, codec)
+        return
+    store_inverted_index(
+        build_inverted_index(iter_preprocessed_files(path_preproc)),
+        json_debug, codec)
 
 
 def main():
-    make_inverted_index()
+    memory_budget = None
+    codec = posting_codecs.DEFAULT_CODEC
+    for arg in sys.argv[1:]:
+        if arg.startswith('--memory-budget='):
+            memory_budget = int(arg.split('=', 1)[1]) * 1024 * 1024
+        elif arg.startswith('--codec='):
+            codec = arg.split('=', 1)[1]
+        elif arg == '--metrics':
+            metrics.enable()
+    make_inverted_index(json_debug='--json' in sys.argv[1:],
+                        memory_budget=memory_budget, codec=codec)
 
 if __name__ == '__main__':
     main()
@@ -0,0 +1,384 @@
+#!/usr/bin/env python
+# -*- encoding: utf8 -*-
+"""lightweight instrumentation of parser, normalizer, index maker and search:
+timers, counters and memory gauges and optional cProfile capture around hot
+functions, with a summary report and a prometheus text dump
+
+instrumentation is disabled by default and costs one check of a flag per
+timed call; it is enabled by environment variables, which are inherited by
+worker processes, or by --metrics option of search.py, search_server.py,
+parser.py and inverted_index_maker.py
+
+    IR_METRICS=1                  enable timers, counters and gauges
+    IR_METRICS_FILE=<path>        write prometheus text dump at exit
+    IR_PROFILE=<directory>        also run profiled functions by cProfile and
+                                  write <name>.pstats in directory at exit
+
+summary report is written in stderr at exit, so tables written in stdout
+are not mixed with it. python 2 has no tracemalloc, memory is measured by
+resident memory of process before and after stage timers; metrics of pool
+worker processes stay in them and cProfile just sees thread which calls
+profiled function, so stages are best measured without -j
+
+    __author__ = "Erfan Rahnemoon"
+    __version__ = "0.0.1"
+    __maintainer__ = "Erfan Rahnemoon"
+    __email__ = "erfan@rahnemoon.name"
+"""
+import atexit
+import cProfile
+import functools
+import os
+import pstats
+import re
+import resource
+import sys
+import threading
+import time
+from cStringIO import StringIO
+
+ENV_METRICS = 'IR_METRICS'
+ENV_METRICS_FILE = 'IR_METRICS_FILE'
+ENV_PROFILE = 'IR_PROFILE'
+PROMETHEUS_PREFIX = 'ir'
+# number of functions of each profile in summary report
+PROFILE_TOP = 15
+PAGE_KB = resource.getpagesize() // 1024
+
+ENABLED = False
+PROFILE_DIR = None
+PATH_PROMETHEUS = None
+START_TIME = time.time()
+# name -> [calls, seconds, max seconds, max growth of resident memory in KB]
+TIMERS = {}
+COUNTERS = {}
+GAUGES = {}
+# name -> cProfile.Profile list of each run of profiled function
+PROFILES = {}
+LOCK = threading.Lock()
+# profiled function which runs in this thread, profiles are not nested
+PROFILING = threading.local()
+
+
+def enable(profile_dir=None, path_prometheus=None):
+    """enable instrumentation
+
+    Keyword Arguments:
+        profile_dir {str} -- directory of pstats files, None to not profile
+        (default: {None})
+        path_prometheus {str} -- path of prometheus text dump written at
+        exit, None to not write it (default: {None})
+    """
+
+    global ENABLED, PROFILE_DIR, PATH_PROMETHEUS
+    ENABLED = True
+    if profile_dir:
+        if not os.path.isdir(profile_dir):
+            os.makedirs(profile_dir)
+        PROFILE_DIR = profile_dir
+    if path_prometheus:
+        PATH_PROMETHEUS = path_prometheus
+
+
+def current_rss():
+    """resident memory of this process
+
+    Returns:
+        int -- resident memory in KB, peak resident memory if /proc is not
+        available
+    """
+
+    try:
+        with open('/proc/self/statm') as statm:
+            return int(statm.read().split()[1]) * PAGE_KB
+    except (IOError, IndexError, ValueError):
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+
+
+class Timer(object):
+    """context manager which adds its time to timer of name, stage timers
+    also keep growth of resident memory
+    """
+
+    __slots__ = ('name', 'memory', 'start', 'rss')
+
+    def __init__(self, name, memory=False):
+        self.name = name
+        self.memory = memory
+        self.rss = None
+
+    def __enter__(self):
+        if self.memory:
+            self.rss = current_rss()
+        self.start = time.time()
+        return self
+
+    def __exit__(self, *exc_info):
+        seconds = time.time() - self.start
+        growth = current_rss() - self.rss if self.memory else None
+        with LOCK:
+            stats = TIMERS.get(self.name)
+            if stats is None:
+                stats = TIMERS[self.name] = [0, 0.0, 0.0, None]
+            stats[0] += 1
+            stats[1] += seconds
+            stats[2] = max(stats[2], seconds)
+            if growth is not None:
+                stats[3] = max(stats[3], growth)
+
+
+class NullTimer(object):
+    """timer of disabled instrumentation which does nothing
+    """
+
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        pass
+
+
+NULL_TIMER = NullTimer()
+
+
+def timer(name, memory=False):
+    """timer of a block of code
+
+    Arguments:
+        name {str} -- name of timer, like parser.lxml_parse
+
+    Keyword Arguments:
+        memory {bool} -- also keep growth of resident memory, for stages
+        which are not run many times (default: {False})
+
+    Returns:
+        obj -- context manager
+    """
+
+    if not ENABLED:
+        return NULL_TIMER
+    return Timer(name, memory)
+
+
+def timed(name, memory=False):
+    """decorator which times each call of function, not for generator
+    functions since they run after they return
+
+    Arguments:
+        name {str} -- name of timer
+
+    Keyword Arguments:
+        memory {bool} -- also keep growth of resident memory
+        (default: {False})
+
+    Returns:
+        function -- decorator
+    """
+
+    def decorator(function):
+        @functools.wraps(function)
+        def wrapper(*args, **kwargs):
+            if not ENABLED:
+                return function(*args, **kwargs)
+            with Timer(name, memory):
+                return function(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+def profiled(name):
+    """decorator which runs function by cProfile if profiling is enabled,
+    profiles of all calls are merged; a profiled function called by another
+    one is in its profile and is not profiled again
+
+    Arguments:
+        name {str} -- name of profile and its pstats file
+
+    Returns:
+        function -- decorator
+    """
+
+    def decorator(function):
+        @functools.wraps(function)
+        def wrapper(*args, **kwargs):
+            if PROFILE_DIR is None or getattr(PROFILING, 'name', None):
+                return function(*args, **kwargs)
+            profile = cProfile.Profile()
+            PROFILING.name = name
+            try:
+                return profile.runcall(function, *args, **kwargs)
+            finally:
+                PROFILING.name = None
+                with LOCK:
+                    PROFILES.setdefault(name, []).append(profile)
+        return wrapper
+    return decorator
+
+
+def count(name, value=1):
+    """add value to counter
+
+    Arguments:
+        name {str} -- name of counter, like parser.docs
+
+    Keyword Arguments:
+        value {int} -- number to add (default: {1})
+    """
+
+    if not ENABLED:
+        return
+    with LOCK:
+        COUNTERS[name] = COUNTERS.get(name, 0) + value
+
+
+def gauge(name, value):
+    """set value of gauge
+
+    Arguments:
+        name {str} -- name of gauge, like normalizer.lemma_cache
+        value {float} -- current value
+    """
+
+    if ENABLED:
+        GAUGES[name] = value
+
+
+def snapshot():
+    """copy of all metrics, gauges of resident memory of process are added
+
+    Returns:
+        dictionary -- timers, counters and gauges
+    """
+
+    with LOCK:
+        timers = dict((name, list(stats)) for name, stats in TIMERS.items())
+        counters = dict(COUNTERS)
+        gauges = dict(GAUGES)
+    gauges['process.rss_kb'] = current_rss()
+    gauges['process.peak_rss_kb'] = resource.getrusage(
+        resource.RUSAGE_SELF).ru_maxrss
+    gauges['process.uptime_seconds'] = time.time() - START_TIME
+    return {'timers': timers, 'counters': counters, 'gauges': gauges}
+
+
+def profile_report(name, profiles, top=PROFILE_TOP):
+    """merge profiles of a profiled function, write them in its pstats file
+    and give its most expensive functions
+
+    Arguments:
+        name {str} -- name of profile
+        profiles {list} -- cProfile.Profile of each call
+
+    Keyword Arguments:
+        top {int} -- number of functions in report (default: {PROFILE_TOP})
+
+    Returns:
+        str -- functions sorted by cumulative time
+    """
+
+    stream = StringIO()
+    stats = pstats.Stats(profiles[0], stream=stream)
+    for profile in profiles[1:]:
+        stats.add(profile)
+    stats.dump_stats(os.path.join(PROFILE_DIR, name + '.pstats'))
+    stats.sort_stats('cumulative').print_stats(top)
+    return stream.getvalue()
+
+
+def report():
+    """summary of timers, counters, gauges and profiles
+
+    Returns:
+        str -- text of report
+    """
+
+    metrics = snapshot()
+    lines = ['metrics of {}'.format(' '.join(sys.argv)),
+             '{:<36} {:>9} {:>10} {:>10} {:>10} {:>9}'.format(
+                 'timer', 'calls', 'total s', 'mean ms', 'max ms', 'RSS +MB')]
+    for name, (calls, seconds, longest, growth) in sorted(
+            metrics['timers'].iteritems(), key=lambda item: -item[1][1]):
+        lines.append('{:<36} {:>9} {:>10.3f} {:>10.3f} {:>10.3f} {:>9}'.format(
+            name, calls, seconds, seconds * 1000.0 / calls, longest * 1000.0,
+            '-' if growth is None else '{:.1f}'.format(growth / 1024.0)))
+    for kind in ('counters', 'gauges'):
+        lines.append('{:<36} {:>20}'.format(kind[:-1], 'value'))
+        for name, value in sorted(metrics[kind].iteritems()):
+            lines.append('{:<36} {:>20}'.format(name, value))
+    if PROFILE_DIR is not None:
+        with LOCK:
+            profiles = dict(PROFILES)
+        for name, list_profiles in sorted(profiles.iteritems()):
+            lines.append('profile of {} in {}:'.format(
+                name, os.path.join(PROFILE_DIR, name + '.pstats')))
+            lines.append(profile_report(name, list_profiles))
+    return '\n'.join(lines) + '\n'
+
+
+def metric_name(name):
+    """name of prometheus metric, characters which are not allowed are
+    replaced by underscore
+
+    Arguments:
+        name {str} -- name of metric, like parser.docs
+
+    Returns:
+        str -- prometheus name, like ir_parser_docs
+    """
+
+    return PROMETHEUS_PREFIX + '_' + re.sub(r'[^a-zA-Z0-9_]', '_', name)
+
+
+def prometheus():
+    """metrics in prometheus text exposition format, timers are one family
+    with name of stage as label
+
+    Returns:
+        str -- text of metrics
+    """
+
+    metrics = snapshot()
+    lines = []
+    families = (('stage_calls_total', 'counter', 0),
+                ('stage_seconds_total', 'counter', 1),
+                ('stage_seconds_max', 'gauge', 2),
+                ('stage_rss_growth_kb_max', 'gauge', 3))
+    for family, kind, idx in families:
+        samples = [(name, stats[idx]) for name, stats
+                   in sorted(metrics['timers'].iteritems())
+                   if stats[idx] is not None]
+        if not samples:
+            continue
+        lines.append('# TYPE {}_{} {}'.format(PROMETHEUS_PREFIX, family,
+                                              kind))
+        for name, value in samples:
+            lines.append('{}_{}{{stage="{}"}} {}'.format(
+                PROMETHEUS_PREFIX, family, name, repr(float(value))))
+    for kind, suffix, values in (('counter', '_total', metrics['counters']),
+                                 ('gauge', '', metrics['gauges'])):
+        for name, value in sorted(values.iteritems()):
+            lines.append('# TYPE {}{} {}'.format(metric_name(name), suffix,
+                                                 kind))
+            lines.append('{}{} {}'.format(metric_name(name), suffix,
+                                          repr(float(value))))
+    return '\n'.join(lines) + '\n'
+
+
+def write_report():
+    """write summary report in stderr and prometheus text dump in its file,
+    registered to run at exit
+    """
+
+    if not ENABLED:
+        return
+    sys.stderr.write(report())
+    if PATH_PROMETHEUS:
+        with open(PATH_PROMETHEUS, 'w') as writer:
+            writer.write(prometheus())
+
+
+if os.environ.get(ENV_METRICS) or os.environ.get(ENV_PROFILE):
+    enable(os.environ.get(ENV_PROFILE), os.environ.get(ENV_METRICS_FILE))
+atexit.register(write_report)
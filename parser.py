@@ -1,19 +1,30 @@
 #!/usr/bin/env python
 # -*- encoding: utf8 -*-
-"""parse xml file and convert them to json
+"""parse xml file and convert them to json, files are parsed one after
+another or by a pool of worker processes; documents keep same doc ids in both
+
+    python parser.py [-j <workers>] [--metrics]
+
     __author__ = "Erfan Rahnemoon"
     __version__ = "0.0.1"
     __maintainer__ = "Erfan Rahnemoon"
     __email__ = "erfan@rahnemoon.name"
 """
-import json
+import getopt
+import itertools
 import os
 import re
+import sys
+from multiprocessing import Pool, cpu_count
 
-from bs4 import BeautifulSoup
+from json_autoarray import JSONAutoArray
 from lxml import etree
 from lxml.etree import XMLParser
 
+import metrics
+
+POOL_CHUNK_SIZE = 4
+
 
 def read_data_files(path):
     """read xml file from path
@@ -29,40 +40,6 @@ def read_data_files(path):
         return reader.read()
 
 
-def write_json_file(path, json_data):
-    """write content in json format
-
-    Arguments:
-        path {string} -- path to store json file
-        json_data {dictionary} -- dictionary of data to write in json
-    """
-
-    with open(path+'.json', 'w+') as writer:
-        json.dump(json_data, writer)
-        writer.close()
-
-
-def standardize_xml_files(file_content, recover_mode=True, encoding='utf-8'):
-    """standardize Xml file for file haven't root tag
-
-    Arguments:
-        file_content {string} -- xml content has not root tag
-
-    Keyword Arguments:
-        recover_mode {bool} -- ignore error or not (default: {True})
-        encoding {str} -- open file by write codec (default: {'utf-8'})
-
-    Returns:
-        string -- standard xml content
-    """
-
-    xml_tree = etree.fromstring('<root>' + file_content + '</root>',
-                                parser=XMLParser(recover=recover_mode,
-                                                 encoding=encoding)
-                                )
-    return etree.tostring(xml_tree)
-
-
 def make_dic(doc_id=None, root=None, date=None,
              author=None, text=None, favorite=None):
     """make dictionary form argument and return dictionary
@@ -89,33 +66,16 @@ def make_dic(doc_id=None, root=None, date=None,
     }
 
 
-def make_soup(xml_tree):
-    """make beautifulsoup object for interpret xml file
-
-    Arguments:
-        xml_tree {string} -- content of xml file
-
-    Returns:
-        (list,string,bool) -- return list of all doc and root name in xml file
-        and check for exception files
-    """
-
-    soup = BeautifulSoup(xml_tree, 'lxml-xml')
-    exception_file = False
-    if soup.find('DATE') is None:
-        exception_file = True
-    return soup.find_all('DOC'), soup.find('DOCNO'), exception_file
-
-
 def get_all_file_by_path(base_path):
-    """get relative path to all XML files
+    """get relative path to all XML files, paths of each directory are
+    sorted so doc ids given in order of them do not depend on file system
 
     Arguments:
         base_path {string} -- base address to access to XML files
 
     Returns:
-        dictionary -- key is directory and value is path to XML files in each
-        directory
+        dictionary -- key is directory and value is sorted path to XML files
+        in each directory
     """
 
     dic_file_path = {}
@@ -124,62 +84,266 @@ def get_all_file_by_path(base_path):
             dic_file_path[directory] = []
     for key in dic_file_path.iterkeys():
         path_to_files = base_path + '/' + key + '/'
-        for _file in os.listdir(path_to_files):
+        for _file in sorted(os.listdir(path_to_files)):
             if os.path.isfile(os.path.join(path_to_files, _file)):
                 dic_file_path[key].append(path_to_files+_file)
 
     return dic_file_path
 
 
-def files_to_json(dic_file_path, path_store_json):
-    """parse xml files to json files json files name is directory of xml files
-    so all doc in one directory saved in one json file
+def iter_text_docs(content, path, doc_id):
+    """yield each line of file which is not xml as a document
+
+    Arguments:
+        content {str} -- content of file
+        path {str} -- path to file
+        doc_id {int} -- documnet ID of first document of file
+
+    Returns:
+        generator -- dictionary of each document in file
+    """
+
+    pure_text = re.sub('(\\r\\n){3,5}', '', content)
+    list_of_each_line = pure_text.splitlines()
+    for line in list_of_each_line:
+        yield make_dic(doc_id=doc_id,
+                       root=path.split('/')[-1],
+                       text=line)
+        doc_id += 1
+
+
+def element_text(element):
+    """all text of element and its children, like get_text of BeautifulSoup
+
+    Arguments:
+        element {obj} -- lxml element or None
+
+    Returns:
+        unicode -- text of element or None if there is no element
+    """
+
+    if element is None:
+        return None
+    return u''.join(element.itertext())
+
+
+def iter_xml_docs(content, doc_id):
+    """parse content of xml file once by lxml in recover mode and yield each
+    document, fields are read from lxml tree directly instead of writing tree
+    back to string and parsing it again by BeautifulSoup. whole file is
+    parsed at once, pull parser of lxml recovers broken markup differently
+    and loses documents
+
+    Arguments:
+        content {str} -- content of xml file without root tag
+        doc_id {int} -- documnet ID of first document of file
+
+    Returns:
+        generator -- dictionary of each document in file
+    """
+
+    with metrics.timer('parser.lxml_parse'):
+        xml_tree = etree.fromstring('<root>' + content + '</root>',
+                                    parser=XMLParser(recover=True,
+                                                     encoding='cp1252'))
+    root_name = element_text(xml_tree.find('.//DOCNO'))
+    # if file for excepted file in data-set
+    exception_file = xml_tree.find('.//DATE') is None
+    for doc in xml_tree.iter('DOC'):
+        if exception_file:
+            yield make_dic(doc_id=doc_id, root=root_name,
+                           text=element_text(doc))
+        else:
+            yield make_dic(doc_id, root_name,
+                           element_text(doc.find('.//DATE')),
+                           element_text(doc.find('.//AUTHOR')),
+                           element_text(doc.find('.//TEXT')),
+                           element_text(doc.find('.//FAVORITE')))
+        doc_id += 1
+
+
+def iter_file_docs(path, doc_id):
+    """parse one xml file and yield its documents, file is parsed once
+
+    Arguments:
+        path {str} -- path to xml file
+        doc_id {int} -- documnet ID of first document of file
+
+    Returns:
+        generator -- dictionary of each document in file
+    """
+
+    with metrics.timer('parser.read_file'):
+        content = read_data_files(path)
+    metrics.count('parser.files')
+    # if for just one excepted file in dataset
+    if 'DOCNO' not in content:
+        for dic_doc in iter_text_docs(content, path, doc_id):
+            yield dic_doc
+        return
+    for dic_doc in iter_xml_docs(content, doc_id):
+        yield dic_doc
+
+
+def iter_paths(dic_file_path):
+    """paths of xml files in order they get doc ids
 
     Arguments:
         dic_file_path {dictioanry} -- dictionary from all directory and file in
         dataset which directory is key
-        path_store_json {string} -- directory to store json files
+
+    Returns:
+        generator -- (directory name, path to xml file) for each file
     """
 
-    doc_id = 0
-    for name_directory, list_of_path in dic_file_path.iteritems():
-        list_dics_doc = []
+    for name_directory, list_of_path in sorted(dic_file_path.iteritems()):
         for path in list_of_path:
-            content = read_data_files(path)
-            # if for just one excepted file in dataset
-            if 'DOCNO' not in content:
-                pure_text = re.sub('(\\r\\n){3,5}', '', content)
-                list_of_each_line = pure_text.splitlines()
-                for line in list_of_each_line:
-                    list_dics_doc.append(make_dic(doc_id=doc_id,
-                                                  root=path.split('/')[-1],
-                                                  text=line))
-                    doc_id += 1
-                continue
-
-            content = standardize_xml_files(content, encoding='cp1252')
-            list_docs, root_name, exception_file = make_soup(content)
-            for doc in list_docs:
-                # if file for excepted file in data-set
-                if exception_file:
-                    list_dics_doc.append(make_dic(doc_id=doc_id,
-                                                  root=root_name.get_text(),
-                                                  text=doc.get_text()))
-                else:
-                    list_dics_doc.append(make_dic(doc_id,
-                                                  root_name.get_text(),
-                                                  doc.DATE.get_text(),
-                                                  doc.AUTHOR.get_text(),
-                                                  doc.TEXT.get_text(),
-                                                  doc.FAVORITE.get_text()))
+            yield name_directory, path
+
+
+def parse_file(name_path):
+    """parse one xml file in worker process, doc ids are given by parent
+    process since they depend on documents of files before it
+
+    Arguments:
+        name_path {tuple} -- directory name and path to xml file
+
+    Returns:
+        (str, list) -- directory name and documents of file
+    """
+
+    name_directory, path = name_path
+    return name_directory, list(iter_file_docs(path, 0))
+
+
+def iter_docs_pool(dic_file_path, workers):
+    """parse xml files by a pool of worker processes and yield their
+    documents in order of files, so doc ids are same as serial run; just
+    files being parsed or waiting to be read are in memory
+
+    Arguments:
+        dic_file_path {dictioanry} -- dictionary from all directory and file in
+        dataset which directory is key
+        workers {int} -- number of worker processes
 
+    Returns:
+        generator -- (directory name, dictionary of document) for each
+        document in data-set
+    """
+
+    pool = Pool(workers)
+    doc_id = 0
+    try:
+        for name_directory, list_dic_doc in pool.imap(
+                parse_file, iter_paths(dic_file_path), POOL_CHUNK_SIZE):
+            # files are counted in worker processes, which are not reported
+            metrics.count('parser.files')
+            for dic_doc in list_dic_doc:
+                dic_doc['docID'] = doc_id
+                yield name_directory, dic_doc
                 doc_id += 1
-        write_json_file(path_store_json + '/' + str(name_directory),
-                        list_dics_doc)
+        metrics.count('parser.docs', doc_id)
+        pool.close()
+    finally:
+        pool.terminate()
+        pool.join()
 
 
+def iter_docs(dic_file_path, workers=None):
+    """parse xml files one after another and yield their documents, so just
+    one file is in memory at a time; if number of workers is given files are
+    parsed by pool of processes
+
+    Arguments:
+        dic_file_path {dictioanry} -- dictionary from all directory and file in
+        dataset which directory is key
+
+    Keyword Arguments:
+        workers {int} -- number of worker processes, 0 for number of cpu
+        cores and None for parsing in this process (default: {None})
+
+    Returns:
+        generator -- (directory name, dictionary of document) for each
+        document in data-set
+    """
+
+    if workers is not None:
+        for name_dic_doc in iter_docs_pool(dic_file_path,
+                                           workers or cpu_count()):
+            yield name_dic_doc
+        return
+    doc_id = 0
+    for name_directory, path in iter_paths(dic_file_path):
+        for dic_doc in iter_file_docs(path, doc_id):
+            yield name_directory, dic_doc
+            doc_id += 1
+    metrics.count('parser.docs', doc_id)
+
+
+def iter_write_json(iter_name_items, path_store_json, extension='.json',
+                    names=()):
+    """write items of a stream in json files and yield them again, items of
+    each name must be next to each other in stream
+
+    Arguments:
+        iter_name_items {iterable} -- (name, item) pairs
+        path_store_json {string} -- directory to store json files
+
+    Keyword Arguments:
+        extension {str} -- extension added to name of json files
+        (default: {'.json'})
+        names {iterable} -- names which get a json file even if stream has no
+        item of them, like a directory without documents (default: {()})
+
+    Returns:
+        generator -- same (name, item) pairs
+    """
+
+    if not os.path.isdir(path_store_json):
+        os.makedirs(path_store_json)
+    written = set()
+    for name, iter_items in itertools.groupby(
+            iter_name_items, key=lambda name_item: name_item[0]):
+        written.add(str(name))
+        # ArrayWriter writes brackets of array just as context manager
+        path = path_store_json + '/' + str(name) + extension
+        with JSONAutoArray.ArrayWriter(path) as json_streamer:
+            for _, item in iter_items:
+                with metrics.timer('parser.write_json'):
+                    json_streamer.write(item)
+                yield name, item
+    for name in names:
+        if str(name) not in written:
+            with JSONAutoArray.ArrayWriter(path_store_json + '/' + str(name) +
+                                           extension):
+                pass
+
+
+def files_to_json(dic_file_path, path_store_json, workers=None):
+    """parse xml files to json files json files name is directory of xml files
+    so all doc in one directory saved in one json file, documents are written
+    as they are parsed
+
+    Arguments:
+        dic_file_path {dictioanry} -- dictionary from all directory and file in
+        dataset which directory is key
+        path_store_json {string} -- directory to store json files
+
+    Keyword Arguments:
+        workers {int} -- number of worker processes, 0 for number of cpu
+        cores and None for parsing in this process (default: {None})
+    """
+
+    for _ in iter_write_json(iter_docs(dic_file_path, workers),
+                             path_store_json, names=dic_file_path):
+        pass
+
+
+@metrics.profiled('parser.parsing')
+@metrics.timed('parser.parsing', memory=True)
 def parsing(base_source_path='data-files/cars',
-            base_result_path='data-files/json_data/cars/parsed'):
+            base_result_path='data-files/json_data/cars/parsed',
+            workers=None):
     """get path to all file in data-set and run converter to json
 
     Keyword Arguments:
@@ -187,12 +351,39 @@ def parsing(base_source_path='data-files/cars',
         (default: {'data-files/cars'})
         base_result_path {str} -- path to store json files
         (default: {'data-files/json_data/cars'})
+        workers {int} -- number of worker processes, 0 for number of cpu
+        cores and None for parsing in this process (default: {None})
     """
 
     if not os.path.isdir(base_result_path):
         os.mkdir(base_result_path)
     dic_file = get_all_file_by_path(base_source_path)
-    files_to_json(dic_file, base_result_path)
+    files_to_json(dic_file, base_result_path, workers)
+
+
+def main(argv):
+    """read options and parse data-set
+
+    Arguments:
+        argv {list} -- argument read from terminal
+    """
+
+    try:
+        opts, _ = getopt.getopt(argv, 'hj:', ['help', 'jobs=', 'metrics'])
+    except getopt.GetoptError:
+        print __doc__
+        sys.exit(2)
+    workers = None
+    for opt, arg in opts:
+        if opt in ('-h', '--help'):
+            print __doc__
+            sys.exit()
+        elif opt in ('-j', '--jobs'):
+            workers = int(arg)
+        elif opt == '--metrics':
+            metrics.enable()
+    parsing(workers=workers)
+
 
 if __name__ == '__main__':
-    parsing()
+    main(sys.argv[1:])
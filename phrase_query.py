@@ -0,0 +1,241 @@
+#!/usr/bin/env python
+# -*- encoding: utf8 -*-
+"""exact phrase ("fuel economy") and proximity ("seat comfortable"~5) query
+over positions stored in binary inverted index
+
+documents are first intersected by doc id, then positions are decoded just for
+candidate documents. positions in index are counted before stop words are
+removed, so stop words of query are removed too but keep their place; so
+"quality of ride" matches "quality of ride" and "quality in ride" but not
+"quality ride". terms are normalized by analyzer of queries if it is given
+
+    __author__ = "Erfan Rahnemoon"
+    __version__ = "0.0.1"
+    __maintainer__ = "Erfan Rahnemoon"
+    __email__ = "erfan@rahnemoon.name"
+"""
+import re
+
+import boolean_query
+
+PHRASE_PATTERN = re.compile(r'^\s*"([^"]*)"\s*(?:~\s*(\d+))?\s*$')
+
+
+def parse_phrase(query, stop_words=(), analyzer=None, vocabulary=None):
+    """parse phrase query to terms, their offset in phrase and distance
+
+    Arguments:
+        query {str} -- phrase query like "fuel economy" or "seat comfortable"~5
+
+    Keyword Arguments:
+        stop_words {list} -- stop words removed from index (default: {()})
+        analyzer {obj} -- analyzer of queries which removes stop words and
+        normalizes terms, stop_words is not used if it is given
+        (default: {None})
+        vocabulary {obj} -- terms of index which analyzer chooses normalized
+        form of terms from (default: {None})
+
+    Returns:
+        (list, int) -- list of (term, offset) and maximum distance of terms
+        for proximity query or None for exact phrase
+    """
+
+    match = PHRASE_PATTERN.match(query)
+    if match is None:
+        raise boolean_query.QuerySyntaxError('wrong phrase query %r' % query)
+    if analyzer is not None:
+        terms_offsets = analyzer.analyze_query(match.group(1), vocabulary)
+    else:
+        stop_words = frozenset(stop_words)
+        terms_offsets = [(word, offset) for offset, word in enumerate(
+            re.findall('[a-z]+', match.group(1).lower()))
+            if word not in stop_words]
+    if not terms_offsets:
+        raise boolean_query.QuerySyntaxError('no term in phrase %r' % query)
+    # stop words before first term do not constrain the phrase
+    first_offset = terms_offsets[0][1]
+    terms_offsets = [(term, offset - first_offset)
+                     for term, offset in terms_offsets]
+    distance = None if match.group(2) is None else int(match.group(2))
+    return terms_offsets, distance
+
+
+def phrase_positions(list_positions, offsets):
+    """start positions where terms come next to each other by their offsets
+
+    Arguments:
+        list_positions {list} -- sorted positions of each term in document
+        offsets {list} -- offset of each term in phrase
+
+    Returns:
+        list -- sorted positions of first term where phrase starts
+    """
+
+    starts = set(pos - offsets[0] for pos in list_positions[0])
+    for positions, offset in zip(list_positions[1:], offsets[1:]):
+        starts.intersection_update(pos - offset for pos in positions)
+        if not starts:
+            break
+    return sorted(starts)
+
+
+def min_window(list_positions):
+    """length of smallest window of positions which has all terms, found by
+    sliding window over merged positions; a term repeated in query has a
+    slot for each time and window must have as many distinct positions of it
+
+    Arguments:
+        list_positions {list} -- sorted positions of each term of query in
+        document, in order of query
+
+    Returns:
+        int -- distance between first and last position of smallest window
+        or None if there is no such window
+    """
+
+    # a position belongs to one term, so slots with same positions are
+    # repeats of one term
+    groups = {}
+    needs = []
+    for positions in list_positions:
+        key = tuple(positions)
+        if key not in groups:
+            groups[key] = len(needs)
+            needs.append(0)
+        needs[groups[key]] += 1
+    merged = sorted((pos, idx) for key, idx in groups.iteritems()
+                    for pos in key)
+    count_in_window = [0] * len(needs)
+    covered = 0
+    best = None
+    left = 0
+    for pos, idx in merged:
+        count_in_window[idx] += 1
+        if count_in_window[idx] == needs[idx]:
+            covered += 1
+        while covered == len(needs):
+            left_pos, left_idx = merged[left]
+            if best is None or pos - left_pos < best:
+                best = pos - left_pos
+            if count_in_window[left_idx] == needs[left_idx]:
+                covered -= 1
+            count_in_window[left_idx] -= 1
+            left += 1
+    return best
+
+
+class PhraseNode(object):
+    """documents contain a phrase, or all terms of it near each other
+    """
+
+    def __init__(self, query, stop_words=(), analyzer=None, vocabulary=None):
+        self.query = query
+        self.analyzer = analyzer
+        self.vocabulary = vocabulary
+        self.terms_offsets, self.distance = parse_phrase(query, stop_words,
+                                                         analyzer)
+
+    def index_terms(self, inverted_index):
+        """(term, offset) of phrase with terms as they are in index,
+        normalized form is chosen from vocabulary if it is given, like whole
+        collection for a shard, or from inverted index
+
+        Arguments:
+            inverted_index {obj} -- reader of inverted index
+
+        Returns:
+            list -- list of (term, offset)
+        """
+
+        if self.analyzer is None:
+            return self.terms_offsets
+        vocabulary = self.vocabulary
+        if vocabulary is None:
+            vocabulary = inverted_index
+        return parse_phrase(self.query, analyzer=self.analyzer,
+                            vocabulary=vocabulary)[0]
+
+    def estimate(self, inverted_index):
+        """estimated number of result documents, used to order conjunctions
+        """
+
+        counts = []
+        for term, _ in self.index_terms(inverted_index):
+            info = inverted_index.term_info(term)
+            if info is None:
+                return 0
+            counts.append(info.number_of_doc)
+        return min(counts)
+
+    def matches(self, inverted_index):
+        """documents match phrase with positions where they match
+
+        Arguments:
+            inverted_index {obj} -- reader of inverted index
+
+        Returns:
+            list -- (doc_id, list of start positions or window length)
+        """
+
+        terms_offsets = self.index_terms(inverted_index)
+        terms = sorted(set(term for term, _ in terms_offsets))
+        postings = {}
+        for term in terms:
+            postings[term] = inverted_index.posting_list(term)
+            if postings[term] is None:
+                return []
+        # doc level intersection, smallest posting list first
+        order = sorted(terms, key=lambda term: len(postings[term]))
+        candidates = postings[order[0]].doc_ids
+        for term in order[1:]:
+            candidates = boolean_query.intersect(candidates,
+                                                 postings[term].doc_ids)
+        cursors = dict((term, 0) for term in terms)
+        result = []
+        for doc_id in candidates:
+            doc_positions = {}
+            for term in terms:
+                cursors[term] = boolean_query.gallop(postings[term].doc_ids,
+                                                     doc_id, cursors[term])
+                doc_positions[term] = postings[term].positions(cursors[term])
+            list_positions = [doc_positions[term]
+                              for term, _ in terms_offsets]
+            if self.distance is None:
+                starts = phrase_positions(
+                    list_positions,
+                    [offset for _, offset in terms_offsets])
+                if starts:
+                    result.append((doc_id, starts))
+            else:
+                window = min_window(list_positions)
+                if window is not None and window <= self.distance:
+                    result.append((doc_id, window))
+        return result
+
+    def evaluate(self, inverted_index):
+        """sorted doc ids of documents match node
+        """
+
+        return [doc_id for doc_id, _ in self.matches(inverted_index)]
+
+    def __repr__(self):
+        return self.query.strip()
+
+
+def phrase_search(inverted_index, query, stop_words=(), analyzer=None):
+    """evaluate phrase or proximity query
+
+    Arguments:
+        inverted_index {obj} -- reader of inverted index
+        query {str} -- phrase query like "fuel economy" or "seat comfortable"~5
+
+    Keyword Arguments:
+        stop_words {list} -- stop words removed from index (default: {()})
+        analyzer {obj} -- analyzer of queries which normalizes terms
+        (default: {None})
+
+    Returns:
+        list -- (doc_id, list of start positions or window length)
+    """
+
+    return PhraseNode(query, stop_words, analyzer).matches(inverted_index)
@@ -0,0 +1,316 @@
+#!/usr/bin/env python
+# -*- encoding: utf8 -*-
+"""codecs of non negative numbers of posting lists, like doc-id gaps, term
+frequencies and position gaps; codec of binary inverted index is chosen when
+index is made and its id is stored in header of index
+
+    vbyte -- variable byte, 7 bits in each byte and high bit says more byte is
+             coming; fast to decode, one byte for small gaps
+    gamma -- Elias gamma code of number + 1, bit length in unary then binary
+             digits; smallest for very small gaps like positions and term
+             frequencies but decoded bit by bit
+    pfor  -- PForDelta, blocks of 128 numbers packed in a fixed number of
+             bits which fits most of them; bigger numbers are stored as
+             exceptions patched after unpacking
+
+every list of numbers is encoded to whole bytes, so each part of a posting
+list, like positions of one document, can be decoded alone
+
+    __author__ = "Erfan Rahnemoon"
+    __version__ = "0.0.1"
+    __maintainer__ = "Erfan Rahnemoon"
+    __email__ = "erfan@rahnemoon.name"
+"""
+import binascii
+
+DEFAULT_CODEC = 'vbyte'
+PFOR_BLOCK_SIZE = 128
+# part of numbers of a block which must fit in packed bits
+PFOR_FIT_RATIO = 0.9
+BYTE_BITS = [format(byte, '08b') for byte in xrange(256)]
+
+
+def encode_varint(number, buf):
+    """append number to buffer in variable byte format, 7 bits in each byte
+    and high bit says more byte is coming
+
+    Arguments:
+        number {int} -- non negative number
+        buf {bytearray} -- buffer to append encoded number
+    """
+
+    while number >= 0x80:
+        buf.append((number & 0x7f) | 0x80)
+        number >>= 7
+    buf.append(number)
+
+
+def decode_varint(buf, offset):
+    """decode one varint number from buffer
+
+    Arguments:
+        buf {bytearray} -- buffer of encoded numbers
+        offset {int} -- position of first byte of number in buffer
+
+    Returns:
+        (int, int) -- decoded number and position of next number
+    """
+
+    number = 0
+    shift = 0
+    while True:
+        byte = buf[offset]
+        offset += 1
+        number |= (byte & 0x7f) << shift
+        if byte < 0x80:
+            return number, offset
+        shift += 7
+
+
+def decode_varints(buf, offset, count):
+    """decode count varint numbers from buffer
+
+    Arguments:
+        buf {bytearray} -- buffer of encoded numbers
+        offset {int} -- position of first number in buffer
+        count {int} -- number of numbers to decode
+
+    Returns:
+        (list, int) -- list of numbers and position after last number
+    """
+
+    numbers = []
+    for _ in xrange(count):
+        number, offset = decode_varint(buf, offset)
+        numbers.append(number)
+    return numbers, offset
+
+
+def bits_to_bytes(bits, buf):
+    """append string of binary digits to buffer, padded by zero to whole
+    bytes
+
+    Arguments:
+        bits {str} -- binary digits, first digit is highest bit of first byte
+        buf {bytearray} -- buffer to append bytes
+    """
+
+    if not bits:
+        return
+    bits += '0' * (-len(bits) % 8)
+    buf.extend(binascii.unhexlify('%0*x' % (len(bits) // 4, int(bits, 2))))
+
+
+class VByteCodec(object):
+    """variable byte codec
+    """
+
+    name = 'vbyte'
+    codec_id = 0
+
+    @staticmethod
+    def encode(numbers, buf):
+        """append encoded numbers to buffer
+
+        Arguments:
+            numbers {list} -- non negative numbers
+            buf {bytearray} -- buffer to append encoded numbers
+        """
+
+        for number in numbers:
+            encode_varint(number, buf)
+
+    @staticmethod
+    def decode(buf, offset, count):
+        """decode count numbers from buffer
+
+        Arguments:
+            buf {bytearray} -- buffer of encoded numbers
+            offset {int} -- position of first byte of numbers in buffer
+            count {int} -- number of numbers to decode
+
+        Returns:
+            (list, int) -- list of numbers and position after them
+        """
+
+        return decode_varints(buf, offset, count)
+
+
+class GammaCodec(object):
+    """Elias gamma codec, number + 1 is encoded since gamma code is just for
+    positive numbers
+    """
+
+    name = 'gamma'
+    codec_id = 1
+
+    @staticmethod
+    def encode(numbers, buf):
+        """append encoded numbers to buffer
+
+        Arguments:
+            numbers {list} -- non negative numbers
+            buf {bytearray} -- buffer to append encoded numbers
+        """
+
+        codes = []
+        for number in numbers:
+            binary = bin(number + 1)[2:]
+            codes.append('0' * (len(binary) - 1))
+            codes.append(binary)
+        bits_to_bytes(''.join(codes), buf)
+
+    @staticmethod
+    def _more_bits(bits, buf, next_byte, chunk):
+        if next_byte >= len(buf):
+            raise ValueError('gamma codes are cut at byte %d' % next_byte)
+        bits += ''.join([BYTE_BITS[byte]
+                         for byte in buf[next_byte:next_byte + chunk]])
+        return bits, next_byte + chunk
+
+    @staticmethod
+    def decode(buf, offset, count):
+        """decode count numbers from buffer, bytes are turned to binary digits
+        as they are needed
+
+        Arguments:
+            buf {bytearray} -- buffer of encoded numbers
+            offset {int} -- position of first byte of numbers in buffer
+            count {int} -- number of numbers to decode
+
+        Returns:
+            (list, int) -- list of numbers and position after them
+        """
+
+        numbers = []
+        bits = ''
+        pos = 0
+        next_byte = offset
+        chunk = max(count, 8)
+        for _ in xrange(count):
+            one = bits.find('1', pos)
+            while one < 0:
+                bits, next_byte = GammaCodec._more_bits(bits, buf, next_byte,
+                                                        chunk)
+                one = bits.find('1', pos)
+            end = 2 * one - pos + 1
+            while end > len(bits):
+                bits, next_byte = GammaCodec._more_bits(bits, buf, next_byte,
+                                                        chunk)
+            numbers.append(int(bits[one:end], 2) - 1)
+            pos = end
+        return numbers, offset + (pos + 7) // 8
+
+
+class PForDeltaCodec(object):
+    """patched frame of reference codec; each block is number of packed bits
+    (one byte), number of exceptions (varint), packed low bits of numbers in
+    little endian order, then gap of index and high bits of each exception
+    (varints)
+    """
+
+    name = 'pfor'
+    codec_id = 2
+
+    @staticmethod
+    def block_bits(block):
+        """number of packed bits which fits PFOR_FIT_RATIO of block
+
+        Arguments:
+            block {list} -- numbers of block
+
+        Returns:
+            int -- number of bits
+        """
+
+        lengths = sorted(number.bit_length() for number in block)
+        return lengths[int(PFOR_FIT_RATIO * (len(lengths) - 1))]
+
+    @classmethod
+    def encode(cls, numbers, buf):
+        """append encoded numbers to buffer
+
+        Arguments:
+            numbers {list} -- non negative numbers
+            buf {bytearray} -- buffer to append encoded numbers
+        """
+
+        for start in xrange(0, len(numbers), PFOR_BLOCK_SIZE):
+            block = numbers[start:start + PFOR_BLOCK_SIZE]
+            bits = cls.block_bits(block)
+            mask = (1 << bits) - 1
+            packed = 0
+            exceptions = []
+            for idx, number in enumerate(block):
+                packed |= (number & mask) << (idx * bits)
+                if number > mask:
+                    exceptions.append((idx, number >> bits))
+            buf.append(bits)
+            encode_varint(len(exceptions), buf)
+            length = (len(block) * bits + 7) // 8
+            if length:
+                buf.extend(binascii.unhexlify('%0*x' % (length * 2,
+                                                        packed))[::-1])
+            last_idx = 0
+            for idx, high in exceptions:
+                encode_varint(idx - last_idx, buf)
+                encode_varint(high, buf)
+                last_idx = idx
+
+    @staticmethod
+    def decode(buf, offset, count):
+        """decode count numbers from buffer
+
+        Arguments:
+            buf {bytearray} -- buffer of encoded numbers
+            offset {int} -- position of first byte of numbers in buffer
+            count {int} -- number of numbers to decode
+
+        Returns:
+            (list, int) -- list of numbers and position after them
+        """
+
+        numbers = []
+        for start in xrange(0, count, PFOR_BLOCK_SIZE):
+            size = min(PFOR_BLOCK_SIZE, count - start)
+            bits = buf[offset]
+            number_of_exception, offset = decode_varint(buf, offset + 1)
+            length = (size * bits + 7) // 8
+            if length:
+                packed = int(binascii.hexlify(
+                    str(buf[offset:offset + length])[::-1]), 16)
+                mask = (1 << bits) - 1
+                # packed block is a long, small numbers are made int again
+                block = [int((packed >> shift) & mask)
+                         for shift in xrange(0, size * bits, bits)]
+            else:
+                block = [0] * size
+            offset += length
+            idx = 0
+            for _ in xrange(number_of_exception):
+                gap, offset = decode_varint(buf, offset)
+                high, offset = decode_varint(buf, offset)
+                idx += gap
+                block[idx] |= high << bits
+            numbers.extend(block)
+        return numbers, offset
+
+
+CODECS = dict((codec.name, codec) for codec in (VByteCodec, GammaCodec,
+                                                PForDeltaCodec))
+CODEC_IDS = dict((codec.codec_id, codec) for codec in CODECS.itervalues())
+
+
+def get_codec(name):
+    """codec by its name
+
+    Arguments:
+        name {str} -- one of vbyte, gamma or pfor
+
+    Returns:
+        class -- codec
+    """
+
+    if name not in CODECS:
+        raise ValueError('codec must be one of %s' % ', '.join(sorted(CODECS)))
+    return CODECS[name]
@@ -0,0 +1,320 @@
+#!/usr/bin/env python
+# -*- encoding: utf8 -*-
+"""caches of search which are bounded by size in bytes and evict least
+recently used entries: decoded posting lists of inverted index and final
+results of queries keyed by normalized query
+
+queries are skewed to a few hundred terms, so decoding posting lists of them
+again from compressed memory-mapped index and answering same queries again
+is saved. both caches keep number of hits, misses and evictions; posting
+lists are cached per reader of inverted index and query results are cleared
+when they are asked for another inverted index, so a made or merged index
+never answers from cache of the former one
+
+    __author__ = "Erfan Rahnemoon"
+    __version__ = "0.0.1"
+    __maintainer__ = "Erfan Rahnemoon"
+    __email__ = "erfan@rahnemoon.name"
+"""
+import collections
+import json
+import os
+import sys
+import threading
+
+import boolean_query
+import index_storage
+import phrase_query
+import ranking
+
+POSTING_CACHE_BYTES = 64 * 1024 * 1024
+RESULT_CACHE_BYTES = 16 * 1024 * 1024
+# size of an int object which is not cached by python, doc ids and offsets
+INT_BYTES = sys.getsizeof(1 << 20)
+
+
+class LRUCache(object):
+    """least recently used cache bounded by total size of its values in
+    bytes, size of each value is given by sizeof; values bigger than whole
+    cache are not kept. cache is shared by threads of search server so
+    changes are done under a lock
+    """
+
+    def __init__(self, max_bytes, sizeof=sys.getsizeof):
+        self.max_bytes = max_bytes
+        self.sizeof = sizeof
+        self.bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._entries = collections.OrderedDict()
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._entries)
+
+    def get(self, key, default=None):
+        """value of key and mark it as most recently used
+
+        Arguments:
+            key {obj} -- key of value
+
+        Keyword Arguments:
+            default {obj} -- returned if key is not in cache (default: {None})
+
+        Returns:
+            obj -- cached value or default
+        """
+
+        with self._lock:
+            try:
+                value, size = self._entries.pop(key)
+            except KeyError:
+                self.misses += 1
+                return default
+            self._entries[key] = value, size
+            self.hits += 1
+            return value
+
+    def put(self, key, value):
+        """cache value and evict least recently used values until cache is
+        not bigger than max_bytes
+
+        Arguments:
+            key {obj} -- key of value
+            value {obj} -- value to cache
+        """
+
+        size = self.sizeof(value)
+        with self._lock:
+            if key in self._entries:
+                self.bytes -= self._entries.pop(key)[1]
+            if size > self.max_bytes:
+                return
+            self._entries[key] = value, size
+            self.bytes += size
+            self._evict()
+
+    def _evict(self):
+        while self.bytes > self.max_bytes:
+            _, (_, size) = self._entries.popitem(last=False)
+            self.bytes -= size
+            self.evictions += 1
+
+    def resize(self, max_bytes):
+        """change bound of cache, least recently used values are evicted if
+        cache is bigger than new bound
+
+        Arguments:
+            max_bytes {int} -- max total size of values in bytes
+        """
+
+        with self._lock:
+            self.max_bytes = max_bytes
+            self._evict()
+
+    def clear(self):
+        """remove all values, statistics are kept
+        """
+
+        with self._lock:
+            self._entries.clear()
+            self.bytes = 0
+
+    def stats(self):
+        """statistics of cache
+
+        Returns:
+            dictionary -- entries, bytes, max_bytes, hits, misses, evictions
+            and hit_rate
+        """
+
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {'entries': len(self._entries), 'bytes': self.bytes,
+                    'max_bytes': self.max_bytes, 'hits': self.hits,
+                    'misses': self.misses, 'evictions': self.evictions,
+                    'hit_rate': float(self.hits) / lookups if lookups else 0.0}
+
+
+def posting_list_size(postings):
+    """estimated size of decoded posting list in bytes, compressed buffer,
+    lists of doc ids, term frequencies and offsets of position blocks and
+    int objects of doc ids and offsets (small term frequencies are shared
+    by python)
+
+    Arguments:
+        postings {PostingList} -- decoded posting list
+
+    Returns:
+        int -- size in bytes
+    """
+
+    return (sys.getsizeof(postings) + sys.getsizeof(postings._buf) +
+            sys.getsizeof(postings.doc_ids) + sys.getsizeof(postings.tfs) +
+            sys.getsizeof(postings._block_offsets) +
+            2 * INT_BYTES * len(postings.doc_ids))
+
+
+def result_size(result):
+    """estimated size of query result in bytes by length of its json
+
+    Arguments:
+        result {obj} -- result of query
+
+    Returns:
+        int -- size in bytes
+    """
+
+    return sys.getsizeof(json.dumps(result))
+
+
+class CachedIndexReader(index_storage.BinaryIndexReader):
+    """reader of binary inverted index which keeps decoded posting lists of
+    recently used terms; decoded posting lists are just read by queries so
+    they are shared by threads
+    """
+
+    def __init__(self, path, max_bytes=POSTING_CACHE_BYTES):
+        index_storage.BinaryIndexReader.__init__(self, path)
+        stat = os.stat(path)
+        # identity of file which is read, changes when index is made again
+        self.identity = (path, stat.st_ino, stat.st_mtime)
+        self.posting_cache = LRUCache(max_bytes, posting_list_size)
+
+    def posting_list(self, term):
+        """read posting list of term from cache or decode it from index
+
+        Arguments:
+            term {str} -- token
+
+        Returns:
+            PostingList -- posting list or None if term is not in index
+        """
+
+        term = index_storage.encode_term(term)
+        postings = self.posting_cache.get(term)
+        if postings is None:
+            postings = index_storage.BinaryIndexReader.posting_list(self,
+                                                                    term)
+            if postings is not None:
+                self.posting_cache.put(term, postings)
+        return postings
+
+
+def word_key(word, analyzer):
+    """key of a word of search or boolean query, normalized forms of analyzer
+    if word is one term, since just then they are looked up in index
+
+    Arguments:
+        word {str} -- word of query
+        analyzer {obj} -- analyzer of queries
+
+    Returns:
+        obj -- tokens of analyzer or lower case word
+    """
+
+    tokens = analyzer.query_tokens(word)
+    if len(tokens) == 1:
+        return tokens
+    return word.lower()
+
+
+def phrase_key(query, analyzer):
+    """key of phrase query, normalized forms of its terms with their offset
+    from first term, and distance of proximity query
+
+    Arguments:
+        query {str} -- phrase query like "fuel economy" or "seat comfortable"~5
+        analyzer {obj} -- analyzer of queries
+
+    Returns:
+        tuple -- key of phrase
+    """
+
+    match = phrase_query.PHRASE_PATTERN.match(query)
+    if match is None:
+        return (query,)
+    tokens = analyzer.query_tokens(match.group(1))
+    first_offset = tokens[0][1] if tokens else 0
+    return (tuple((candidates, offset - first_offset)
+                  for candidates, offset in tokens), match.group(2))
+
+
+def normalize_query(endpoint, params, analyzer=None):
+    """key of query result, query text is normalized like it is parsed so
+    queries which are answered the same share a key; terms are keyed by
+    output of analyzer of queries if it is given, so Quiet  CABIN! and quiet
+    cabin share a key of ranked query
+
+    Arguments:
+        endpoint {str} -- kind of query
+        params {dictionary} -- parameters of query, all as str
+
+    Keyword Arguments:
+        analyzer {obj} -- analyzer of queries (default: {None})
+
+    Returns:
+        tuple -- key of result
+    """
+
+    query = params['q']
+    if analyzer is None:
+        if endpoint == 'ranked':
+            # ranked query is just its lower case terms
+            query = ' '.join(ranking.query_terms(query))
+        else:
+            query = ' '.join(query.split())
+    elif endpoint == 'ranked':
+        # positions of terms do not change scores
+        query = tuple(candidates for candidates, _
+                      in analyzer.query_tokens(query))
+    elif endpoint == 'search':
+        query = word_key(query, analyzer)
+    elif endpoint == 'phrase':
+        query = phrase_key(query, analyzer)
+    elif endpoint == 'boolean':
+        # operators and parentheses are kept as they are
+        query = tuple(
+            token if token in boolean_query.OPERATORS or token in ('(', ')')
+            else phrase_key(token, analyzer) if token.startswith('"')
+            else word_key(token, analyzer)
+            for token in boolean_query.tokenize_query(query))
+    else:
+        query = ' '.join(query.split())
+    options = tuple(sorted((name, value) for name, value in params.iteritems()
+                           if name != 'q'))
+    return endpoint, query, options
+
+
+class ResultCache(LRUCache):
+    """cache of query results keyed by identity of inverted index and
+    normalized query; cache is cleared when results of another index are
+    asked, and a result of former index put late by another thread is never
+    found since its key has identity of former index
+    """
+
+    def __init__(self, max_bytes=RESULT_CACHE_BYTES):
+        LRUCache.__init__(self, max_bytes, result_size)
+        self.generation = None
+
+    def key(self, generation, endpoint, params, analyzer=None):
+        """key of query result, cache is cleared if generation is changed
+
+        Arguments:
+            generation {obj} -- identity of inverted index (and shards)
+            endpoint {str} -- kind of query
+            params {dictionary} -- parameters of query, all as str
+
+        Keyword Arguments:
+            analyzer {obj} -- analyzer of queries which terms are keyed by
+            (default: {None})
+
+        Returns:
+            tuple -- key of result
+        """
+
+        if generation != self.generation:
+            self.clear()
+            self.generation = generation
+        return (generation,) + normalize_query(endpoint, params, analyzer)
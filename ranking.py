@@ -0,0 +1,328 @@
+#!/usr/bin/env python
+# -*- encoding: utf8 -*-
+"""ranked retrieval over binary inverted index by BM25 and TF-IDF, document
+lengths and collection statistics are read from index and best documents
+are selected by a heap
+
+    __author__ = "Erfan Rahnemoon"
+    __version__ = "0.0.1"
+    __maintainer__ = "Erfan Rahnemoon"
+    __email__ = "erfan@rahnemoon.name"
+"""
+import heapq
+import math
+import re
+from bisect import bisect_left
+
+BM25_K1 = 1.2
+BM25_B = 0.75
+SCORERS = ('bm25', 'tfidf')
+
+
+def query_terms(query):
+    """split query to lower case terms
+
+    Arguments:
+        query {str} -- query text
+
+    Returns:
+        list -- terms of query
+    """
+
+    return re.findall('[a-z]+', query.lower())
+
+
+def bm25_idf(num_docs, number_of_doc):
+    """inverse document frequency of BM25, never negative
+
+    Arguments:
+        num_docs {int} -- number of documents in collection
+        number_of_doc {int} -- number of documents contain term
+
+    Returns:
+        float -- idf of term
+    """
+
+    return math.log(1.0 + (num_docs - number_of_doc + 0.5) /
+                    (number_of_doc + 0.5))
+
+
+def bm25_weight(tf, doc_length, avg_doc_length, k1=BM25_K1, b=BM25_B):
+    """BM25 weight of term frequency in a document, score is idf times weight
+
+    Arguments:
+        tf {int} -- frequency of term in document
+        doc_length {int} -- length of document
+        avg_doc_length {float} -- average length of documents
+
+    Keyword Arguments:
+        k1 {float} -- saturation of term frequency (default: {BM25_K1})
+        b {float} -- strength of length normalization (default: {BM25_B})
+
+    Returns:
+        float -- weight
+    """
+
+    norm = k1 * (1.0 - b + b * doc_length / avg_doc_length)
+    return tf * (k1 + 1.0) / (tf + norm)
+
+
+def bm25_score(tf, doc_length, avg_doc_length, idf, k1=BM25_K1, b=BM25_B):
+    """BM25 score of a term in a document
+
+    Arguments:
+        tf {int} -- frequency of term in document
+        doc_length {int} -- length of document
+        avg_doc_length {float} -- average length of documents
+        idf {float} -- idf of term
+
+    Keyword Arguments:
+        k1 {float} -- saturation of term frequency (default: {BM25_K1})
+        b {float} -- strength of length normalization (default: {BM25_B})
+
+    Returns:
+        float -- score
+    """
+
+    return idf * bm25_weight(tf, doc_length, avg_doc_length, k1, b)
+
+
+def tfidf_idf(num_docs, number_of_doc):
+    """inverse document frequency of TF-IDF
+
+    Arguments:
+        num_docs {int} -- number of documents in collection
+        number_of_doc {int} -- number of documents contain term
+
+    Returns:
+        float -- idf of term
+    """
+
+    return math.log(float(num_docs) / number_of_doc)
+
+
+def tfidf_weight(tf, doc_length, avg_doc_length):
+    """TF-IDF weight of term frequency in a document by logarithmic term
+    frequency and pivoted document length normalization, score is idf times
+    weight
+
+    Arguments:
+        tf {int} -- frequency of term in document
+        doc_length {int} -- length of document
+        avg_doc_length {float} -- average length of documents
+
+    Returns:
+        float -- weight
+    """
+
+    norm = 1.0 - BM25_B + BM25_B * doc_length / avg_doc_length
+    return (1.0 + math.log(tf)) / norm
+
+
+def tfidf_score(tf, doc_length, avg_doc_length, idf):
+    """TF-IDF score of a term in a document
+
+    Arguments:
+        tf {int} -- frequency of term in document
+        doc_length {int} -- length of document
+        avg_doc_length {float} -- average length of documents
+        idf {float} -- idf of term
+
+    Returns:
+        float -- score
+    """
+
+    return idf * tfidf_weight(tf, doc_length, avg_doc_length)
+
+
+def term_scorer(scorer):
+    """idf and weight functions of scorer, score of a term in a document is
+    idf times weight
+
+    Arguments:
+        scorer {str} -- name of scorer, bm25 or tfidf
+
+    Returns:
+        (function, function) -- idf function and weight function
+    """
+
+    if scorer == 'bm25':
+        return bm25_idf, bm25_weight
+    if scorer == 'tfidf':
+        return tfidf_idf, tfidf_weight
+    raise ValueError('unknown scorer: %s' % scorer)
+
+
+def top_k(k, iter_doc_scores):
+    """k best documents, on same score smaller doc id wins
+
+    Arguments:
+        k {int} -- number of results
+        iter_doc_scores {iterable} -- (doc_id, score) pairs
+
+    Returns:
+        list -- (score, doc_id) of best documents sorted by score
+    """
+
+    best = heapq.nlargest(k, iter_doc_scores,
+                          key=lambda doc_score: (doc_score[1], -doc_score[0]))
+    return [(score, doc_id) for doc_id, score in best]
+
+
+def rank(inverted_index, terms, k=10, scorer='bm25', stats=None):
+    """score all documents contain any term of query and return k best of
+    them, posting lists are walked term at a time
+
+    Arguments:
+        inverted_index {obj} -- reader of inverted index
+        terms {list} -- terms of query
+
+    Keyword Arguments:
+        k {int} -- number of results (default: {10})
+        scorer {str} -- name of scorer, bm25 or tfidf (default: {'bm25'})
+        stats {dictionary} -- if given number of scored postings is stored in
+        it as postings_scored (default: {None})
+
+    Returns:
+        list -- (score, doc_id) of best documents sorted by score
+    """
+
+    idf_fun, weight_fun = term_scorer(scorer)
+    avg_doc_length = inverted_index.avg_doc_length
+    accumulators = {}
+    postings_scored = 0
+    for term in terms:
+        info = inverted_index.term_info(term)
+        if info is None:
+            continue
+        postings = inverted_index.posting_list(term)
+        idf = idf_fun(inverted_index.num_docs, info.number_of_doc)
+        for doc_id, tf in zip(postings.doc_ids, postings.tfs):
+            accumulators[doc_id] = accumulators.get(doc_id, 0.0) + idf * \
+                weight_fun(tf, inverted_index.doc_length(doc_id),
+                           avg_doc_length)
+        postings_scored += len(postings)
+    if stats is not None:
+        stats['postings_scored'] = postings_scored
+    return top_k(k, accumulators.iteritems())
+
+
+class TermCursor(object):
+    """cursor over posting list of a query term with upper bound of its score
+    """
+
+    def __init__(self, postings, idf, upper_bound):
+        self.doc_ids = postings.doc_ids
+        self.tfs = postings.tfs
+        self.idf = idf
+        self.upper_bound = upper_bound
+        self.idx = 0
+
+    def doc_id(self):
+        """doc id under cursor or None if posting list is finished
+        """
+
+        if self.idx < len(self.doc_ids):
+            return self.doc_ids[self.idx]
+        return None
+
+    def next_geq(self, doc_id):
+        """move cursor to first doc id not less than doc_id
+
+        Arguments:
+            doc_id {int} -- target doc id
+
+        Returns:
+            int -- doc id under cursor or None if posting list is finished
+        """
+
+        self.idx = bisect_left(self.doc_ids, doc_id, self.idx)
+        return self.doc_id()
+
+
+def rank_maxscore(inverted_index, terms, k=10, scorer='bm25', stats=None):
+    """return k best documents for query by MaxScore dynamic pruning, terms
+    are split to essential and non-essential by their score upper bound
+    stored in index; documents which just contain non-essential terms can
+    not enter top k so they are skipped, and scoring of a document stops when
+    it can not reach the top k anymore
+
+    Arguments:
+        inverted_index {obj} -- reader of inverted index
+        terms {list} -- terms of query
+
+    Keyword Arguments:
+        k {int} -- number of results (default: {10})
+        scorer {str} -- name of scorer, bm25 or tfidf (default: {'bm25'})
+        stats {dictionary} -- if given number of scored postings is stored in
+        it as postings_scored (default: {None})
+
+    Returns:
+        list -- (score, doc_id) of best documents sorted by score
+    """
+
+    if k <= 0:
+        if stats is not None:
+            stats['postings_scored'] = 0
+        return []
+    idf_fun, weight_fun = term_scorer(scorer)
+    avg_doc_length = inverted_index.avg_doc_length
+    cursors = []
+    for term in terms:
+        info = inverted_index.term_info(term)
+        if info is None:
+            continue
+        idf = idf_fun(inverted_index.num_docs, info.number_of_doc)
+        max_weight = info.max_bm25 if scorer == 'bm25' else info.max_tfidf
+        cursors.append(TermCursor(inverted_index.posting_list(term), idf,
+                                  idf * max_weight))
+    # ascending upper bounds, cumulative bound of first terms
+    cursors.sort(key=lambda cursor: cursor.upper_bound)
+    cumulative_bounds = []
+    total = 0.0
+    for cursor in cursors:
+        total += cursor.upper_bound
+        cumulative_bounds.append(total)
+    heap = []
+    threshold = 0.0
+    first_essential = 0
+    postings_scored = 0
+    while first_essential < len(cursors):
+        essential = cursors[first_essential:]
+        candidates = [cursor.doc_id() for cursor in essential
+                      if cursor.doc_id() is not None]
+        if not candidates:
+            break
+        doc_id = min(candidates)
+        doc_length = inverted_index.doc_length(doc_id)
+        score = 0.0
+        for cursor in essential:
+            if cursor.doc_id() == doc_id:
+                score += cursor.idf * weight_fun(cursor.tfs[cursor.idx],
+                                                 doc_length, avg_doc_length)
+                cursor.idx += 1
+                postings_scored += 1
+        # non-essential terms from biggest bound, stop if top k is unreachable
+        for idx in xrange(first_essential - 1, -1, -1):
+            if score + cumulative_bounds[idx] <= threshold:
+                break
+            cursor = cursors[idx]
+            if cursor.next_geq(doc_id) == doc_id:
+                score += cursor.idf * weight_fun(cursor.tfs[cursor.idx],
+                                                 doc_length, avg_doc_length)
+                postings_scored += 1
+        if len(heap) < k:
+            heapq.heappush(heap, (score, -doc_id))
+        elif score > heap[0][0]:
+            heapq.heapreplace(heap, (score, -doc_id))
+        else:
+            continue
+        if len(heap) == k:
+            threshold = heap[0][0]
+            while first_essential < len(cursors) and \
+                    cumulative_bounds[first_essential] <= threshold:
+                first_essential += 1
+    if stats is not None:
+        stats['postings_scored'] = postings_scored
+    return [(score, -neg_doc_id) for score, neg_doc_id
+            in sorted(heap, reverse=True)]
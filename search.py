@@ -9,19 +9,65 @@
     __maintainer__ = "Erfan Rahnemoon"
     __email__ = "erfan@rahnemoon.name"
 """
+import cPickle
 import errno
 import getopt
+import gzip
+import hashlib
 import json
 import os
 import parser
 import pprint
+import socket
 import sys
+import threading
+import time
+import urllib
+import urllib2
 
-import ahocorasick
-import beautifultable
+import boolean_query
 import spellchecker
+import spelling_index
+import incremental_index
+import index_export
+import index_storage
 import inverted_index_maker
+import metrics
+import phrase_query
+import posting_codecs
+import query_cache
+import ranking
+import shard_index
 import tokenizers_normalizer
+import vector_index
+import wildcard_index
+
+INVERTED_INDEX_PATH = 'data-files/inverted-index.bin'
+SPELL_DICTIONARY_PATH = 'spell_checker/en.json.gz'
+CACHE_VERSION = 3
+FUZZY_TIME_BUDGET_MS = 20
+SERVER_ADDRESS = 'localhost:8642'
+SERVER_TIMEOUT = 30
+EXPORT_PATH = 'table_inverted_index'
+ENDPOINTS = ('search', 'spell', 'wildcard', 'ranked', 'boolean', 'phrase')
+# endpoints which normalize query by analyzer, their results are keyed by it
+ANALYZED_ENDPOINTS = ('search', 'ranked', 'boolean', 'phrase')
+QUERY_OPTIONS = {'-s': 'search', '--search': 'search',
+                 '--spell': 'spell',
+                 '-w': 'wildcard', '--wildcard': 'wildcard',
+                 '-r': 'ranked', '--ranked': 'ranked',
+                 '-b': 'boolean', '--boolean': 'boolean',
+                 '-q': 'phrase', '--phrase': 'phrase'}
+# shards opened by queries, opened again when shards or index are replaced
+SHARDED_INDEX = {}
+SHARDED_INDEX_LOCK = threading.Lock()
+# numpy view of inverted index for vectorized ranking, made again for a new
+# reader
+ARRAY_INDEX = {}
+ARRAY_INDEX_LOCK = threading.Lock()
+# results of queries answered in process, posting lists are cached by reader
+RESULT_CACHE = query_cache.ResultCache()
+CACHE_BYTES = {'posting': query_cache.POSTING_CACHE_BYTES}
 
 
 def read_json(path):
@@ -65,102 +111,344 @@ def spell_checking(spell, input_word):
     return spell.correction(input_word), list(spell.candidates(input_word))
 
 
-def make_wild_cart(list_of_word):
-    """make ahocorasick tree for wildcard search
+def cache_paths(inverted_index_path=INVERTED_INDEX_PATH):
+    """paths of caches stored next to inverted index
+
+    Keyword Arguments:
+        inverted_index_path {str} -- path to the inverted index file
+        (default: {'data-files/inverted-index.bin'})
+
+    Returns:
+        (str, str, str, str) -- path of cache manifest, pickled wildcard
+        index, pickled fuzzy spelling index and spelling frequency table
+    """
+
+    base = os.path.splitext(inverted_index_path)[0]
+    return (base + '.cache.json', base + '.wildcard.pickle',
+            base + '.fuzzy.pickle', base + '.spell.json.gz')
+
+
+def cache_fingerprint(inverted_index, spell_dictionary_path):
+    """fingerprint of everything caches are made from, term dictionary of
+    index, spelling dictionary and version of cache format
 
     Arguments:
-        list_of_word {list} -- list of all token in inverted index
+        inverted_index {obj} -- reader of inverted index
+        spell_dictionary_path {str} -- path to spelling dictionary
 
     Returns:
-        obj -- object of ahocorasick tree
+        str -- hex digest
+    """
+
+    stat = os.stat(spell_dictionary_path)
+    digest = hashlib.sha1(inverted_index.dictionary_fingerprint())
+    digest.update('{}:{}:{}'.format(CACHE_VERSION, stat.st_size,
+                                    int(stat.st_mtime)))
+    return digest.hexdigest()
+
+
+def write_spell_dictionary(list_tokens, spell_dictionary_path, path):
+    """write spelling dictionary merged with tokens of index, like
+    word_frequency.load_words each token adds one to its frequency
+
+    Arguments:
+        list_tokens {list} -- list of all token in inverted index
+        spell_dictionary_path {str} -- path to spelling dictionary
+        path {str} -- path to merged frequency table
     """
 
-    tree = ahocorasick.Automaton()
-    for idx, key in enumerate(list_of_word):
-        tree.add_word(str(key), (idx, str(key)))
+    with gzip.open(spell_dictionary_path, 'rb') as reader:
+        dic_frequency = json.load(reader)
+    for token in list_tokens:
+        token = token.lower()
+        dic_frequency[token] = dic_frequency.get(token, 0) + 1
+    with gzip.open(path + '.tmp', 'wb') as writer:
+        json.dump(dic_frequency, writer)
+    os.rename(path + '.tmp', path)
+
+
+def pickle_structure(structure, path):
+    """pickle structure to file, file is replaced at once when it is written
+
+    Arguments:
+        structure {obj} -- structure to pickle
+        path {str} -- path to pickle file
+    """
 
-    return tree
+    with open(path + '.tmp', 'wb') as writer:
+        cPickle.dump(structure, writer, cPickle.HIGHEST_PROTOCOL)
+    os.rename(path + '.tmp', path)
 
 
-def make_inverted_index():
+@metrics.timed('search.load_dictionary_structures', memory=True)
+def load_dictionary_structures(inverted_index,
+                               spell_dictionary_path=SPELL_DICTIONARY_PATH,
+                               rebuild=False):
+    """load spell checker, wildcard index and fuzzy spelling index of term
+    dictionary from caches next to index, if caches are missing or made for
+    other index make them again
+
+    Arguments:
+        inverted_index {obj} -- reader of inverted index
+
+    Keyword Arguments:
+        spell_dictionary_path {str} -- path to spelling dictionary
+        (default: {SPELL_DICTIONARY_PATH})
+        rebuild {bool} -- make caches even if they are fresh
+        (default: {False})
+
+    Returns:
+        obj, obj, obj, bool -- object of spell checker, object of wildcard
+        index, object of fuzzy spelling index and if they were loaded from
+        cache
+    """
+
+    path_manifest, path_wild_card, path_fuzzy, path_spell = cache_paths(
+        inverted_index.path)
+    fingerprint = cache_fingerprint(inverted_index, spell_dictionary_path)
+    cached = not rebuild and os.path.isfile(path_manifest) and \
+        read_json(path_manifest).get('fingerprint') == fingerprint
+    if cached:
+        with open(path_wild_card, 'rb') as reader:
+            wild_card_index = cPickle.load(reader)
+        with open(path_fuzzy, 'rb') as reader:
+            fuzzy_index = cPickle.load(reader)
+    else:
+        # manifest is written last so half written caches are never used
+        if os.path.isfile(path_manifest):
+            os.remove(path_manifest)
+        list_tokens = inverted_index.keys()
+        wild_card_index = wildcard_index.KGramIndex(list_tokens)
+        pickle_structure(wild_card_index, path_wild_card)
+        fuzzy_index = spelling_index.make_spelling_index(inverted_index)
+        pickle_structure(fuzzy_index, path_fuzzy)
+        write_spell_dictionary(list_tokens, spell_dictionary_path, path_spell)
+        write_in_file(json.dumps({'fingerprint': fingerprint}), path_manifest)
+    spell = spellchecker.SpellChecker(language=None,
+                                      local_dictionary=path_spell)
+    return spell, wild_card_index, fuzzy_index, cached
+
+
+@metrics.profiled('search.make_inverted_index')
+@metrics.timed('search.make_inverted_index', memory=True)
+def make_inverted_index(workers=None, streaming=False, keep_artifacts=False,
+                        memory_budget=None,
+                        codec=posting_codecs.DEFAULT_CODEC):
     """make inverted index file from other files
+
+    Keyword Arguments:
+        workers {int} -- number of worker processes for parsing and
+        preprocessing, 0 for number of cpu cores and None for parsing in this
+        process and one thread per json file (default: {None})
+        streaming {bool} -- stream documents from xml files through
+        preprocessing to index maker without intermediate files
+        (default: {False})
+        keep_artifacts {bool} -- in streaming mode also write parsed and
+        preprocessed json files (default: {False})
+        memory_budget {int} -- if given make inverted index by SPIMI with this
+        memory budget in bytes (default: {None})
+        codec {str} -- posting codec, one of vbyte, gamma or pfor
+        (default: {posting_codecs.DEFAULT_CODEC})
     """
 
-    parser.parsing()
-    tokenizers_normalizer.make_preprocessed_file()
-    inverted_index_maker.make_inverted_index()
+    # doc ids of whole index are given again, so manifest of incremental
+    # index is not valid anymore
+    incremental_index.reset()
+    if streaming:
+        make_inverted_index_streaming(keep_artifacts,
+                                      memory_budget=memory_budget,
+                                      workers=workers, codec=codec)
+        return
+    parser.parsing(workers=workers)
+    tokenizers_normalizer.make_preprocessed_file(workers)
+    inverted_index_maker.make_inverted_index(memory_budget=memory_budget,
+                                             codec=codec)
+
+
+def make_inverted_index_streaming(keep_artifacts=False,
+                                  base_source_path='data-files/cars',
+                                  base_result_path='data-files/json_data/cars',
+                                  memory_budget=None, workers=None,
+                                  codec=posting_codecs.DEFAULT_CODEC):
+    """make inverted index by passing documents as generators from xml files
+    through tokenizer and normalizer to index maker, so in memory there is
+    just one batch of documents and the index under construction
 
+    Keyword Arguments:
+        keep_artifacts {bool} -- also write parsed and preprocessed json files
+        (default: {False})
+        base_source_path {str} -- path to xml files of data-set
+        (default: {'data-files/cars'})
+        base_result_path {str} -- path to store json files
+        (default: {'data-files/json_data/cars'})
+        memory_budget {int} -- if given make inverted index by SPIMI with this
+        memory budget in bytes (default: {None})
+        workers {int} -- number of worker processes for parsing xml files, 0
+        for number of cpu cores and None for parsing in this process
+        (default: {None})
+        codec {str} -- posting codec, one of vbyte, gamma or pfor
+        (default: {posting_codecs.DEFAULT_CODEC})
+    """
 
-def read_inverted_index(inverted_index_path='data-files/inverted-index.json'):
-    """read inverted index file and return a dictionary of it
+    dic_file = parser.get_all_file_by_path(base_source_path)
+    iter_docs = parser.iter_docs(dic_file, workers)
+    if keep_artifacts:
+        iter_docs = parser.iter_write_json(iter_docs,
+                                           base_result_path + '/parsed',
+                                           names=dic_file)
+    iter_root_docs = ((str(name) + '.json', dic_doc)
+                      for name, dic_doc in iter_docs)
+    iter_preprocessed = tokenizers_normalizer.iter_preprocessed(iter_root_docs)
+    if keep_artifacts:
+        iter_preprocessed = (dic_doc for _, dic_doc in parser.iter_write_json(
+            ((dic_doc['root'], dic_doc) for dic_doc in iter_preprocessed),
+            base_result_path + '/preprocessed', extension='',
+            names=(str(name) + '.json' for name in dic_file)))
+    if memory_budget:
+        inverted_index_maker.store_inverted_index_spimi(iter_preprocessed,
+                                                        memory_budget,
+                                                        codec=codec)
+        return
+    inverted_index_maker.store_inverted_index(
+        inverted_index_maker.build_inverted_index(iter_preprocessed),
+        codec=codec)
+
+
+@metrics.timed('search.read_inverted_index', memory=True)
+def read_inverted_index(inverted_index_path=INVERTED_INDEX_PATH):
+    """open binary inverted index file, posting lists are read lazily from
+    memory-mapped file and decoded ones are kept in a LRU cache
 
     Keyword Arguments:
         inverted_index_path {str} -- path to the inverted index file
-        (default: {'data-files/inverted-index.json'})
+        (default: {'data-files/inverted-index.bin'})
 
     Returns:
-        dictionary -- dictionary of tokens and posting-lists
+        obj -- reader of inverted index which behaves like dictionary of
+        tokens and posting-lists
     """
 
-    return read_json(inverted_index_path)
+    return query_cache.CachedIndexReader(inverted_index_path,
+                                         CACHE_BYTES['posting'])
 
 
-def wild_card_search(tree, wild_card):
-    """wildcard search in ahocorasick tree
+def set_cache_sizes(posting_bytes=None, result_bytes=None):
+    """change bound of posting list cache of readers opened after it and
+    bound of query result cache
+
+    Keyword Arguments:
+        posting_bytes {int} -- bound of posting list cache in bytes, 0
+        disables it (default: {None})
+        result_bytes {int} -- bound of query result cache in bytes, 0
+        disables it (default: {None})
+    """
+
+    if posting_bytes is not None:
+        CACHE_BYTES['posting'] = posting_bytes
+    if result_bytes is not None:
+        RESULT_CACHE.resize(result_bytes)
+
+
+def cache_stats(inverted_index):
+    """hits, misses and size of posting list cache of reader and query
+    result cache
 
     Arguments:
-        tree {obj} -- object of ahocorasick
-        wild_card {str} -- wild card query
+        inverted_index {obj} -- reader of inverted index
 
     Returns:
-        (list,list,list) -- list of all match with diffrent rule for wildcard
+        dictionary -- statistics of posting and result cache
     """
 
-    exact_length_match = list(tree.keys(wild_card, '*',
-                                        ahocorasick.MATCH_EXACT_LENGTH))
-    most_prefix = list(tree.keys(wild_card, '*',
-                                 ahocorasick.MATCH_AT_MOST_PREFIX))
-    least_prefix = list(tree.keys(wild_card, '*',
-                                  ahocorasick.MATCH_AT_LEAST_PREFIX))
+    return {'posting': inverted_index.posting_cache.stats(),
+            'result': RESULT_CACHE.stats()}
+
+
+def file_identity(path):
+    """identity of file, changes when file is replaced
+
+    Arguments:
+        path {str} -- path to file
+
+    Returns:
+        (int, float) -- inode and modification time of file
+    """
 
-    return exact_length_match, most_prefix, least_prefix
+    stat = os.stat(path)
+    return stat.st_ino, stat.st_mtime
 
 
-def wild_card_find_doc(inverted_index, wild_card_tokens):
-    """search in inverted index and find posting lists of all words which find
-    them related to the wildcars
+def read_sharded_index(inverted_index,
+                       path_manifest=shard_index.PATH_MANIFEST):
+    """open shards of inverted index once for all queries, they are opened
+    again if shards are made again or inverted index is replaced
 
     Arguments:
-        inverted_index {dictionary} -- dictionary of tokens and posting-lists
-        wild_card_tokens {list} -- all words find them by tree which related to
-        wildcard
+        inverted_index {obj} -- reader of inverted index
+
+    Keyword Arguments:
+        path_manifest {str} -- path to manifest of shards
+        (default: {shard_index.PATH_MANIFEST})
 
     Returns:
-        dictionary, list -- dictionary of tokens and posting-lists which those
-        token found it in inverted index, list of all tokens not found in
-        inverted index
+        obj -- sharded index
     """
 
-    search_wild_card = {}
-    list_not_found_token = []
-    if inverted_index is not None:
-        for token in list(wild_card_tokens):
-            if token in inverted_index:
-                search_wild_card[token] = inverted_index[token]
-            else:
-                list_not_found_token.append(token)
+    if not os.path.isfile(path_manifest):
+        raise ValueError('shards are not made, run search.py --make-shards')
+    key = (file_identity(path_manifest), inverted_index.path,
+           file_identity(inverted_index.path))
+    with SHARDED_INDEX_LOCK:
+        if SHARDED_INDEX.get('key') != key:
+            sharded_index = shard_index.ShardedIndex(path_manifest)
+            if sharded_index.fingerprint != \
+                    inverted_index.dictionary_fingerprint():
+                sharded_index.close()
+                raise ValueError('shards are made from another inverted '
+                                 'index, run search.py --make-shards')
+            if 'index' in SHARDED_INDEX:
+                SHARDED_INDEX['index'].close()
+            SHARDED_INDEX.update(key=key, index=sharded_index)
+        return SHARDED_INDEX['index']
+
+
+def read_array_index(inverted_index):
+    """numpy view of inverted index for vectorized ranking, made once for
+    each reader of inverted index
+
+    Arguments:
+        inverted_index {obj} -- reader of inverted index
+
+    Returns:
+        obj -- instance of vector_index.ArrayIndex
+    """
 
-    return search_wild_card, list_not_found_token
+    with ARRAY_INDEX_LOCK:
+        if ARRAY_INDEX.get('key') != inverted_index.identity:
+            ARRAY_INDEX.update(key=inverted_index.identity,
+                               index=vector_index.ArrayIndex(inverted_index))
+        return ARRAY_INDEX['index']
 
 
-def init():
+def init(workers=None, streaming=False, memory_budget=None,
+         rebuild_cache=False):
     """check essential directories and files if can not find them make them and
     read inverted index, make spell checker instance and config it, make
-    wildcard tree
+    wildcard index and fuzzy spelling index
+
+    Keyword Arguments:
+        workers {int} -- number of worker processes if inverted index must be
+        made (default: {None})
+        streaming {bool} -- make inverted index in streaming mode if it must
+        be made (default: {False})
+        memory_budget {int} -- memory budget of SPIMI in bytes if inverted
+        index must be made (default: {None})
+        rebuild_cache {bool} -- make spell checker, wildcard and fuzzy index
+        caches even if they are fresh (default: {False})
 
     Returns:
-        dictionary, obj, obj -- dictionary of tokens and posting-lists, object
-        of spell checker and object of wildcards tree
+        obj, obj, obj, obj -- reader of inverted index, object of spell
+        checker, object of wildcard index and object of fuzzy spelling index
     """
 
     print "please wait ..."
@@ -177,7 +465,7 @@ def init():
             if e.errno != errno.EEXIST:
                 raise
 
-    if os.path.isfile('data-files/inverted-index.json'):
+    if index_storage.is_binary_index(INVERTED_INDEX_PATH):
         # if inverted index exist so just read it
         inverted_index = read_inverted_index()
     else:
@@ -185,95 +473,586 @@ def init():
         # thing
         print 'inverted index not available'
         print 'making inverted index'
-        make_inverted_index()
+        make_inverted_index(workers, streaming, memory_budget=memory_budget)
         inverted_index = read_inverted_index()
         print 'inverted index was made'
-    # make and configure spell checker and wildcard tree
-    list_tokens = inverted_index.keys()
-    spell = spellchecker.SpellChecker(language=None,
-                                      local_dictionary='spell_checker/en.json.gz')
-    spell.word_frequency.load_words(list_tokens)
-    wild_card_tree = make_wild_cart(list_tokens)
-    return inverted_index, spell, wild_card_tree
+    # load spell checker, wildcard and fuzzy index from cache or make them
+    start = time.time()
+    spell, wild_card_index, fuzzy_index, cached = \
+        load_dictionary_structures(inverted_index, rebuild=rebuild_cache)
+    print 'spell checker, wildcard and fuzzy index {} in {:.2f} s'.format(
+        'loaded from cache' if cached else 'made (cold start)',
+        time.time() - start)
+    return inverted_index, spell, wild_card_index, fuzzy_index
 
 
 def help_option():
     """print result for help input option
     """
 
-    print 'search.py -w <wildcard> for wildcard search'
+    print 'search.py -w <wildcard> for wildcard search, \'*\' for any',
+    print 'number of characters and \'?\' for one character'
     print 'search.py -s <wildcard> for normal search'
+    print 'search.py --spell <word> for spelling suggestions'
+    print 'search.py -r <query> for ranked search (-k <number> of results,',
+    print '--scorer=bm25|tfidf, --exhaustive to score every posting,',
+    print '--vectorized to score every posting by numpy arrays)'
+    print 'search.py -b <query> for boolean search with AND, OR, NOT and',
+    print 'parentheses, phrases can be used as terms'
+    print 'search.py -q \'"<phrase>"\' for exact phrase search and',
+    print '-q \'"<terms>"~<distance>\' for proximity search'
     print 'search.py -m for making inverted index'
+    print 'search.py --make-shards [--shard-size=<root files>] for splitting',
+    print 'inverted index to shards of one year (root file) or more, then',
+    print '--shards=<name,...|all> with a query option runs it on shards in',
+    print 'parallel, like --shards=2008 -r <query> for 2008 models'
+    print '--posting-cache=<MB> and --result-cache=<MB> bound LRU caches of',
+    print 'decoded posting lists and query results (0 disables them),',
+    print '--cache-stats prints their hits and misses after queries'
+    print '--metrics with any option prints timers, counters and memory of',
+    print 'parser, normalizer, index maker and search at exit',
+    print '(--metrics-file=<path> for prometheus text, --profile=<directory>',
+    print 'for cProfile of stages), or set IR_METRICS=1'
+    print 'search.py -p for exporting postings of inverted index as table',
+    print '(--format=fixed|tsv|csv, --prefix=<token prefix>, --root=<root',
+    print 'file>, --output=<path> or - for stdout)'
+    print 'search.py -j <workers> -m for making inverted index by worker',
+    print 'processes which parse and preprocess files (0 for number of cpu',
+    print 'cores)'
+    print 'search.py --stream -m for making inverted index without',
+    print 'intermediate json files (--keep-artifacts to write them too)'
+    print 'search.py --memory-budget=<MB> -m for making inverted index by',
+    print 'SPIMI for corpora larger than memory'
+    print 'search.py --codec=vbyte|gamma|pfor -m for making inverted index',
+    print 'with posting lists encoded by variable byte (default), Elias',
+    print 'gamma or PForDelta codec'
+    print 'search.py -u for indexing just new and changed xml files and',
+    print 'merging them with inverted index in background (--foreground to',
+    print 'wait for merge); first update indexes all files'
+    print 'search.py --rebuild-cache <query option> to make spell checker,',
+    print 'wildcard and fuzzy index caches next to inverted index again'
+    print 'search_server.py to keep index loaded and answer queries over',
+    print 'http, then search.py --server=<host:port> <query option> to',
+    print 'send queries to it, empty address for {} (falls back to'.format(
+        SERVER_ADDRESS),
+    print 'in-process search if server is not running)'
     sys.exit()
 
 
-def wild_card_option(input_token, wild_card_tree, inverted_index):
-    """print result for wildcard search input option
+def index_term(input_token, inverted_index):
+    """token as it is in inverted index, normalized by analyzer of queries
+    like tokens of documents; token is kept if it is not one term
 
     Arguments:
-        input_token {str} -- token from standard input
-        wild_card_tree {obj} -- instance of wildcard tree
-        inverted_index {dic} -- dictionary of tokens and posting-lists
-    """
-
-    exact, most, least = wild_card_search(wild_card_tree, input_token)
-    print '\n'
-    # Exact length match => words, results
-    doc_found, not_founds = wild_card_find_doc(inverted_index, exact)
-    print 'Exact length match:\n{}\n'.format('\n'.join(exact))
-    print 'founded words:\n{}\n'.format(pprint.pformat(doc_found))
-    print 'nothing found for:\n{}\n'.format('\n'.join(not_founds))
-    print '{}'.format('#' * 70)
-    # Most prefix match => words, results
-    doc_found, not_founds = wild_card_find_doc(inverted_index, most)
-    print 'Most prefix match:\n{}\n'.format('\n'.join(most))
-    print 'founded words:\n{}\n'.format(pprint.pformat(doc_found))
-    print 'nothing found for:\n{}'.format('\n'.join(not_founds))
-    print '{}'.format('#' * 70)
-    # Least prefix match => words, results
-    doc_found, not_founds = wild_card_find_doc(inverted_index, least)
-    print 'Least prefix match:\n{}\n'.format('\n'.join(least))
-    print 'founded words:\n{}\n'.format(pprint.pformat(doc_found))
-    print 'nothing found for:\n{}'.format('\n'.join(not_founds))
-    print '{}'.format('#' * 70)
-
-
-def search_option(input_token, inverted_index, spell_checker):
-    """print result for search option input and if input is wrong make
-    suggestion with spell checker
+        input_token {str} -- input token from standard input
+        inverted_index {obj} -- reader of inverted index
+
+    Returns:
+        str -- term
+    """
+
+    terms = tokenizers_normalizer.query_analyzer().analyze_query(
+        input_token, inverted_index)
+    return terms[0][0] if len(terms) == 1 else input_token
+
+
+def spell_word(input_token):
+    """word which is spelled when token is not in index, token as analyzer
+    reads it if it is one word so results are same for queries with same
+    analyzed terms
+
+    Arguments:
+        input_token {str} -- input token from standard input
+
+    Returns:
+        str -- word to spell
+    """
+
+    tokens = tokenizers_normalizer.query_analyzer().query_tokens(input_token)
+    if len(tokens) == 1:
+        # last candidate of a short query is the lower case token
+        return tokens[0][0][-1]
+    return input_token
+
+
+def search_result(input_token, inverted_index, spell_checker, fuzzy_index):
+    """posting list of token normalized like tokens of documents and if it
+    is not in inverted index make suggestion with spell checker
 
     Arguments:
         input_token {str} -- input token from standard input
-        inverted_index {dic} -- dictionary of tokens and posting-lists
+        inverted_index {obj} -- reader of inverted index
         spell_checker {obj} -- instance of spell checker
+        fuzzy_index {obj} -- fuzzy spelling index of terms of inverted index
+
+    Returns:
+        dictionary -- term and its posting list as term and posting_list, or
+        corrected word and suggested words as corrected and suggested
+    """
+
+    term = index_term(input_token, inverted_index)
+    if term in inverted_index:
+        return {'term': term,
+                'posting_list': inverted_index[term]['posting_list']}
+    return spell_result(spell_word(input_token), spell_checker, fuzzy_index)
+
+
+def spell_result(input_word, spell_checker, fuzzy_index):
+    """corrected and suggested words for word, terms of inverted index near
+    word are suggested by their edit distance and frequency, if there is no
+    such term spell checker suggests words of its dictionary
+
+    Arguments:
+        input_word {str} -- word from standard input
+        spell_checker {obj} -- instance of spell checker
+        fuzzy_index {obj} -- fuzzy spelling index of terms of inverted index
+
+    Returns:
+        dictionary -- corrected word and list of suggested words
     """
 
-    if input_token in inverted_index:
-        pprint.pprint(inverted_index[input_token]['posting_list'])
+    suggested = [term for term, _, _ in fuzzy_index.lookup(
+        input_word, time_budget_ms=FUZZY_TIME_BUDGET_MS)]
+    if suggested:
+        return {'corrected': suggested[0], 'suggested': suggested}
+    corrected, suggested = spell_checking(spell_checker, input_word)
+    return {'corrected': corrected, 'suggested': suggested}
+
+
+def wild_card_result(input_token, wild_card_index, inverted_index):
+    """words match wildcard and documents contain any of them
+
+    Arguments:
+        input_token {str} -- wildcard from standard input, '*' for any number
+        of characters and '?' for one character
+        wild_card_index {obj} -- k-gram index of vocabulary
+        inverted_index {obj} -- reader of inverted index
+
+    Returns:
+        dictionary -- matched words and list of doc ID and root file of
+        documents
+    """
+
+    words, doc_ids = wildcard_index.wildcard_search(
+        inverted_index, wild_card_index, input_token)
+    return {'words': words,
+            'documents': [{'doc_id': doc_id,
+                           'root': inverted_index.doc_root(doc_id)}
+                          for doc_id in doc_ids]}
+
+
+def ranked_result(query, inverted_index, k=10, scorer='bm25',
+                  exhaustive=False, vectorized=False):
+    """k best documents for query ranked by BM25 or TF-IDF
+
+    Arguments:
+        query {str} -- query from standard input
+        inverted_index {obj} -- reader of inverted index
+
+    Keyword Arguments:
+        k {int} -- number of results (default: {10})
+        scorer {str} -- name of scorer, bm25 or tfidf (default: {'bm25'})
+        exhaustive {bool} -- score every posting instead of MaxScore pruning
+        (default: {False})
+        vectorized {bool} -- score every posting by numpy arrays
+        (default: {False})
+
+    Returns:
+        dictionary -- number of scored postings, time of ranking and list of
+        score, doc ID and root file of best documents
+    """
+
+    terms = [term for term, _ in tokenizers_normalizer.query_analyzer()
+             .analyze_query(query, inverted_index)]
+    stats = {}
+    start = time.time()
+    if vectorized:
+        results = vector_index.rank_vectorized(
+            read_array_index(inverted_index), terms, k, scorer, stats)
+    elif exhaustive:
+        results = ranking.rank(inverted_index, terms, k, scorer, stats)
+    else:
+        results = ranking.rank_maxscore(inverted_index, terms, k, scorer,
+                                        stats)
+    return {'postings_scored': stats['postings_scored'],
+            'ranking_ms': (time.time() - start) * 1000,
+            'documents': [{'score': score, 'doc_id': doc_id,
+                           'root': inverted_index.doc_root(doc_id)}
+                          for score, doc_id in results]}
+
+
+def boolean_result(query, inverted_index):
+    """documents match boolean query
+
+    Arguments:
+        query {str} -- boolean query from standard input
+        inverted_index {obj} -- reader of inverted index
+
+    Returns:
+        dictionary -- list of doc ID and root file of documents, or error if
+        query is wrong
+    """
+
+    analyzer = tokenizers_normalizer.query_analyzer()
+    try:
+        doc_ids = boolean_query.boolean_search(inverted_index, query,
+                                               analyzer.stop_words, analyzer)
+    except boolean_query.QuerySyntaxError as error:
+        return {'error': 'wrong boolean query: {}'.format(error)}
+    return {'documents': [{'doc_id': doc_id,
+                           'root': inverted_index.doc_root(doc_id)}
+                          for doc_id in doc_ids]}
+
+
+def phrase_result(query, inverted_index):
+    """documents match exact phrase or proximity query with positions of
+    phrase or distance of terms
+
+    Arguments:
+        query {str} -- phrase query from standard input like "fuel economy"
+        or "seat comfortable"~5
+        inverted_index {obj} -- reader of inverted index
+
+    Returns:
+        dictionary -- list of doc ID, root file and positions or distance of
+        documents, or error if query is wrong
+    """
+
+    analyzer = tokenizers_normalizer.query_analyzer()
+    try:
+        matches = phrase_query.phrase_search(inverted_index, query,
+                                             analyzer.stop_words, analyzer)
+    except boolean_query.QuerySyntaxError as error:
+        return {'error': 'wrong phrase query: {}'.format(error)}
+    return {'documents': [{'doc_id': doc_id,
+                           'root': inverted_index.doc_root(doc_id),
+                           'where': where}
+                          for doc_id, where in matches]}
+
+
+def sharded_result(endpoint, params, inverted_index, spell, wild_card_index,
+                   fuzzy_index):
+    """answer query on shards given by shards parameter, each shard is
+    searched in its own thread and results are gathered in same form as
+    query on inverted index
+
+    Arguments:
+        endpoint {str} -- kind of query, one of ENDPOINTS
+        params {dictionary} -- q as query, shards as comma separated names of
+        shards or all, and for ranked query k, scorer and exhaustive
+        inverted_index {obj} -- reader of inverted index
+        spell {obj} -- instance of spell checker
+        wild_card_index {obj} -- k-gram index of vocabulary
+        fuzzy_index {obj} -- fuzzy spelling index of terms of inverted index
+
+    Returns:
+        obj -- result of query which can be dumped in json
+    """
+
+    sharded_index = read_sharded_index(inverted_index)
+    names = sharded_index.select(params['shards'].split(','))
+    query = params['q']
+    analyzer = tokenizers_normalizer.query_analyzer()
+    if endpoint == 'search':
+        term = index_term(query, inverted_index)
+        entry = sharded_index.entry(term, names)
+        if entry is None:
+            result = spell_result(spell_word(query), spell, fuzzy_index)
+        else:
+            result = {'term': term, 'posting_list': entry['posting_list']}
+    elif endpoint == 'spell':
+        result = spell_result(query, spell, fuzzy_index)
+    elif endpoint == 'wildcard':
+        words, doc_ids = sharded_index.wildcard_search(wild_card_index,
+                                                       query, names)
+        result = {'words': words,
+                  'documents': [{'doc_id': doc_id,
+                                 'root': inverted_index.doc_root(doc_id)}
+                                for doc_id in doc_ids]}
+    elif endpoint == 'ranked':
+        stats = {}
+        start = time.time()
+        terms = [term for term, _ in analyzer.analyze_query(query,
+                                                            inverted_index)]
+        results = sharded_index.rank(terms,
+                                     int(params.get('k', 10)),
+                                     params.get('scorer', 'bm25'),
+                                     params.get('exhaustive') == '1', stats,
+                                     names)
+        result = {'postings_scored': stats['postings_scored'],
+                  'ranking_ms': (time.time() - start) * 1000,
+                  'documents': [{'score': score, 'doc_id': doc_id,
+                                 'root': inverted_index.doc_root(doc_id)}
+                                for score, doc_id in results]}
+    elif endpoint == 'boolean':
+        try:
+            doc_ids = sharded_index.boolean_search(
+                query, analyzer.stop_words, names, analyzer, inverted_index)
+        except boolean_query.QuerySyntaxError as error:
+            return {'error': 'wrong boolean query: {}'.format(error)}
+        result = {'documents': [{'doc_id': doc_id,
+                                 'root': inverted_index.doc_root(doc_id)}
+                                for doc_id in doc_ids]}
+    elif endpoint == 'phrase':
+        try:
+            matches = sharded_index.phrase_search(
+                query, analyzer.stop_words, names, analyzer, inverted_index)
+        except boolean_query.QuerySyntaxError as error:
+            return {'error': 'wrong phrase query: {}'.format(error)}
+        result = {'documents': [{'doc_id': doc_id,
+                                 'root': inverted_index.doc_root(doc_id),
+                                 'where': where}
+                                for doc_id, where in matches]}
+    else:
+        raise ValueError('unknown endpoint: %s' % endpoint)
+    result['shards'] = names
+    return result
+
+
+def query_result(endpoint, params, inverted_index, spell, wild_card_index,
+                 fuzzy_index):
+    """answer query in process from result cache or by answer_query, search
+    server answers queries by this too; results of wrong queries are not
+    cached, and a result from cache has cached set and no time of ranking
+    since it belongs to the query which was answered; ValueError is raised
+    for unknown endpoint or k less than 1
+
+    Arguments:
+        endpoint {str} -- kind of query, one of ENDPOINTS
+        params {dictionary} -- parameters of query, see answer_query
+        inverted_index {obj} -- reader of inverted index
+        spell {obj} -- instance of spell checker
+        wild_card_index {obj} -- k-gram index of vocabulary
+        fuzzy_index {obj} -- fuzzy spelling index of terms of inverted index
+
+    Returns:
+        obj -- result of query which can be dumped in json
+    """
+
+    if endpoint not in ENDPOINTS:
+        raise ValueError('unknown endpoint: %s' % endpoint)
+    if endpoint == 'ranked' and int(params.get('k', 10)) < 1:
+        raise ValueError('k must be at least 1')
+    with metrics.timer('search.' + endpoint):
+        analyzer = None
+        if endpoint in ANALYZED_ENDPOINTS:
+            analyzer = tokenizers_normalizer.query_analyzer()
+        key = RESULT_CACHE.key(inverted_index.identity, endpoint, params,
+                               analyzer)
+        if params.get('shards'):
+            # shards can be made again while inverted index is the same
+            key += (file_identity(shard_index.PATH_MANIFEST)
+                    if os.path.isfile(shard_index.PATH_MANIFEST) else None,)
+        result = RESULT_CACHE.get(key)
+        if result is not None:
+            metrics.count('search.result_cache_hits')
+            return dict(result, cached=True)
+        result = answer_query(endpoint, params, inverted_index, spell,
+                              wild_card_index, fuzzy_index)
+        if 'error' not in result:
+            RESULT_CACHE.put(key, dict((name, value) for name, value
+                                       in result.iteritems()
+                                       if name != 'ranking_ms'))
+        else:
+            metrics.count('search.errors')
+    return result
+
+
+def answer_query(endpoint, params, inverted_index, spell, wild_card_index,
+                 fuzzy_index):
+    """answer query by inverted index or its shards
+
+    Arguments:
+        endpoint {str} -- kind of query, one of ENDPOINTS
+        params {dictionary} -- q as query, for ranked query k, scorer and
+        exhaustive and vectorized, and shards to run query on shards, all as
+        str
+        inverted_index {obj} -- reader of inverted index
+        spell {obj} -- instance of spell checker
+        wild_card_index {obj} -- k-gram index of vocabulary
+        fuzzy_index {obj} -- fuzzy spelling index of terms of inverted index
+
+    Returns:
+        obj -- result of query which can be dumped in json
+    """
+
+    if params.get('shards'):
+        return sharded_result(endpoint, params, inverted_index, spell,
+                              wild_card_index, fuzzy_index)
+    query = params['q']
+    if endpoint == 'search':
+        return search_result(query, inverted_index, spell, fuzzy_index)
+    if endpoint == 'spell':
+        return spell_result(query, spell, fuzzy_index)
+    if endpoint == 'wildcard':
+        return wild_card_result(query, wild_card_index, inverted_index)
+    if endpoint == 'ranked':
+        return ranked_result(query, inverted_index,
+                             int(params.get('k', 10)),
+                             params.get('scorer', 'bm25'),
+                             params.get('exhaustive') == '1',
+                             params.get('vectorized') == '1')
+    if endpoint == 'boolean':
+        return boolean_result(query, inverted_index)
+    if endpoint == 'phrase':
+        return phrase_result(query, inverted_index)
+    raise ValueError('unknown endpoint: %s' % endpoint)
+
+
+def query_server(server, endpoint, params):
+    """send query to search server
+
+    Arguments:
+        server {str} -- address of search server as host:port
+        endpoint {str} -- kind of query, one of ENDPOINTS
+        params {dictionary} -- parameters of query
+
+    Returns:
+        (obj, float) -- result of query and latency of server in milliseconds,
+        or None if server is not available
+    """
+
+    url = 'http://{}/{}?{}'.format(server, endpoint, urllib.urlencode(params))
+    try:
+        reader = urllib2.urlopen(url, timeout=SERVER_TIMEOUT)
+    except (urllib2.URLError, socket.error):
+        return None
+    try:
+        response = json.load(reader)
+    finally:
+        reader.close()
+    return response['result'], response['latency_ms']
+
+
+def wild_card_option(result):
+    """print result for wildcard search input option
+
+    Arguments:
+        result {dictionary} -- result of wild_card_result
+    """
+
+    if not result['words']:
+        print 'nothing found\n'
+        return
+    print 'matched words:\n{}\n'.format('\n'.join(result['words']))
+    print '{} documents found\n'.format(len(result['documents']))
+    for dic_doc in result['documents']:
+        print '{:>8}  {}'.format(dic_doc['doc_id'], dic_doc['root'])
+
+
+def search_option(result):
+    """print result for search option input and if input is wrong print
+    suggestion of spell checker
+
+    Arguments:
+        result {dictionary} -- result of search_result
+    """
+
+    if 'posting_list' in result:
+        if 'term' in result:
+            print 'term in index: {}\n'.format(result['term'])
+        pprint.pprint(result['posting_list'])
+    else:
+        spell_option(result)
+
+
+def spell_option(result):
+    """print corrected and suggested words
+
+    Arguments:
+        result {dictionary} -- result of spell_result
+    """
+
+    print 'did you mean :   \n\n{}\n'.format(result['corrected'])
+    print 'suggested words: \n\n{}\n'.format('\n'.join(result['suggested']))
+
+
+def ranked_option(result):
+    """print k best documents for ranked query
+
+    Arguments:
+        result {dictionary} -- result of ranked_result
+    """
+
+    if result.get('cached'):
+        print '{} postings scored, result from cache\n'.format(
+            result['postings_scored'])
     else:
-        corrected, suggested = spell_checking(spell_checker, input_token)
-        print 'did you mean :   \n\n{}\n'.format(corrected)
-        print 'suggested words: \n\n{}\n'.format('\n'.join(suggested))
+        print '{} postings scored in {:.2f} ms\n'.format(
+            result['postings_scored'], result['ranking_ms'])
+    if not result['documents']:
+        print 'nothing found\n'
+        return
+    print '{:>4} {:>10} {:>8}  {}'.format('rank', 'score', 'doc ID',
+                                          'root file')
+    for idx, dic_doc in enumerate(result['documents']):
+        print '{:>4} {:>10.4f} {:>8}  {}'.format(
+            idx + 1, dic_doc['score'], dic_doc['doc_id'], dic_doc['root'])
+
+
+def boolean_option(result):
+    """print documents match boolean query
+
+    Arguments:
+        result {dictionary} -- result of boolean_result
+    """
+
+    if 'error' in result:
+        print result['error']
+        return
+    print '{} documents found\n'.format(len(result['documents']))
+    for dic_doc in result['documents']:
+        print '{:>8}  {}'.format(dic_doc['doc_id'], dic_doc['root'])
 
 
-def print_option(inverted_index):
-    """make table of inverted index in TXT file
+def phrase_option(result):
+    """print documents match phrase or proximity query
 
     Arguments:
-        inverted_index {dic} -- dictionary of tokens and posting-lists
+        result {dictionary} -- result of phrase_result
     """
 
-    table = beautifultable.BeautifulTable()
-    table.column_headers = ['token', 'token ID', 'doc ID',
-                            'root file', 'term frequency']
-    for token, postinglist in inverted_index.iteritems():
-        token_id = postinglist['token_id']
+    if 'error' in result:
+        print result['error']
+        return
+    print '{} documents found\n'.format(len(result['documents']))
+    for dic_doc in result['documents']:
+        print '{:>8}  {:<20} {}'.format(dic_doc['doc_id'], dic_doc['root'],
+                                        dic_doc['where'])
 
-        for root, dic_doc_id in postinglist['posting_list'].iteritems():
-            for doc_id, value in dic_doc_id.iteritems():
-                table.append_row([token, token_id, doc_id,
-                                 root, value['number_of_frequency']])
-                write_in_file(str(table), 'table_inverted_index.txt')
+
+def print_option(inverted_index, fmt='fixed', prefix='', root=None,
+                 path=None):
+    """export postings of inverted index as table in file, rows are written
+    one by one so memory does not grow with size of index
+
+    Arguments:
+        inverted_index {obj} -- reader of inverted index
+
+    Keyword Arguments:
+        fmt {str} -- one of tsv, csv or fixed (default: {'fixed'})
+        prefix {str} -- just tokens start with prefix (default: {''})
+        root {str} -- just documents of this root file (default: {None})
+        path {str} -- path to file, '-' for stdout and None for
+        table_inverted_index with extension of format (default: {None})
+    """
+
+    if fmt not in index_export.FORMATS:
+        print 'format must be one of', ', '.join(index_export.FORMATS)
+        sys.exit(2)
+    if root is not None and root not in inverted_index.roots:
+        print 'root file must be one of', ', '.join(inverted_index.roots)
+        sys.exit(2)
+    if path is None:
+        path = EXPORT_PATH + index_export.EXTENSIONS[fmt]
+    if path == '-':
+        index_export.export_postings(inverted_index, sys.stdout, fmt, prefix,
+                                     root)
+        return
+    with open(path, 'w') as writer:
+        rows = index_export.export_postings(inverted_index, writer, fmt,
+                                            prefix, root)
+    print '{} rows written in {}'.format(rows, path)
 
 
 def main(argv):
@@ -285,25 +1064,176 @@ def main(argv):
         argv {list} -- argument read from terminal
     """
 
-    inverted_index, spell, wild_card_tree = init()
     try:
-        opts, args = getopt.getopt(argv, 'hpmw:s:', ['help', 'wildcard=',
-                                                     'make_index', 'search=',
-                                                     'print'])
+        opts, args = getopt.getopt(argv, 'hpmuw:s:j:r:k:b:q:',
+                                   ['help', 'wildcard=', 'make_index',
+                                    'search=', 'spell=', 'print', 'jobs=',
+                                    'ranked=', 'boolean=', 'phrase=',
+                                    'top=', 'scorer=', 'exhaustive',
+                                    'vectorized', 'stream',
+                                    'keep-artifacts', 'memory-budget=',
+                                    'server=', 'rebuild-cache', 'update',
+                                    'foreground', 'format=', 'prefix=',
+                                    'root=', 'output=', 'codec=',
+                                    'make-shards', 'shard-size=',
+                                    'shards=', 'posting-cache=',
+                                    'result-cache=', 'cache-stats',
+                                    'metrics', 'metrics-file=', 'profile='])
     except getopt.GetoptError:
         print 'search.py -h'
         sys.exit(2)
+    workers = None
+    streaming = False
+    keep_artifacts = False
+    memory_budget = None
+    top_k = 10
+    scorer = 'bm25'
+    exhaustive = False
+    vectorized = False
+    server = None
+    rebuild_cache = False
+    background = True
+    export_format = 'fixed'
+    export_prefix = ''
+    export_root = None
+    export_path = None
+    codec = posting_codecs.DEFAULT_CODEC
+    shard_size = 1
+    shards = None
+    show_cache_stats = False
+    for opt, arg in opts:
+        if opt in ('-j', '--jobs'):
+            workers = int(arg)
+        elif opt in ('-k', '--top'):
+            top_k = int(arg)
+            if top_k < 1:
+                print 'number of results must be at least 1'
+                sys.exit(2)
+        elif opt == '--scorer':
+            scorer = arg
+        elif opt == '--exhaustive':
+            exhaustive = True
+        elif opt == '--vectorized':
+            vectorized = True
+        elif opt == '--stream':
+            streaming = True
+        elif opt == '--keep-artifacts':
+            keep_artifacts = True
+        elif opt == '--memory-budget':
+            memory_budget = int(arg) * 1024 * 1024
+        elif opt == '--server':
+            server = arg or SERVER_ADDRESS
+        elif opt == '--rebuild-cache':
+            rebuild_cache = True
+        elif opt == '--foreground':
+            background = False
+        elif opt == '--format':
+            export_format = arg
+        elif opt == '--prefix':
+            export_prefix = arg
+        elif opt == '--root':
+            export_root = arg
+        elif opt == '--output':
+            export_path = arg
+        elif opt == '--codec':
+            if arg not in posting_codecs.CODECS:
+                print 'codec must be one of', ', '.join(
+                    sorted(posting_codecs.CODECS))
+                sys.exit(2)
+            codec = arg
+        elif opt == '--shard-size':
+            shard_size = int(arg)
+        elif opt == '--shards':
+            shards = arg
+        elif opt == '--posting-cache':
+            set_cache_sizes(posting_bytes=int(arg) * 1024 * 1024)
+        elif opt == '--result-cache':
+            set_cache_sizes(result_bytes=int(arg) * 1024 * 1024)
+        elif opt == '--cache-stats':
+            show_cache_stats = True
+        elif opt == '--metrics':
+            metrics.enable()
+        elif opt == '--metrics-file':
+            metrics.enable(path_prometheus=arg)
+        elif opt == '--profile':
+            metrics.enable(profile_dir=arg)
+    # index, spell checker, wildcard and fuzzy index are loaded just if a
+    # query is answered in process
+    loaded = []
+
+    def local():
+        if not loaded:
+            loaded.append(init(workers, streaming, memory_budget,
+                               rebuild_cache))
+        return loaded[0]
+
+    printers = {'search': search_option, 'spell': spell_option,
+                'wildcard': wild_card_option, 'ranked': ranked_option,
+                'boolean': boolean_option, 'phrase': phrase_option}
     for opt, arg in opts:
         if opt in ('-h', '--help'):
             help_option()
-        elif opt in ("-w", "--wildcard"):
-            wild_card_option(arg, wild_card_tree, inverted_index)
+        elif opt in QUERY_OPTIONS:
+            endpoint = QUERY_OPTIONS[opt]
+            params = {'q': arg}
+            if endpoint == 'ranked':
+                params.update({'k': str(top_k), 'scorer': scorer,
+                               'exhaustive': '1' if exhaustive else '',
+                               'vectorized': '1' if vectorized else ''})
+            if shards:
+                params['shards'] = shards
+            response = None
+            if server is not None:
+                response = query_server(server, endpoint, params)
+                if response is None:
+                    print 'search server {} not available,'.format(server),
+                    print 'searching in process'
+                    server = None
+            if response is None:
+                start = time.time()
+                try:
+                    result = query_result(endpoint, params, *local())
+                except ValueError as error:
+                    print error
+                    sys.exit(2)
+                latency, where = (time.time() - start) * 1000, 'in process'
+            else:
+                result, latency = response
+                where = 'by server'
+            printers[endpoint](result)
+            if 'shards' in result:
+                print 'searched shards: {}'.format(', '.join(result['shards']))
+            print 'answered {} in {:.2f} ms'.format(where, latency)
         elif opt in ('-m', '--make_index'):
-            make_inverted_index()
-        elif opt in ('-s', '--search'):
-            search_option(arg, inverted_index, spell)
+            make_inverted_index(workers, streaming, keep_artifacts,
+                                memory_budget, codec)
+        elif opt in ('-u', '--update'):
+            incremental_index.update(memory_budget=memory_budget,
+                                     background=background)
+        elif opt == '--make-shards':
+            start = time.time()
+            manifest = shard_index.make_shards(INVERTED_INDEX_PATH,
+                                               shard_size=shard_size)
+            print '{} shards made in {:.2f} s: {}'.format(
+                len(manifest['shards']), time.time() - start,
+                ', '.join(shard['name'] for shard in manifest['shards']))
         elif opt in ("-p", "--print"):
-            print_option(inverted_index)
+            # export needs just inverted index, messages of loading other
+            # structures must not be mixed with table written in stdout
+            if loaded or not index_storage.is_binary_index(
+                    INVERTED_INDEX_PATH):
+                inverted_index = local()[0]
+            else:
+                # rows are read once, so posting lists are not cached
+                inverted_index = index_storage.BinaryIndexReader(
+                    INVERTED_INDEX_PATH)
+            print_option(inverted_index, export_format, export_prefix,
+                         export_root, export_path)
+    if show_cache_stats and loaded:
+        for name, stats in sorted(cache_stats(loaded[0][0]).iteritems()):
+            print ('{} cache: {hits} hits, {misses} misses, {evictions} '
+                   'evictions, {entries} entries in {bytes} of {max_bytes} '
+                   'bytes').format(name, **stats)
 
 if __name__ == '__main__':
     main(sys.argv[1:])
@@ -0,0 +1,231 @@
+#!/usr/bin/env python
+# -*- encoding: utf8 -*-
+"""search server which loads inverted index, spell checker, wildcard index
+and fuzzy spelling index once and answers queries over local http in json,
+each client is served in its own thread so slow queries do not block others
+
+    python search_server.py [-a <host:port>] [-j <workers>] [--stream]
+                            [--memory-budget=<MB>] [--posting-cache=<MB>]
+                            [--result-cache=<MB>] [--metrics]
+
+    GET /<endpoint>?q=<query>[&k=10&scorer=bm25&exhaustive=1&vectorized=1
+                              &shards=2008]
+        endpoint is one of search, spell, wildcard, ranked, boolean, phrase
+        and response is {"result": ..., "latency_ms": ...}
+    GET /cache
+        hits, misses and size of posting list and query result caches
+    GET /metrics
+        timers, counters and gauges in prometheus text format, timers of
+        queries are kept with --metrics or IR_METRICS=1
+
+    __author__ = "Erfan Rahnemoon"
+    __version__ = "0.0.1"
+    __maintainer__ = "Erfan Rahnemoon"
+    __email__ = "erfan@rahnemoon.name"
+"""
+import BaseHTTPServer
+import getopt
+import json
+import os
+import SocketServer
+import sys
+import threading
+import time
+import urlparse
+
+import metrics
+import search
+
+
+class SearchRequestHandler(BaseHTTPServer.BaseHTTPRequestHandler):
+    """answer GET request of a query by structures of server and log latency
+    of each request
+    """
+
+    def do_GET(self):
+        start = time.time()
+        url = urlparse.urlparse(self.path)
+        endpoint = url.path.strip('/')
+        params = dict(urlparse.parse_qsl(url.query, keep_blank_values=True))
+        if endpoint == 'cache':
+            self.send_json(200, {'result': search.cache_stats(
+                self.server.structures[0])}, start)
+            return
+        if endpoint == 'metrics':
+            self.send_text(200, metrics.prometheus(), start)
+            return
+        if endpoint not in search.ENDPOINTS:
+            self.send_json(404, {'error': 'unknown endpoint: %s' % endpoint},
+                           start)
+            return
+        if 'q' not in params:
+            self.send_json(400, {'error': 'q parameter is missing'}, start)
+            return
+        self.server.refresh()
+        try:
+            result = search.query_result(endpoint, params,
+                                         *self.server.structures)
+        except ValueError as error:
+            self.send_json(400, {'error': str(error)}, start)
+            return
+        self.send_json(200, {'result': result}, start)
+
+    def send_json(self, code, response, start):
+        """send response in json with latency of request
+
+        Arguments:
+            code {int} -- http status code
+            response {dictionary} -- body of response
+            start {float} -- time request is received
+        """
+
+        response['latency_ms'] = (time.time() - start) * 1000
+        body = json.dumps(response)
+        self.send_response(code)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+        self.log_message('"%s" %d %.2f ms', self.path, code,
+                         response['latency_ms'])
+
+    def send_text(self, code, body, start):
+        """send response in prometheus text format
+
+        Arguments:
+            code {int} -- http status code
+            body {str} -- body of response
+            start {float} -- time request is received
+        """
+
+        self.send_response(code)
+        self.send_header('Content-Type', 'text/plain; version=0.0.4')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+        self.log_message('"%s" %d %.2f ms', self.path, code,
+                         (time.time() - start) * 1000)
+
+    def log_request(self, code='-', size='-'):
+        # send_json logs request with its latency
+        pass
+
+
+class SearchServer(SocketServer.ThreadingMixIn, BaseHTTPServer.HTTPServer):
+    """threaded http server which keeps inverted index, spell checker,
+    wildcard and fuzzy index; they are just read by requests so threads share
+    them. when inverted index file is replaced, like after merge of
+    incremental index, they are loaded again
+    """
+
+    daemon_threads = True
+    allow_reuse_address = True
+
+    def __init__(self, address, structures):
+        BaseHTTPServer.HTTPServer.__init__(self, address, SearchRequestHandler)
+        self.structures = structures
+        self.index_stat = self.stat_index()
+        self.refresh_lock = threading.Lock()
+
+    def stat_index(self):
+        """identity of inverted index file, changes when file is replaced
+        """
+
+        stat = os.stat(self.structures[0].path)
+        return stat.st_ino, stat.st_mtime
+
+    def refresh(self):
+        """load structures again if inverted index file is replaced, other
+        requests are answered by old structures meanwhile
+        """
+
+        index_stat = self.stat_index()
+        if index_stat == self.index_stat or \
+                not self.refresh_lock.acquire(False):
+            return
+        try:
+            start = time.time()
+            self.structures = search.init()
+            self.index_stat = index_stat
+            self.log_message('inverted index reloaded in %.2f s',
+                             time.time() - start)
+        finally:
+            self.refresh_lock.release()
+
+    def log_message(self, format, *args):
+        sys.stderr.write('[%s] %s\n' % (time.strftime('%d/%b/%Y %H:%M:%S'),
+                                        format % args))
+
+
+def serve(address=search.SERVER_ADDRESS, workers=None, streaming=False,
+          memory_budget=None):
+    """load index, spell checker, wildcard and fuzzy index and answer queries
+    until interrupted
+
+    Keyword Arguments:
+        address {str} -- host:port to listen on
+        (default: {search.SERVER_ADDRESS})
+        workers {int} -- number of worker processes if inverted index must be
+        made (default: {None})
+        streaming {bool} -- make inverted index in streaming mode if it must
+        be made (default: {False})
+        memory_budget {int} -- memory budget of SPIMI in bytes if inverted
+        index must be made (default: {None})
+    """
+
+    host, port = address.rsplit(':', 1)
+    start = time.time()
+    structures = search.init(workers, streaming, memory_budget)
+    print 'loaded in {:.2f} s'.format(time.time() - start)
+    server = SearchServer((host, int(port)), structures)
+    print 'search server on http://{}'.format(address)
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+
+
+def main(argv):
+    """read options and run search server
+
+    Arguments:
+        argv {list} -- argument read from terminal
+    """
+
+    try:
+        opts, _ = getopt.getopt(argv, 'ha:j:',
+                                ['help', 'address=', 'jobs=', 'stream',
+                                 'memory-budget=', 'posting-cache=',
+                                 'result-cache=', 'metrics'])
+    except getopt.GetoptError:
+        print __doc__
+        sys.exit(2)
+    address = search.SERVER_ADDRESS
+    workers = None
+    streaming = False
+    memory_budget = None
+    for opt, arg in opts:
+        if opt in ('-h', '--help'):
+            print __doc__
+            sys.exit()
+        elif opt in ('-a', '--address'):
+            address = arg
+        elif opt in ('-j', '--jobs'):
+            workers = int(arg)
+        elif opt == '--stream':
+            streaming = True
+        elif opt == '--memory-budget':
+            memory_budget = int(arg) * 1024 * 1024
+        elif opt == '--posting-cache':
+            search.set_cache_sizes(posting_bytes=int(arg) * 1024 * 1024)
+        elif opt == '--result-cache':
+            search.set_cache_sizes(result_bytes=int(arg) * 1024 * 1024)
+        elif opt == '--metrics':
+            metrics.enable()
+    serve(address, workers, streaming, memory_budget)
+
+
+if __name__ == '__main__':
+    main(sys.argv[1:])
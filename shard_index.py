@@ -0,0 +1,511 @@
+#!/usr/bin/env python
+# -*- encoding: utf8 -*-
+"""sharded inverted index, one shard per year (root file) or per N root
+files, and scatter-gather execution of queries over shards
+
+shards are split from binary inverted index in one pass over its terms; each
+shard is a binary inverted index with documents of its root files, same doc
+ids and token ids as inverted index, and upper bounds of term weights
+computed by average document length of whole collection. a manifest keeps
+name, root files and path of each shard and fingerprint of inverted index
+which shards are made from, so stale shards are detected
+
+a query runs on each selected shard in a pool of threads and results are
+gathered: top k of each shard are merged for ranked query, and sorted doc
+ids are merged for boolean, phrase and wildcard query. ranked queries are
+scored by statistics of all shards, so scores are the same as on inverted
+index and a query restricted to some shards, like 2008 models, ranks its
+documents as whole collection does
+
+    python shard_index.py [--shard-size=<root files>]
+
+    __author__ = "Erfan Rahnemoon"
+    __version__ = "0.0.1"
+    __maintainer__ = "Erfan Rahnemoon"
+    __email__ = "erfan@rahnemoon.name"
+"""
+import getopt
+import heapq
+import json
+import os
+import sys
+import time
+from multiprocessing.pool import ThreadPool
+
+import boolean_query
+import index_storage
+import phrase_query
+import ranking
+import wildcard_index
+
+PATH_INDEX = 'data-files/inverted-index.bin'
+PATH_SHARDS = 'data-files/shards'
+PATH_MANIFEST = PATH_SHARDS + '/shards.json'
+ALL_SHARDS = 'all'
+
+
+def shard_name(roots):
+    """name of shard by its root files, like 2008 or 2007-2009
+
+    Arguments:
+        roots {list} -- sorted root files of shard
+
+    Returns:
+        str -- name of shard
+    """
+
+    names = [os.path.splitext(root)[0] for root in roots]
+    if len(names) == 1:
+        return names[0]
+    return '{}-{}'.format(names[0], names[-1])
+
+
+def group_roots(roots, shard_size=1):
+    """split sorted root files to groups of shard_size root files
+
+    Arguments:
+        roots {list} -- root files of inverted index
+
+    Keyword Arguments:
+        shard_size {int} -- number of root files of each shard (default: {1})
+
+    Returns:
+        list -- list of root files of each shard
+    """
+
+    if shard_size < 1:
+        raise ValueError('shard size must be at least one root file')
+    roots = sorted(roots)
+    return [roots[start:start + shard_size]
+            for start in xrange(0, len(roots), shard_size)]
+
+
+def read_manifest(path_manifest=PATH_MANIFEST):
+    """read manifest of shards
+
+    Keyword Arguments:
+        path_manifest {str} -- path to manifest (default: {PATH_MANIFEST})
+
+    Returns:
+        dictionary -- manifest or None if shards are not made
+    """
+
+    if not os.path.isfile(path_manifest):
+        return None
+    with open(path_manifest, 'r') as reader:
+        return json.load(reader)
+
+
+def write_manifest(manifest, path_manifest=PATH_MANIFEST):
+    """write manifest of shards, manifest is replaced at once
+
+    Arguments:
+        manifest {dictionary} -- manifest
+
+    Keyword Arguments:
+        path_manifest {str} -- path to manifest (default: {PATH_MANIFEST})
+    """
+
+    with open(path_manifest + '.tmp', 'w') as writer:
+        json.dump(manifest, writer, indent=1, sort_keys=True)
+    os.rename(path_manifest + '.tmp', path_manifest)
+
+
+def split_index(reader, writers, shard_of_doc):
+    """write documents and posting lists of inverted index in shards, each
+    posting list is read once and split by shard of its documents
+
+    Arguments:
+        reader {obj} -- reader of binary inverted index
+        writers {list} -- writer of each shard
+        shard_of_doc {dictionary} -- number of shard of each doc id
+    """
+
+    for doc_id, root, length in reader.iter_docs():
+        writers[shard_of_doc[doc_id]].add_doc(doc_id, root, length)
+    for info in reader.iter_term_infos():
+        posting_list = reader.posting_list(info.term)
+        list_postings = [[] for _ in writers]
+        for idx, doc_id in enumerate(posting_list.doc_ids):
+            list_postings[shard_of_doc[doc_id]].append(
+                (doc_id, posting_list.positions(idx)))
+        for writer, postings in zip(writers, list_postings):
+            if postings:
+                writer.add_term(info.term, info.token_id, postings)
+
+
+def make_shards(path_index=PATH_INDEX, path_shards=PATH_SHARDS, shard_size=1):
+    """split binary inverted index to shards of shard_size root files and
+    write manifest of them, shards of a former split which are not made again
+    are removed
+
+    Keyword Arguments:
+        path_index {str} -- path to binary inverted index
+        (default: {PATH_INDEX})
+        path_shards {str} -- directory of shards (default: {PATH_SHARDS})
+        shard_size {int} -- number of root files of each shard (default: {1})
+
+    Returns:
+        dictionary -- manifest of shards
+    """
+
+    if not os.path.isdir(path_shards):
+        os.makedirs(path_shards)
+    path_manifest = os.path.join(path_shards, 'shards.json')
+    former = read_manifest(path_manifest)
+    with index_storage.BinaryIndexReader(path_index) as reader:
+        shards = []
+        shard_of_root = {}
+        for roots in group_roots(reader.roots, shard_size):
+            name = shard_name(roots)
+            for root in roots:
+                shard_of_root[root] = len(shards)
+            shards.append({'name': name, 'roots': roots,
+                           'path': os.path.join(path_shards, name + '.bin')})
+        shard_of_doc = dict((doc_id, shard_of_root[root])
+                            for doc_id, root, _ in reader.iter_docs())
+        writers = [index_storage.BinaryIndexWriter(shard['path'],
+                                                   reader.codec.name,
+                                                   reader.avg_doc_length)
+                   for shard in shards]
+        try:
+            split_index(reader, writers, shard_of_doc)
+        except Exception:
+            for writer in writers:
+                writer.__exit__(*sys.exc_info())
+            raise
+        for writer in writers:
+            writer.close()
+        manifest = {'index': path_index,
+                    'fingerprint': reader.dictionary_fingerprint(),
+                    'shard_size': shard_size, 'shards': shards}
+    write_manifest(manifest, path_manifest)
+    if former is not None:
+        paths = set(shard['path'] for shard in shards)
+        for shard in former['shards']:
+            if shard['path'] not in paths and os.path.isfile(shard['path']):
+                os.remove(shard['path'])
+    return manifest
+
+
+class CollectionView(object):
+    """shard seen with statistics of whole collection, number of documents,
+    average document length and document frequency of query terms, so
+    scores of documents of different shards can be compared
+    """
+
+    def __init__(self, reader, num_docs, avg_doc_length, doc_frequencies):
+        self.reader = reader
+        self.num_docs = num_docs
+        self.avg_doc_length = avg_doc_length
+        self.doc_frequencies = doc_frequencies
+
+    def term_info(self, term):
+        """information of term in shard with its document frequency in
+        collection
+        """
+
+        info = self.reader.term_info(term)
+        if info is None:
+            return None
+        return info._replace(number_of_doc=self.doc_frequencies[term])
+
+    def posting_list(self, term):
+        """posting list of term in shard
+        """
+
+        return self.reader.posting_list(term)
+
+    def doc_length(self, doc_id):
+        """length of document of shard
+        """
+
+        return self.reader.doc_length(doc_id)
+
+
+class ShardedIndex(object):
+    """readers of shards and pool of threads which runs a query on selected
+    shards and gathers their results; readers are memory-mapped and just read
+    by queries so threads share them
+    """
+
+    def __init__(self, path_manifest=PATH_MANIFEST, workers=None):
+        manifest = read_manifest(path_manifest)
+        if manifest is None:
+            raise IOError('shards are not made, run search.py --make-shards')
+        self.fingerprint = manifest['fingerprint']
+        self.names = [shard['name'] for shard in manifest['shards']]
+        self.roots = dict((shard['name'], shard['roots'])
+                          for shard in manifest['shards'])
+        self.readers = dict((shard['name'],
+                             index_storage.BinaryIndexReader(shard['path']))
+                            for shard in manifest['shards'])
+        self.num_docs = sum(reader.num_docs
+                            for reader in self.readers.itervalues())
+        total_tokens = sum(reader.total_tokens
+                           for reader in self.readers.itervalues())
+        self.avg_doc_length = float(total_tokens) / max(self.num_docs, 1)
+        self._pool = ThreadPool(workers or max(len(self.names), 1))
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def close(self):
+        """stop pool of threads and close readers of shards
+        """
+
+        self._pool.close()
+        self._pool.join()
+        for reader in self.readers.itervalues():
+            reader.close()
+
+    def select(self, names=None):
+        """names of shards a query runs on
+
+        Keyword Arguments:
+            names {list} -- names of shards, None or ['all'] for all shards
+            (default: {None})
+
+        Returns:
+            list -- names of shards in order of manifest
+        """
+
+        if not names or ALL_SHARDS in names:
+            return list(self.names)
+        unknown = [name for name in names if name not in self.readers]
+        if unknown:
+            raise ValueError('shard must be one of {}, not {}'.format(
+                ', '.join(self.names), ', '.join(unknown)))
+        return [name for name in self.names if name in names]
+
+    def scatter(self, fun, names=None):
+        """run function on reader of each selected shard in pool of threads,
+        error of any shard is raised here
+
+        Arguments:
+            fun {function} -- function of reader of a shard
+
+        Keyword Arguments:
+            names {list} -- names of shards, None for all (default: {None})
+
+        Returns:
+            list -- result of each shard
+        """
+
+        readers = [self.readers[name] for name in self.select(names)]
+        if len(readers) == 1:
+            return [fun(readers[0])]
+        return self._pool.map(fun, readers)
+
+    def doc_frequency(self, term):
+        """number of documents of all shards contain term
+        """
+
+        number_of_doc = 0
+        for reader in self.readers.itervalues():
+            info = reader.term_info(term)
+            if info is not None:
+                number_of_doc += info.number_of_doc
+        return number_of_doc
+
+    def doc_root(self, doc_id):
+        """root file of document of any shard
+
+        Arguments:
+            doc_id {int} -- documnet ID
+
+        Returns:
+            str -- name of root file
+        """
+
+        for reader in self.readers.itervalues():
+            try:
+                return reader.doc_root(doc_id)
+            except KeyError:
+                pass
+        raise KeyError(doc_id)
+
+    def rank(self, terms, k=10, scorer='bm25', exhaustive=False, stats=None,
+             names=None):
+        """k best documents of selected shards for query terms, each shard
+        ranks its documents by statistics of collection and k best of all
+        shards are merged
+
+        Arguments:
+            terms {list} -- terms of query
+
+        Keyword Arguments:
+            k {int} -- number of results (default: {10})
+            scorer {str} -- name of scorer, bm25 or tfidf (default: {'bm25'})
+            exhaustive {bool} -- score every posting instead of MaxScore
+            pruning (default: {False})
+            stats {dictionary} -- if given number of scored postings of all
+            shards is stored in it as postings_scored (default: {None})
+            names {list} -- names of shards, None for all (default: {None})
+
+        Returns:
+            list -- (score, doc_id) of best documents sorted by score
+        """
+
+        doc_frequencies = dict((term, self.doc_frequency(term))
+                               for term in set(terms))
+        rank_fun = ranking.rank if exhaustive else ranking.rank_maxscore
+
+        def rank_shard(reader):
+            shard_stats = {}
+            view = CollectionView(reader, self.num_docs, self.avg_doc_length,
+                                  doc_frequencies)
+            return rank_fun(view, terms, k, scorer, shard_stats), \
+                shard_stats['postings_scored']
+
+        results = self.scatter(rank_shard, names)
+        if stats is not None:
+            stats['postings_scored'] = sum(postings_scored
+                                           for _, postings_scored in results)
+        return heapq.nlargest(k, [score_doc for shard_results, _ in results
+                                  for score_doc in shard_results],
+                              key=lambda score_doc: (score_doc[0],
+                                                     -score_doc[1]))
+
+    def boolean_search(self, query, stop_words=(), names=None,
+                       analyzer=None, vocabulary=None):
+        """sorted doc ids of documents of selected shards match boolean query,
+        NOT is complement in each shard so union of shards is complement in
+        collection
+
+        Arguments:
+            query {str} -- boolean query
+
+        Keyword Arguments:
+            stop_words {list} -- stop words removed from phrases
+            (default: {()})
+            names {list} -- names of shards, None for all (default: {None})
+            analyzer {obj} -- analyzer of queries which normalizes terms
+            (default: {None})
+            vocabulary {obj} -- terms of collection, like inverted index,
+            normalized form of terms is chosen from them so all shards
+            search same terms (default: {None})
+
+        Returns:
+            list -- sorted doc ids
+        """
+
+        # syntax error is raised once before query is sent to shards
+        node = boolean_query.parse_query(query, stop_words, analyzer,
+                                         vocabulary)
+        return list(heapq.merge(*self.scatter(node.evaluate, names)))
+
+    def phrase_search(self, query, stop_words=(), names=None,
+                      analyzer=None, vocabulary=None):
+        """documents of selected shards match phrase or proximity query
+
+        Arguments:
+            query {str} -- phrase query
+
+        Keyword Arguments:
+            stop_words {list} -- stop words removed from index
+            (default: {()})
+            names {list} -- names of shards, None for all (default: {None})
+            analyzer {obj} -- analyzer of queries which normalizes terms
+            (default: {None})
+            vocabulary {obj} -- terms of collection which normalized form of
+            terms is chosen from (default: {None})
+
+        Returns:
+            list -- (doc_id, list of start positions or window length) sorted
+            by doc id
+        """
+
+        node = phrase_query.PhraseNode(query, stop_words, analyzer,
+                                       vocabulary)
+        return list(heapq.merge(*self.scatter(node.matches, names)))
+
+    def wildcard_search(self, wild_card_index, pattern, names=None):
+        """terms of selected shards match pattern and documents contain them,
+        pattern is expanded by k-gram index of whole vocabulary
+
+        Arguments:
+            wild_card_index {obj} -- k-gram index of vocabulary of inverted
+            index
+            pattern {str} -- wildcard pattern
+
+        Keyword Arguments:
+            names {list} -- names of shards, None for all (default: {None})
+
+        Returns:
+            list, list -- sorted terms and sorted doc ids
+        """
+
+        def search_shard(reader):
+            terms, doc_ids = wildcard_index.wildcard_search(
+                reader, wild_card_index, pattern)
+            return [term for term in terms if term in reader], doc_ids
+
+        results = self.scatter(search_shard, names)
+        terms = sorted(set(term for shard_terms, _ in results
+                           for term in shard_terms))
+        return terms, list(heapq.merge(*[doc_ids for _, doc_ids in results]))
+
+    def entry(self, term, names=None):
+        """entry of term like inverted index dictionary, with documents of
+        selected shards
+
+        Arguments:
+            term {str} -- token
+
+        Keyword Arguments:
+            names {list} -- names of shards, None for all (default: {None})
+
+        Returns:
+            dictionary -- token id, number of documents, frequency and posting
+            list of term, or None if no selected shard has term
+        """
+
+        entries = [entry for entry in self.scatter(
+            lambda reader: reader[term] if term in reader else None, names)
+            if entry is not None]
+        if not entries:
+            return None
+        dic_posting_list = {}
+        for entry in entries:
+            dic_posting_list.update(entry['posting_list'])
+        return {'token_id': entries[0]['token_id'],
+                'number_of_doc': sum(entry['number_of_doc']
+                                     for entry in entries),
+                'frequency_token': sum(entry['frequency_token']
+                                       for entry in entries),
+                'posting_list': dic_posting_list}
+
+
+def main(argv):
+    """split inverted index to shards
+
+    Arguments:
+        argv {list} -- argument read from terminal
+    """
+
+    try:
+        opts, _ = getopt.getopt(argv, 'h', ['help', 'shard-size='])
+    except getopt.GetoptError:
+        print __doc__
+        sys.exit(2)
+    shard_size = 1
+    for opt, arg in opts:
+        if opt in ('-h', '--help'):
+            print __doc__
+            sys.exit()
+        elif opt == '--shard-size':
+            shard_size = int(arg)
+    start = time.time()
+    manifest = make_shards(shard_size=shard_size)
+    for shard in manifest['shards']:
+        print '{:<12} {}'.format(shard['name'], ', '.join(shard['roots']))
+    print '{} shards made in {:.2f} s'.format(len(manifest['shards']),
+                                             time.time() - start)
+
+
+if __name__ == '__main__':
+    main(sys.argv[1:])
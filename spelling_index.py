@@ -0,0 +1,179 @@
+#!/usr/bin/env python
+# -*- encoding: utf8 -*-
+"""fuzzy lookup of terms of inverted index by symmetric delete (SymSpell)
+
+every term of vocabulary is stored under all strings made by deleting up to
+max_distance characters from its prefix, a misspelled word is looked up by its
+own deletes, so candidates are found by a bounded number of dictionary lookups
+instead of generating every edit of the word; candidates are verified by
+Damerau-Levenshtein distance and ranked by distance and frequency of term in
+corpus
+
+    __author__ = "Erfan Rahnemoon"
+    __version__ = "0.0.1"
+    __maintainer__ = "Erfan Rahnemoon"
+    __email__ = "erfan@rahnemoon.name"
+"""
+import time
+from array import array
+
+MAX_DISTANCE = 2
+PREFIX_LENGTH = 7
+
+
+def edit_distance(first, second, max_distance):
+    """Damerau-Levenshtein distance (optimal string alignment) of two words,
+    computation stops as soon as distance is more than max_distance
+
+    Arguments:
+        first {str} -- first word
+        second {str} -- second word
+        max_distance {int} -- biggest distance of interest
+
+    Returns:
+        int -- distance or None if it is more than max_distance
+    """
+
+    if abs(len(first) - len(second)) > max_distance:
+        return None
+    before_previous = None
+    previous = range(len(second) + 1)
+    for idx_first in xrange(1, len(first) + 1):
+        current = [idx_first] + [0] * len(second)
+        row_min = idx_first
+        for idx_second in xrange(1, len(second) + 1):
+            cost = 0 if first[idx_first - 1] == second[idx_second - 1] else 1
+            value = min(previous[idx_second] + 1,
+                        current[idx_second - 1] + 1,
+                        previous[idx_second - 1] + cost)
+            if idx_first > 1 and idx_second > 1 and \
+                    first[idx_first - 1] == second[idx_second - 2] and \
+                    first[idx_first - 2] == second[idx_second - 1]:
+                value = min(value, before_previous[idx_second - 2] + 1)
+            current[idx_second] = value
+            row_min = min(row_min, value)
+        if row_min > max_distance:
+            return None
+        before_previous, previous = previous, current
+    return previous[-1] if previous[-1] <= max_distance else None
+
+
+def deletes_of(word, max_distance):
+    """word and all strings made by deleting up to max_distance characters
+    from it, by number of deleted characters
+
+    Arguments:
+        word {str} -- word
+        max_distance {int} -- most number of deleted characters
+
+    Returns:
+        list -- set of strings made by deleting 0, 1, ... characters
+    """
+
+    levels = [set([word])]
+    for _ in xrange(max_distance):
+        level = set()
+        for delete in levels[-1]:
+            for idx in xrange(len(delete)):
+                level.add(delete[:idx] + delete[idx + 1:])
+        levels.append(level - levels[-1])
+    return levels
+
+
+def best_terms(found, limit):
+    """best verified terms by distance then frequency
+
+    Arguments:
+        found {list} -- (distance, negative frequency, term) of terms
+        limit {int} -- most number of results
+
+    Returns:
+        list -- (term, distance, frequency) of best terms
+    """
+
+    found.sort()
+    return [(term, distance, -neg_frequency)
+            for distance, neg_frequency, term in found[:limit]]
+
+
+class SymSpellIndex(object):
+    """symmetric delete index of terms and their frequency
+    """
+
+    def __init__(self, word_frequencies, max_distance=MAX_DISTANCE,
+                 prefix_length=PREFIX_LENGTH):
+        self.max_distance = max_distance
+        self.prefix_length = prefix_length
+        self.words = []
+        self.frequencies = array('I')
+        self.deletes = {}
+        for word, frequency in word_frequencies:
+            word_id = len(self.words)
+            self.words.append(str(word))
+            self.frequencies.append(frequency)
+            for level in deletes_of(word[:prefix_length], max_distance):
+                for delete in level:
+                    self.deletes.setdefault(delete, []).append(word_id)
+
+    def __len__(self):
+        return len(self.words)
+
+    def lookup(self, word, limit=10, max_distance=None, time_budget_ms=None):
+        """terms in max_distance of word, ranked by distance then frequency;
+        deletes are visited from nearest and time budget is checked before
+        each candidate, so when it is spent the nearest candidates are
+        already verified and are returned
+
+        Arguments:
+            word {str} -- misspelled word
+
+        Keyword Arguments:
+            limit {int} -- most number of results (default: {10})
+            max_distance {int} -- biggest edit distance, not more than
+            distance index is made for (default: {None})
+            time_budget_ms {float} -- stop looking up after this time in
+            milliseconds (default: {None})
+
+        Returns:
+            list -- (term, distance, frequency) of best terms
+        """
+
+        word = word.lower()
+        if max_distance is None or max_distance > self.max_distance:
+            max_distance = self.max_distance
+        deadline = None
+        if time_budget_ms is not None:
+            deadline = time.time() + time_budget_ms / 1000.0
+        checked = set()
+        found = []
+        for level in deletes_of(word[:self.prefix_length], max_distance):
+            for delete in level:
+                if deadline is not None and time.time() > deadline:
+                    return best_terms(found, limit)
+                for word_id in self.deletes.get(delete, ()):
+                    if word_id in checked:
+                        continue
+                    # terms verified so far are returned when time is spent
+                    if deadline is not None and time.time() > deadline:
+                        return best_terms(found, limit)
+                    checked.add(word_id)
+                    distance = edit_distance(word, self.words[word_id],
+                                             max_distance)
+                    if distance is not None:
+                        found.append((distance, -self.frequencies[word_id],
+                                      self.words[word_id]))
+        return best_terms(found, limit)
+
+def make_spelling_index(inverted_index):
+    """make symmetric delete index of terms of inverted index by their
+    frequency in corpus
+
+    Arguments:
+        inverted_index {obj} -- reader of inverted index
+
+    Returns:
+        obj -- symmetric delete index
+    """
+
+    return SymSpellIndex((info.term, info.frequency_token)
+                         for info in inverted_index.iter_term_infos())
@@ -0,0 +1,654 @@
+#!/usr/bin/env python
+# -*- encoding: utf8 -*-
+"""tests of posting codecs, sorted doc-id set operations and phrase queries
+over a tiny binary index, run by python -m unittest test_search
+
+    __author__ = "Erfan Rahnemoon"
+    __version__ = "0.0.1"
+    __maintainer__ = "Erfan Rahnemoon"
+    __email__ = "erfan@rahnemoon.name"
+"""
+import fnmatch
+import os
+import random
+import shutil
+import tempfile
+import time
+import unittest
+
+import nltk
+
+import boolean_query
+import incremental_index
+import index_storage
+import inverted_index_maker
+import parser
+import phrase_query
+import posting_codecs
+import query_cache
+import ranking
+import spelling_index
+import tokenizers_normalizer
+import vector_index
+import wildcard_index
+
+MAX_INT32 = 2 ** 31 - 1
+STOP_WORDS = ('the', 'a', 'of')
+# doc id -> text of document, position of a word is its index in text
+TEXTS = {
+    1: 'the car has good fuel economy',
+    2: 'fuel of the car is economy grade',
+    3: 'car car seat',
+    4: 'car seat is red and the car is fast',
+    5: 'economy fuel',
+    # same documents have same scores
+    6: 'red seat',
+    7: 'red seat',
+}
+
+
+def make_docs(texts):
+    """preprocessed documents of texts, stop words are removed but keep
+    their positions
+
+    Arguments:
+        texts {dictionary} -- doc id and text of each document
+
+    Returns:
+        list -- preprocessed document dictionaries
+    """
+
+    list_docs = []
+    for doc_id, text in sorted(texts.iteritems()):
+        list_docs.append({
+            'doc_id': doc_id,
+            'root': 'test',
+            'list_of_token': [(word, pos) for pos, word
+                              in enumerate(text.split())
+                              if word not in STOP_WORDS]})
+    return list_docs
+
+
+def codec_numbers(count):
+    """count numbers of mixed bit lengths, big ones are exceptions of pfor
+    blocks
+
+    Arguments:
+        count {int} -- number of numbers
+
+    Returns:
+        list -- non negative numbers
+    """
+
+    return [MAX_INT32 if idx % 37 == 5 else (idx * 7919) % 300
+            for idx in xrange(count)]
+
+
+class CodecTest(unittest.TestCase):
+    """each codec decodes what it encodes, from middle of a buffer
+    """
+
+    def assert_round_trip(self, numbers):
+        for name, codec in sorted(posting_codecs.CODECS.iteritems()):
+            buf = bytearray(b'\xff\xff')
+            codec.encode(numbers, buf)
+            end = len(buf)
+            buf.extend(b'\xff')
+            decoded, offset = codec.decode(buf, 2, len(numbers))
+            self.assertEqual(decoded, numbers, name)
+            self.assertEqual(offset, end, name)
+
+    def test_limits(self):
+        self.assert_round_trip([])
+        self.assert_round_trip([0])
+        self.assert_round_trip([MAX_INT32])
+        self.assert_round_trip([0, MAX_INT32, 0, 1, MAX_INT32])
+        self.assert_round_trip([0] * 200)
+
+    def test_block_boundaries(self):
+        for count in (127, 128, 129, 256, 257):
+            self.assert_round_trip(codec_numbers(count))
+            self.assert_round_trip([MAX_INT32] * count)
+
+    def test_varint(self):
+        for number in (0, 127, 128, 129, 16383, 16384, MAX_INT32):
+            buf = bytearray()
+            posting_codecs.encode_varint(number, buf)
+            self.assertEqual(posting_codecs.decode_varint(buf, 0),
+                             (number, len(buf)))
+
+    def test_index_codecs(self):
+        directory = tempfile.mkdtemp()
+        try:
+            inverted_index = inverted_index_maker.build_inverted_index(
+                make_docs(TEXTS))
+            for name in posting_codecs.CODECS:
+                path = os.path.join(directory, name + '.bin')
+                index_storage.write_binary_index(inverted_index, path, name)
+                with index_storage.BinaryIndexReader(path) as reader:
+                    postings = reader.posting_list('car')
+                    self.assertEqual(list(postings.doc_ids), [1, 2, 3, 4])
+                    self.assertEqual(list(postings.tfs), [1, 1, 2, 2])
+                    self.assertEqual(list(postings.positions(3)), [0, 6])
+        finally:
+            shutil.rmtree(directory)
+
+
+class SetOperationTest(unittest.TestCase):
+    """galloping search and sorted doc-id set operations agree with set
+    """
+
+    def setUp(self):
+        generator = random.Random(13)
+        self.list_doc_ids = [[], [0], [5], range(0, 1000, 3),
+                             range(0, 1000, 7), range(500, 520)]
+        for size in (1, 10, 100, 1000):
+            self.list_doc_ids.append(sorted(generator.sample(xrange(5000),
+                                                             size)))
+
+    def test_gallop(self):
+        for doc_ids in self.list_doc_ids:
+            for low in sorted(set([0, len(doc_ids) // 2, len(doc_ids)])):
+                for doc_id in (-1, 0, 1, 4, 5, 6, 499, 999, 5000):
+                    expected = low
+                    while expected < len(doc_ids) and \
+                            doc_ids[expected] < doc_id:
+                        expected += 1
+                    self.assertEqual(
+                        boolean_query.gallop(doc_ids, doc_id, low), expected)
+
+    def test_set_operations(self):
+        for first in self.list_doc_ids:
+            for second in self.list_doc_ids:
+                self.assertEqual(boolean_query.intersect(first, second),
+                                 sorted(set(first) & set(second)))
+                self.assertEqual(boolean_query.union(first, second),
+                                 sorted(set(first) | set(second)))
+                self.assertEqual(boolean_query.difference(first, second),
+                                 sorted(set(first) - set(second)))
+
+
+def random_docs(number_of_docs, seed=7):
+    """preprocessed documents of random words from a small vocabulary in some
+    root files, positions have gaps like removed stop words
+
+    Arguments:
+        number_of_docs {int} -- number of documents
+
+    Keyword Arguments:
+        seed {int} -- seed of random generator (default: {7})
+
+    Returns:
+        list -- preprocessed document dictionaries
+    """
+
+    generator = random.Random(seed)
+    words = ['car', 'seat', 'engine', 'fuel', 'economy', 'brake', 'noise',
+             'quiet', 'cabin', 'red', 'fast', 'dealer', 'warranty', 'tire',
+             'mileage']
+    list_docs = []
+    for doc_id in xrange(number_of_docs):
+        positions = sorted(generator.sample(xrange(30),
+                                            generator.randint(1, 12)))
+        list_docs.append({
+            'doc_id': doc_id,
+            'root': '%d.json' % (2007 + doc_id % 3),
+            'list_of_token': [(generator.choice(words), pos)
+                              for pos in positions]})
+    return list_docs
+
+
+class SpimiTest(unittest.TestCase):
+    """SPIMI build with many flushed blocks gives same index as in-memory
+    build
+    """
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def assert_same_index(self, list_docs, memory_budget):
+        path_memory = os.path.join(self.directory, 'memory.bin')
+        path_spimi = os.path.join(self.directory, 'spimi.bin')
+        index_storage.write_binary_index(
+            inverted_index_maker.build_inverted_index(list_docs), path_memory)
+        inverted_index_maker.make_inverted_index_spimi(
+            iter(list_docs), path_spimi, memory_budget, self.directory)
+        with index_storage.BinaryIndexReader(path_memory) as expected, \
+                index_storage.BinaryIndexReader(path_spimi) as reader:
+            for name in ('num_terms', 'num_docs', 'total_tokens',
+                         'avg_doc_length', 'roots'):
+                self.assertEqual(getattr(reader, name),
+                                 getattr(expected, name), name)
+            self.assertEqual(list(reader.iter_docs()),
+                             list(expected.iter_docs()))
+            self.assertEqual(list(reader.iter_term_infos()),
+                             list(expected.iter_term_infos()))
+            for info in expected.iter_term_infos():
+                postings = reader.posting_list(info.term)
+                expected_postings = expected.posting_list(info.term)
+                self.assertEqual(list(postings.doc_ids),
+                                 list(expected_postings.doc_ids))
+                self.assertEqual(list(postings.tfs),
+                                 list(expected_postings.tfs))
+                for idx in xrange(len(postings)):
+                    self.assertEqual(list(postings.positions(idx)),
+                                     list(expected_postings.positions(idx)))
+        # temporary block files are removed after merge
+        self.assertEqual(sorted(os.listdir(self.directory)),
+                         ['memory.bin', 'spimi.bin'])
+
+    def test_many_blocks(self):
+        list_docs = random_docs(60)
+        # budget of a few documents, so dozens of blocks are merged
+        self.assert_same_index(list_docs, inverted_index_maker.TERM_MEMORY *
+                               8)
+        self.assert_same_index(make_docs(TEXTS), 1)
+
+    def test_one_block(self):
+        self.assert_same_index(random_docs(20), 1 << 30)
+
+
+def nltk_data_available():
+    """check tagger and wordnet which preprocessing of documents needs are
+    installed, tests which preprocess xml files are skipped without them
+
+    Returns:
+        bool -- True if data of nltk is available
+    """
+
+    try:
+        nltk.data.find('corpora/wordnet')
+        nltk.data.find('taggers/averaged_perceptron_tagger')
+    except LookupError:
+        return False
+    return True
+
+
+def xml_file(name, texts):
+    """content of xml file of data-set
+
+    Arguments:
+        name {str} -- name of file, also its DOCNO
+        texts {list} -- text of each document
+
+    Returns:
+        str -- content of file
+    """
+
+    return '<DOCNO>{}</DOCNO>\n{}'.format(name, ''.join(
+        '<DOC>\n<DATE>01/02/2008</DATE>\n<AUTHOR>tester</AUTHOR>\n'
+        '<TEXT>{}</TEXT>\n<FAVORITE>nothing</FAVORITE>\n</DOC>\n'.format(
+            text) for text in texts))
+
+
+@unittest.skipUnless(nltk_data_available(), 'nltk data is not installed')
+class IncrementalIndexTest(unittest.TestCase):
+    """update and merge of incremental index over a temporary data-set of
+    three files in two year directories
+    """
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.path_source = os.path.join(self.directory, 'cars')
+        self.path_index = os.path.join(self.directory, 'index.bin')
+        self.path_manifest = os.path.join(self.directory, 'manifest.json')
+        self.path_segments = incremental_index.PATH_SEGMENTS
+        incremental_index.PATH_SEGMENTS = os.path.join(self.directory,
+                                                       'segments')
+        self.write_file('2007', '2007_alpha', ['zebra drove far',
+                                               'zebra seat'])
+        self.write_file('2007', '2007_beta', ['yak engine'])
+        self.write_file('2008', '2008_gamma', ['koala brake',
+                                               'koala tire'])
+        self.update()
+
+    def tearDown(self):
+        incremental_index.PATH_SEGMENTS = self.path_segments
+        shutil.rmtree(self.directory)
+
+    def path(self, year, name):
+        return os.path.join(self.path_source, year, name)
+
+    def write_file(self, year, name, texts):
+        if not os.path.isdir(os.path.join(self.path_source, year)):
+            os.makedirs(os.path.join(self.path_source, year))
+        with open(self.path(year, name), 'w') as writer:
+            writer.write(xml_file(name, texts))
+
+    def update(self):
+        incremental_index.update(self.path_source, self.path_manifest,
+                                 background=False, path_index=self.path_index)
+
+    def doc_ids(self, term=None):
+        with index_storage.BinaryIndexReader(self.path_index) as reader:
+            if term is None:
+                return list(reader.all_doc_ids())
+            postings = reader.posting_list(term)
+            return [] if postings is None else list(postings.doc_ids)
+
+    def file_doc_ids(self, year, name):
+        manifest = incremental_index.read_manifest(self.path_manifest)
+        return manifest['files'][self.path(year, name)]['doc_ids']
+
+    def test_first_update(self):
+        self.assertEqual(self.doc_ids(), [0, 1, 2, 3, 4])
+        self.assertEqual(self.doc_ids('zebra'), [0, 1])
+        self.assertEqual(self.doc_ids('koala'), [3, 4])
+        self.assertEqual(self.file_doc_ids('2008', '2008_gamma'), [3, 2])
+
+    def test_touched_file(self):
+        path = self.path('2007', '2007_alpha')
+        mtime = time.time() + 10
+        os.utime(path, (mtime, mtime))
+        self.update()
+        manifest = incremental_index.read_manifest(self.path_manifest)
+        self.assertEqual(manifest['next_doc_id'], 5)
+        self.assertEqual(manifest['segments'], [])
+        self.assertEqual(manifest['files'][path]['mtime'],
+                         os.stat(path).st_mtime)
+        self.assertEqual(self.file_doc_ids('2007', '2007_alpha'), [0, 2])
+        self.assertEqual(self.doc_ids(), [0, 1, 2, 3, 4])
+
+    def test_changed_file(self):
+        self.write_file('2007', '2007_beta', ['otter engine',
+                                              'otter brake'])
+        self.update()
+        self.assertEqual(self.file_doc_ids('2007', '2007_beta'), [5, 2])
+        self.assertEqual(self.doc_ids(), [0, 1, 3, 4, 5, 6])
+        self.assertEqual(self.doc_ids('yak'), [])
+        self.assertEqual(self.doc_ids('otter'), [5, 6])
+        self.assertEqual(self.doc_ids('brake'), [3, 6])
+        # doc ids of untouched files never move
+        self.assertEqual(self.doc_ids('zebra'), [0, 1])
+        self.assertEqual(self.doc_ids('koala'), [3, 4])
+        manifest = incremental_index.read_manifest(self.path_manifest)
+        self.assertEqual(manifest['deleted'], [])
+        self.assertEqual(os.listdir(incremental_index.PATH_SEGMENTS), [])
+
+    def test_removed_file(self):
+        os.remove(self.path('2008', '2008_gamma'))
+        self.update()
+        self.assertEqual(self.doc_ids(), [0, 1, 2])
+        self.assertEqual(self.doc_ids('koala'), [])
+        self.assertEqual(self.doc_ids('zebra'), [0, 1])
+        self.assertEqual(self.doc_ids('yak'), [2])
+        manifest = incremental_index.read_manifest(self.path_manifest)
+        self.assertNotIn(self.path('2008', '2008_gamma'), manifest['files'])
+        self.assertEqual(manifest['next_doc_id'], 5)
+
+
+class ParserTest(unittest.TestCase):
+    """parsed json files of year directories of data-set
+    """
+
+    def test_empty_directory(self):
+        directory = tempfile.mkdtemp()
+        try:
+            for year in ('2007', '2008', '2009'):
+                os.makedirs(os.path.join(directory, 'cars', year))
+            with open(os.path.join(directory, 'cars', '2007',
+                                   '2007_alpha'), 'w') as writer:
+                writer.write(xml_file('2007_alpha', ['good car']))
+            path_parsed = os.path.join(directory, 'parsed')
+            parser.files_to_json(
+                parser.get_all_file_by_path(os.path.join(directory, 'cars')),
+                path_parsed)
+            self.assertEqual(sorted(os.listdir(path_parsed)),
+                             ['2007.json', '2008.json', '2009.json'])
+            self.assertEqual(len(inverted_index_maker.read_json(
+                os.path.join(path_parsed, '2007.json'))), 1)
+            for name in ('2008.json', '2009.json'):
+                self.assertEqual(inverted_index_maker.read_json(
+                    os.path.join(path_parsed, name)), [])
+        finally:
+            shutil.rmtree(directory)
+
+
+class IndexTestCase(unittest.TestCase):
+    """tests over a binary index of TEXTS written in a temporary directory
+    """
+
+    @classmethod
+    def setUpClass(cls):
+        cls.directory = tempfile.mkdtemp()
+        path = os.path.join(cls.directory, 'index.bin')
+        index_storage.write_binary_index(
+            inverted_index_maker.build_inverted_index(make_docs(TEXTS)), path)
+        cls.reader = index_storage.BinaryIndexReader(path)
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.reader.close()
+        shutil.rmtree(cls.directory)
+
+
+class PhraseQueryTest(IndexTestCase):
+    """phrase and proximity queries over a binary index of TEXTS
+    """
+
+    def search(self, query):
+        return phrase_query.phrase_search(self.reader, query, STOP_WORDS)
+
+    def test_exact_phrase(self):
+        self.assertEqual(self.search('"fuel economy"'), [(1, [4])])
+        self.assertEqual(self.search('"car seat"'), [(3, [1]), (4, [0])])
+
+    def test_stop_word_gap(self):
+        self.assertEqual(self.search('"fuel of the car"'), [(2, [0])])
+        self.assertEqual(self.search('"the car"'),
+                         [(1, [1]), (2, [3]), (3, [0, 1]), (4, [0, 6])])
+
+    def test_proximity(self):
+        self.assertEqual(self.search('"economy fuel"~1'), [(1, 1), (5, 1)])
+        self.assertEqual(self.search('"car economy"~2'), [(2, 2)])
+        self.assertEqual(self.search('"car economy"~4'), [(1, 4), (2, 2)])
+        self.assertEqual(self.search('"fuel missing"~5'), [])
+
+    def test_repeated_proximity_term(self):
+        # one position of car does not satisfy both slots of car car
+        self.assertEqual(self.search('"car car"~1'), [(3, 1)])
+        self.assertEqual(self.search('"car car"~6'), [(3, 1), (4, 6)])
+        self.assertEqual(self.search('"car seat car"~1'), [])
+        self.assertEqual(self.search('"car seat car"~2'), [(3, 2)])
+
+    def test_min_window(self):
+        self.assertEqual(phrase_query.min_window([[1, 9], [4, 20]]), 3)
+        self.assertEqual(phrase_query.min_window([[5], [5]]), None)
+        self.assertEqual(phrase_query.min_window([[2, 5, 30], [2, 5, 30]]), 3)
+
+
+class RankingTest(IndexTestCase):
+    """MaxScore and other ranked retrieval give same documents as exhaustive
+    ranking.rank, on same score smaller doc id wins
+    """
+
+    QUERIES = (['car'], ['car', 'engine'], ['car', 'car', 'seat'],
+               ['red', 'seat'], ['fuel', 'economy', 'grade', 'missing'],
+               ['missing'], [])
+
+    def assert_same_ranking(self, results, expected):
+        self.assertEqual([doc_id for _, doc_id in results],
+                         [doc_id for _, doc_id in expected])
+        for (score, _), (expected_score, _) in zip(results, expected):
+            self.assertAlmostEqual(score, expected_score, places=9)
+
+    def test_maxscore(self):
+        for scorer in ('bm25', 'tfidf'):
+            for terms in self.QUERIES:
+                for k in (1, 2, 3, 10):
+                    self.assert_same_ranking(
+                        ranking.rank_maxscore(self.reader, terms, k, scorer),
+                        ranking.rank(self.reader, terms, k, scorer))
+
+    def test_vectorized(self):
+        array_index = vector_index.ArrayIndex(self.reader)
+        for scorer in ('bm25', 'tfidf'):
+            for terms in self.QUERIES:
+                for k in (1, 2, 3, 10):
+                    stats = {}
+                    expected_stats = {}
+                    self.assert_same_ranking(
+                        vector_index.rank_vectorized(array_index, terms, k,
+                                                     scorer, stats),
+                        ranking.rank(self.reader, terms, k, scorer,
+                                     expected_stats))
+                    self.assertEqual(stats, expected_stats)
+
+    def test_ties(self):
+        results = ranking.rank(self.reader, ['red', 'seat'], 3)
+        self.assertEqual([doc_id for _, doc_id in results], [6, 7, 4])
+        self.assertEqual(results[0][0], results[1][0])
+        self.assertEqual(
+            ranking.rank_maxscore(self.reader, ['red', 'seat'], 1),
+            results[:1])
+        array_index = vector_index.ArrayIndex(self.reader)
+        for k in (1, 2, 3):
+            self.assertEqual([doc_id for _, doc_id in
+                              vector_index.rank_vectorized(
+                                  array_index, ['red', 'seat'], k)],
+                             [6, 7, 4][:k])
+
+    def test_no_result(self):
+        for k in (0, -1):
+            stats = {}
+            self.assertEqual(ranking.rank_maxscore(self.reader, ['car'], k,
+                                                   stats=stats), [])
+            self.assertEqual(stats['postings_scored'], 0)
+            self.assertEqual(ranking.rank(self.reader, ['car'], k), [])
+            self.assertEqual(vector_index.rank_vectorized(
+                vector_index.ArrayIndex(self.reader), ['car'], k), [])
+
+
+class LRUCacheTest(unittest.TestCase):
+    """caches bounded by bytes evict least recently used values
+    """
+
+    def setUp(self):
+        # size of each value is its length
+        self.cache = query_cache.LRUCache(10, len)
+
+    def test_eviction_order(self):
+        self.cache.put('a', 'xxxx')
+        self.cache.put('b', 'xxx')
+        self.cache.put('c', 'xx')
+        self.assertEqual(self.cache.get('a'), 'xxxx')
+        self.cache.put('d', 'xxx')
+        # b is least recently used since a was read
+        self.assertEqual(list(self.cache._entries), ['c', 'a', 'd'])
+        self.assertEqual(self.cache.get('b'), None)
+        self.cache.put('c', 'xxxxxx')
+        self.assertEqual(list(self.cache._entries), ['d', 'c'])
+        stats = self.cache.stats()
+        self.assertEqual((stats['entries'], stats['bytes'],
+                          stats['evictions'], stats['hits'],
+                          stats['misses']), (2, 9, 2, 1, 1))
+        self.assertEqual(stats['hit_rate'], 0.5)
+
+    def test_big_value(self):
+        self.cache.put('a', 'xxxx')
+        self.cache.put('b', 'x' * 11)
+        self.assertEqual(self.cache.get('b'), None)
+        self.assertEqual(self.cache.get('a'), 'xxxx')
+        # former value of key is removed even if new one is not kept
+        self.cache.put('a', 'x' * 11)
+        self.assertEqual(self.cache.get('a'), None)
+        self.assertEqual((len(self.cache), self.cache.bytes), (0, 0))
+        self.assertEqual(self.cache.evictions, 0)
+
+    def test_resize(self):
+        for key in 'abcde':
+            self.cache.put(key, 'xx')
+        self.cache.resize(5)
+        self.assertEqual(list(self.cache._entries), ['d', 'e'])
+        self.assertEqual(self.cache.bytes, 4)
+        self.assertEqual(self.cache.evictions, 3)
+        self.cache.put('f', 'xx')
+        self.assertEqual(list(self.cache._entries), ['e', 'f'])
+
+    def test_generation(self):
+        cache = query_cache.ResultCache()
+        params = {'q': 'quiet cabin', 'k': '10'}
+        key = cache.key('first', 'ranked', params)
+        cache.put(key, [[1.5, 3]])
+        self.assertEqual(cache.get(cache.key('first', 'ranked', params)),
+                         [[1.5, 3]])
+        other_key = cache.key('second', 'ranked', params)
+        self.assertNotEqual(other_key, key)
+        self.assertEqual(len(cache), 0)
+        self.assertEqual(cache.get(key), None)
+
+    def test_normalize_query(self):
+        self.assertEqual(
+            query_cache.normalize_query('ranked', {'q': 'Quiet  CABIN!',
+                                                   'k': '5'}),
+            query_cache.normalize_query('ranked', {'q': 'quiet cabin',
+                                                   'k': '5'}))
+        self.assertNotEqual(
+            query_cache.normalize_query('ranked', {'q': 'quiet cabin',
+                                                   'k': '5'}),
+            query_cache.normalize_query('ranked', {'q': 'quiet cabin',
+                                                   'k': '10'}))
+
+    @unittest.skipUnless(nltk_data_available(), 'nltk data is not installed')
+    def test_normalize_query_analyzer(self):
+        analyzer = tokenizers_normalizer.Analyzer([])
+        self.assertEqual(
+            query_cache.normalize_query('ranked', {'q': 'Quiet  CABIN!'},
+                                        analyzer),
+            query_cache.normalize_query('ranked', {'q': 'quiet cabin'},
+                                        analyzer))
+
+
+class SpellingIndexTest(unittest.TestCase):
+    """fuzzy lookup of terms by symmetric delete
+    """
+
+    def setUp(self):
+        self.index = spelling_index.SymSpellIndex(
+            [('engine', 5), ('engines', 2), ('gasoline', 3), ('seat', 4),
+             ('seats', 1)])
+
+    def test_lookup(self):
+        self.assertEqual(self.index.lookup('Engien'),
+                         [('engine', 1, 5), ('engines', 2, 2)])
+        self.assertEqual(self.index.lookup('sseat', max_distance=1),
+                         [('seat', 1, 4)])
+        self.assertEqual(self.index.lookup('xyz'), [])
+
+    def test_time_budget(self):
+        # budget is spent before first candidate is verified
+        self.assertEqual(self.index.lookup('engien', time_budget_ms=-1), [])
+        self.assertEqual(self.index.lookup('engien', time_budget_ms=1000),
+                         self.index.lookup('engien'))
+
+
+class WildcardIndexTest(unittest.TestCase):
+    """expansion of wildcard patterns by k-gram index is same as matching
+    whole vocabulary
+    """
+
+    TERMS = ['a', 'ab', 'abs', 'awkward', 'babbled', 'bad', 'brand', 'car',
+             'care', 'cargo', 'cheer', 'cur', 'darkness', 'hybrid', 'hybird',
+             'kindness', 'nessie', 'race', 'scar', 'transaction',
+             'transmission', 'trim', 'van']
+
+    PATTERNS = ['*ness', 'tran*ion', 'h*b*d', 'c?r', 'c?r*', '?', '??',
+                'a*', '*', '**', 'ca', 'car', '*a', 'a*b', '*ar*', '?a?',
+                'b*d', '*s*s*', 'x*', '']
+
+    def test_expand(self):
+        for k in (2, 3, 4):
+            index = wildcard_index.KGramIndex(self.TERMS, k)
+            for pattern in self.PATTERNS:
+                self.assertEqual(
+                    index.expand(pattern),
+                    [term for term in sorted(self.TERMS)
+                     if fnmatch.fnmatchcase(term, pattern)],
+                    'k={} pattern={!r}'.format(k, pattern))
+
+
+if __name__ == '__main__':
+    unittest.main()
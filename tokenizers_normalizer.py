@@ -2,7 +2,9 @@
 # -*- encoding: utf8 -*-
 """read json file stored by parser and tokenized and normalized them and write
 in preprocessed directory
-module run thread to number of json file
+module run thread to number of json file, or split documents to chunks and
+preprocess them by a pool of worker processes
+queries are normalized by same analyzer, so their terms are as in index
     __author__ = "Erfan Rahnemoon"
     __version__ = "0.0.1"
     __maintainer__ = "Erfan Rahnemoon"
@@ -11,19 +13,40 @@ module run thread to number of json file
 """
 
 
+import itertools
 import json
 import os
+import re
 import sys
-from threading import Thread
+from multiprocessing import Pool, cpu_count
+from threading import Lock, Thread
 
 import nltk
-from nltk import pos_tag
+from nltk import pos_tag_sents
 from nltk.corpus import wordnet
 from nltk.stem import PorterStemmer, WordNetLemmatizer
-from nltk.tokenize import RegexpTokenizer
 
 from json_autoarray import JSONAutoArray
 
+import metrics
+import query_cache
+
+# number of documents tagged by one call of tagger
+TAG_BATCH_SIZE = 64
+# lemma of each (token, tag) is computed once per run
+LEMMA_CACHE = {}
+BASE_ADDRESS = 'data-files/json_data/cars/'
+PATH_STOP_WORDS = 'data-files/stopwords.txt'
+IGNORE_KEYS = ('docID', 'root', 'date')
+# analyzer of each worker process
+WORKER_STATE = {}
+# queries with fewer tokens are normalized without tagger
+QUERY_TAG_MIN_TOKENS = 6
+QUERY_CACHE_BYTES = 4 * 1024 * 1024
+# analyzer of queries, made once per process
+QUERY_STATE = {}
+QUERY_STATE_LOCK = Lock()
+
 
 def read_json(path_base):
     """read json file
@@ -57,7 +80,8 @@ def read_stop_word(path_to_file):
 
 def lemmatizer_fun(lemmatizer, token, token_tag=None):
     """lemmatize token with tag of token in sentence
-    if token has not tag lemmatized With no tag method
+    if token has not tag lemmatized With no tag method, result of each token
+    and tag is memoized in LEMMA_CACHE
 
     Arguments:
         lemmatizer {obj} -- instance of WordNetLemmatizer
@@ -70,24 +94,15 @@ def lemmatizer_fun(lemmatizer, token, token_tag=None):
         str -- lemmatized token
     """
 
-    if token_tag is None:
-        return lemmatizer.lemmatize(token)
-
-    return lemmatizer.lemmatize(token, pos=token_tag)
-
-
-def stemmer_fun(stemmer, token):
-    """stemming token by porter one algoritm
-
-    Arguments:
-        stemmer {obj} -- instance of PorterStemmer
-        token {str} -- token
-
-    Returns:
-        str -- stemmed token
-    """
-
-    return stemmer.stem(token)
+    key = (token, token_tag)
+    lemma = LEMMA_CACHE.get(key)
+    if lemma is None:
+        if token_tag is None:
+            lemma = lemmatizer.lemmatize(token)
+        else:
+            lemma = lemmatizer.lemmatize(token, pos=token_tag)
+        LEMMA_CACHE[key] = lemma
+    return lemma
 
 
 def get_wordnet_pos(treebank_tag):
@@ -111,191 +126,472 @@ def get_wordnet_pos(treebank_tag):
     return None
 
 
-def add_position_to_list_token(list_tokens):
-    """add postion of each token in list of token
+class Token(object):
+    """token of a document with its wordnet tag and position
+    """
+
+    __slots__ = ('text', 'tag', 'position')
+
+    def __init__(self, text, position):
+        self.text = text
+        self.tag = None
+        self.position = position
+
+
+class Analyzer(object):
+    """reusable tokenizer and normalizer of documents and queries, stop words
+    are kept in a frozenset and token pattern is compiled once; tokenizing
+    and positioning are done in one pass, and stop word removal and
+    normalization in another pass after batch tagging
+
+    short queries have no context for tagger, so each token is normalized to
+    its lemmas as noun, verb, adjective and adverb and lemma which is in
+    index is chosen; longer queries are tagged like documents. analyzed
+    queries are memoized
+    """
+
+    TOKEN_PATTERN = re.compile(r'[a-zA-Z]+')
+
+    def __init__(self, stop_words, lemmatizer=None, stemmer=None,
+                 bool_lemmatizing=True, bool_stemming=False,
+                 ignore_keys=IGNORE_KEYS,
+                 query_cache_bytes=QUERY_CACHE_BYTES):
+        self.stop_words = frozenset(stop_words)
+        self.lemmatizer = lemmatizer or WordNetLemmatizer()
+        self.stemmer = stemmer or PorterStemmer()
+        self.bool_lemmatizing = bool_lemmatizing
+        self.bool_stemming = bool_stemming
+        self.ignore_keys = frozenset(ignore_keys)
+        self.query_cache = query_cache.LRUCache(query_cache_bytes)
+
+    @metrics.timed('normalizer.tokenize')
+    def tokenize(self, doc):
+        """tokenize all fields of document and give position to tokens
+
+        Arguments:
+            doc {dictionary} -- dictionary of all part of document
+
+        Returns:
+            list -- list of Token
+        """
+
+        tokens = []
+        findall = self.TOKEN_PATTERN.findall
+        for key, item in doc.iteritems():
+            if key not in self.ignore_keys and item is not None:
+                for text in findall(item.lower()):
+                    tokens.append(Token(text, len(tokens)))
+        return tokens
+
+    @metrics.timed('normalizer.pos_tag')
+    def tag(self, list_docs_tokens):
+        """tag tokens of a batch of documents by one call of tagger
+
+        Arguments:
+            list_docs_tokens {list} -- list of Token list of each document
+        """
+
+        list_docs_tags = pos_tag_sents([[token.text for token in tokens]
+                                        for tokens in list_docs_tokens])
+        for tokens, tags in zip(list_docs_tokens, list_docs_tags):
+            for token, (_, tag) in zip(tokens, tags):
+                token.tag = get_wordnet_pos(tag)
+
+    @metrics.timed('normalizer.lemmatize')
+    def normalize(self, tokens):
+        """remove stop words and normalize remained tokens
+
+        Arguments:
+            tokens {list} -- list of tagged Token
+
+        Returns:
+            list -- list of (normalized token, position)
+        """
+
+        stop_words = self.stop_words
+        normalize_token = self.normalize_token
+        return [(normalize_token(token.text, token.tag), token.position)
+                for token in tokens if token.text not in stop_words]
+
+    def normalize_token(self, text, tag=None):
+        """normalize one token by stemming or lemmatizing
+
+        Arguments:
+            text {str} -- lower case token
+
+        Keyword Arguments:
+            tag {str} -- wordnet tag of token (default: {None})
+
+        Returns:
+            str -- normalized token
+        """
+
+        if self.bool_stemming:
+            return self.stemmer.stem(text)
+        if self.bool_lemmatizing:
+            return lemmatizer_fun(self.lemmatizer, text, tag)
+        return text
+
+    def token_candidates(self, text):
+        """normalized forms of a token without its tag, lemma with no tag
+        (noun) first then lemma as verb, adjective and adverb, and token
+        itself at last
+
+        Arguments:
+            text {str} -- lower case token
+
+        Returns:
+            tuple -- distinct normalized forms
+        """
+
+        tags = (None,)
+        if self.bool_lemmatizing and not self.bool_stemming:
+            tags = (None, wordnet.VERB, wordnet.ADJ, wordnet.ADV)
+        candidates = []
+        for tag in tags:
+            candidate = self.normalize_token(text, tag)
+            if candidate not in candidates:
+                candidates.append(candidate)
+        if text not in candidates:
+            candidates.append(text)
+        return tuple(candidates)
+
+    def query_tokens(self, query):
+        """tokenize query and normalize its tokens, stop words are removed
+        but keep their position like in documents; tokens of short query
+        have all their candidate forms and tokens of long query are tagged
+        and have one form. result is memoized
+
+        Arguments:
+            query {str} -- text of query
+
+        Returns:
+            tuple -- (tuple of candidate terms, position) of each token
+        """
+
+        result = self.query_cache.get(query)
+        if result is not None:
+            return result
+        tokens = [Token(text, position) for position, text
+                  in enumerate(self.TOKEN_PATTERN.findall(query.lower()))]
+        if len(tokens) >= QUERY_TAG_MIN_TOKENS:
+            self.tag([tokens])
+            result = tuple(((text,), position) for text, position
+                           in self.normalize(tokens))
+        else:
+            result = tuple((self.token_candidates(token.text), token.position)
+                           for token in tokens
+                           if token.text not in self.stop_words)
+        self.query_cache.put(query, result)
+        return result
+
+    def analyze_query(self, query, vocabulary=None):
+        """terms of query as they are in index with their position
+
+        Arguments:
+            query {str} -- text of query
+
+        Keyword Arguments:
+            vocabulary {obj} -- terms of index, like reader of inverted
+            index; first candidate form which is in it is chosen, or first
+            form if none is (default: {None})
+
+        Returns:
+            list -- list of (term, position)
+        """
+
+        terms = []
+        for candidates, position in self.query_tokens(query):
+            term = candidates[0]
+            if vocabulary is not None:
+                for candidate in candidates:
+                    if candidate in vocabulary:
+                        term = candidate
+                        break
+            terms.append((term, position))
+        return terms
+
+    def preprocess_documents(self, list_documents, root):
+        """tokenize and normalize a batch of documents
+
+        Arguments:
+            list_documents {list} -- list of document dictionaries made by
+            parser
+            root {str} -- name of root file of documents
+
+        Returns:
+            list -- list of preprocessed document dictionaries
+        """
+
+        list_docs_tokens = [self.tokenize(dic_document)
+                            for dic_document in list_documents]
+        self.tag(list_docs_tokens)
+        list_preprocessed = [{
+            "doc_id": dic_document['docID'],
+            "root": root,
+            "list_of_token": self.normalize(tokens)
+        } for dic_document, tokens in zip(list_documents, list_docs_tokens)]
+        if metrics.ENABLED:
+            metrics.count('normalizer.docs', len(list_documents))
+            metrics.count('normalizer.tokens',
+                          sum(len(tokens) for tokens in list_docs_tokens))
+            metrics.gauge('normalizer.lemma_cache', len(LEMMA_CACHE))
+        return list_preprocessed
+
+
+def preprocessed_path(file_name, base_address=BASE_ADDRESS):
+    """path of preprocessed file for a parsed json file, make preprocessed
+    directory if does not exist
 
     Arguments:
-        list_tokens {list} -- list of token
+        file_name {str} -- name of json file which parser stored them
+
+    Keyword Arguments:
+        base_address {str} -- directory of parsed and preprocessed
+        directories (default: {BASE_ADDRESS})
 
     Returns:
-        list -- list of token with postion of each token
+        str -- path to write preprocessed file
     """
 
-    list_tokens_pos = []
-    postion = 0
-    for token in list_tokens:
-        list_tokens_pos.append((token, postion))
-        postion += 1
-    return list_tokens_pos
+    if not os.path.isdir(base_address+'preprocessed/'):
+        try:
+            os.mkdir(base_address+'preprocessed/')
+        except OSError:
+            if not os.path.isdir(base_address+'preprocessed/'):
+                raise
+    return base_address+'preprocessed/'+file_name
 
 
-def add_postion_tag_to_token(list_tokens_pos):
-    """add tag of each token in list of token
+def tokenizer_normalizer(lemmatizer, stemmer, file_name, list_stop_words,
+                         base_address=BASE_ADDRESS):
+    """read json file stored by parser and tokenized and normalized them after
+    this store each document dictionary in json by serial json writer
 
     Arguments:
-        list_tokens_pos {list} -- list of token and position
+        lemmatizer {obj} -- instance of WordNetLemmatizer
+        stemmer {obj} -- instance of PorterStemmer
+        file_name {str} -- path to json file which parser stored them
+        list_stop_words {list} -- list of all stop words
 
-    Returns:
-        list -- list of token, postion, and tag for each token
+    Keyword Arguments:
+        base_address {str} -- directory of parsed and preprocessed
+        directories (default: {BASE_ADDRESS})
     """
 
-    list_tokens_pos_tag = []
-    for token, pos in list_tokens_pos:
-        list_tokens_pos_tag.append((token,
-                                    get_wordnet_pos(pos_tag([token])[0][1]),
-                                    pos))
-    return list_tokens_pos_tag
+    print file_name
+    analyzer = Analyzer(list_stop_words, lemmatizer, stemmer)
+    with metrics.timer('normalizer.read_json'):
+        conten = read_json(base_address+'parsed/'+file_name)
+    # json sreial writer
+    with JSONAutoArray.ArrayWriter(
+            preprocessed_path(file_name, base_address)) as json_streamer:
+        for start in xrange(0, len(conten), TAG_BATCH_SIZE):
+            for dic_doc_tokens in analyzer.preprocess_documents(
+                    conten[start:start + TAG_BATCH_SIZE], file_name):
+                with metrics.timer('normalizer.write_json'):
+                    json_streamer.write(dic_doc_tokens)
 
 
-def remove_stop_word(list_of_token, list_of_stop_word):
-    """remove stop word from list of token
+def init_worker(path_stop_words):
+    """make analyzer with its lemmatizer, stemmer and stop words once for
+    each worker process
 
     Arguments:
-        list_of_token {list} -- list of tokens
-        list_of_stop_word {list} -- list of all stop words
-
-    Returns:
-        list -- list of token without stopwords
+        path_stop_words {str} -- path to file contain stop word
     """
 
-    filtered_tokens = []
-    for token in list_of_token:
-        if token[0] not in list_of_stop_word:
-            filtered_tokens.append(token)
-    return filtered_tokens
+    reload(sys)
+    sys.setdefaultencoding('cp1252')
+    WORKER_STATE['analyzer'] = Analyzer(read_stop_word(path_stop_words))
+    wordnet.ensure_loaded()
 
 
-def tokenizer(doc, ignore_keys):
-    """tokeize text by regex tokenizer
+def preprocess_chunk(file_name_chunk):
+    """preprocess a chunk of documents in worker process
 
     Arguments:
-        doc {dictionary} -- dictionary of all part of document
-        ignore_keys {list} -- keys must be ignored from dictionary of document
+        file_name_chunk {tuple} -- name of json file and list of documents
 
     Returns:
-        list -- list of tokens
+        (str, list) -- name of json file and list of preprocessed documents
     """
 
-    list_of_token = []
-    for key, item in doc.iteritems():
-        if key not in ignore_keys and item is not None:
-            tokenizer_engine = RegexpTokenizer(r'[a-zA-Z]+')
-            list_of_token.extend(tokenizer_engine.tokenize(item.lower()))
+    file_name, list_documents = file_name_chunk
+    return file_name, WORKER_STATE['analyzer'].preprocess_documents(
+        list_documents, file_name)
 
-    return list_of_token
 
-
-def normalization(lemmatizer, stemmer,
-                  list_token_tag_pos,
-                  bool_lemmatizing=True,
-                  bool_stemming=False):
-    """normalized each token in list of [token, tag, postion] which can be done
-    by lemmatization and stemmation
+def iter_chunks(list_file_names, chunk_size, base_address=BASE_ADDRESS):
+    """read parsed json files one after another and split their documents to
+    chunks, a file without document is one empty chunk so its preprocessed
+    file is written like serial run
 
     Arguments:
-        lemmatizer {obj} -- instance of WordNetLemmatizer
-        stemmer {obj} -- instance of PorterStemmer
-        list_token_tag_pos {list} -- list contain token, tag, position
+        list_file_names {list} -- names of json files which parser stored them
+        chunk_size {int} -- number of documents in each chunk
 
     Keyword Arguments:
-        bool_lemmatizing {bool} -- use lemmatizing for normalization
-        (default: {True})
-        bool_stemming {bool} -- use stemming for normalization
-        (default: {False})
+        base_address {str} -- directory of parsed directory
+        (default: {BASE_ADDRESS})
 
     Returns:
-        list -- list of token, postion which tokes are normalized
+        generator -- (file name, list of documents) for each chunk
     """
 
-    list_result = []
-    if bool_lemmatizing:
-        lemmatized_tokens = []
-        for token_tag_pos in list_token_tag_pos:
-            if token_tag_pos[1] is not None:
-                # lemmatizing with token tag
-                lemmatized_tokens.append((lemmatizer_fun(lemmatizer,
-                                                         token_tag_pos[0],
-                                                         token_tag_pos[1]),
-                                          token_tag_pos[2]))
-            else:
-                # lemmatizing without token tag
-                lemmatized_tokens.append((lemmatizer_fun(lemmatizer,
-                                          token_tag_pos[0]),
-                                          token_tag_pos[2]))
-        list_result = lemmatized_tokens
-        lemmatized_tokens = None
-    # stemming
-    if bool_stemming:
-        stemmed_tokens = []
-        for token_tag_pos in list_token_tag_pos:
-            stemmed_tokens.append((stemmer_fun(stemmer, token_tag_pos[0]),
-                                  token_tag_pos[2]))
-        list_result = stemmed_tokens
-        stemmed_tokens = None
-
-    return list_result
-
-
-def tokenizer_normalizer(lemmatizer, stemmer, file_name, list_stop_words):
-    """read json file stored by parser and tokenized and normalized them after
-    this store each document dictionary in json by serial json writer
+    for file_name in list_file_names:
+        print file_name
+        conten = read_json(base_address+'parsed/'+file_name)
+        if not conten:
+            yield file_name, []
+        for start in xrange(0, len(conten), chunk_size):
+            yield file_name, conten[start:start + chunk_size]
+
+
+def tokenizer_normalizer_pool(list_file_names, workers,
+                              chunk_size=TAG_BATCH_SIZE,
+                              base_address=BASE_ADDRESS):
+    """preprocess json files by a pool of worker processes, work is split by
+    chunks of documents and results are written in order of chunks so output
+    is same as serial run
 
     Arguments:
-        lemmatizer {obj} -- instance of WordNetLemmatizer
-        stemmer {obj} -- instance of PorterStemmer
-        file_name {str} -- path to json file which parser stored them
-        list_stop_words {list} -- list of all stop words
+        list_file_names {list} -- names of json files which parser stored them
+        workers {int} -- number of worker processes
+
+    Keyword Arguments:
+        chunk_size {int} -- number of documents in each chunk
+        (default: {TAG_BATCH_SIZE})
+        base_address {str} -- directory of parsed and preprocessed
+        directories (default: {BASE_ADDRESS})
     """
 
-    print file_name
-    base_address = 'data-files/json_data/cars/'
-    conten = read_json(base_address+'parsed/'+file_name)
-    # if directory does not exist make it
-    if not os.path.isdir(base_address+'preprocessed/'):
-        os.mkdir(base_address+'preprocessed/')
-    address_write_preprocessed = base_address+'preprocessed/'+file_name
-    # json sreial writer
-    with JSONAutoArray.ArrayWriter(address_write_preprocessed) as json_streamer:
-        for dic_document in conten:
-            tokens = tokenizer(dic_document, ['docID', 'root', 'date'])
-            tokens = add_position_to_list_token(tokens)
-            filter_token = remove_stop_word(tokens, list_stop_words)
-            token_tag_pos = add_postion_tag_to_token(filter_token)
-            dic_doc_tokens = {
-                "doc_id": dic_document['docID'],
-                "root": file_name,
-                "list_of_token": normalization(lemmatizer,
-                                               stemmer,
-                                               token_tag_pos)
-            }
-            json_streamer.write(dic_doc_tokens)
-
-
-def make_preprocessed_file():
-    """start tokenizer_normalizer by path of json file and read stop words
-    after this for each json file run thread and store preprocessed file
+    pool = Pool(workers, initializer=init_worker,
+                initargs=(PATH_STOP_WORDS,))
+    try:
+        iter_results = pool.imap(preprocess_chunk,
+                                 iter_chunks(list_file_names, chunk_size,
+                                             base_address))
+        for file_name, iter_chunk_results in itertools.groupby(
+                iter_results, key=lambda result: result[0]):
+            # ArrayWriter writes brackets of array just as context manager
+            with JSONAutoArray.ArrayWriter(
+                    preprocessed_path(file_name,
+                                      base_address)) as json_streamer:
+                for _, list_docs in iter_chunk_results:
+                    for dic_doc_tokens in list_docs:
+                        with metrics.timer('normalizer.write_json'):
+                            json_streamer.write(dic_doc_tokens)
+        pool.close()
+    finally:
+        pool.terminate()
+        pool.join()
+
+
+def prepare_nltk():
+    """set default encoding and download nltk data if they are not available
     """
 
     reload(sys)
     sys.setdefaultencoding('cp1252')
-    stop_words = read_stop_word('data-files/stopwords.txt')
     try:
         nltk.data.find('corpora/brown')
         nltk.data.find('tokenizers/punkt')
         nltk.data.find('corpora/wordnet')
+        nltk.data.find('taggers/averaged_perceptron_tagger')
     except LookupError:
         nltk.download('brown')
         nltk.download('punkt')
         nltk.download('wordnet')
+        nltk.download('averaged_perceptron_tagger')
+
+
+def iter_preprocessed(iter_root_docs, batch_size=TAG_BATCH_SIZE):
+    """tokenize and normalize a stream of documents batch by batch, so just
+    one batch of documents is in memory at a time
+
+    Arguments:
+        iter_root_docs {iterable} -- (root, dictionary of document) pairs
+
+    Keyword Arguments:
+        batch_size {int} -- number of documents tagged together
+        (default: {TAG_BATCH_SIZE})
+
+    Returns:
+        generator -- preprocessed document dictionaries
+    """
+
+    prepare_nltk()
+    analyzer = Analyzer(read_stop_word(PATH_STOP_WORDS))
+    wordnet.ensure_loaded()
+    batch = []
+    current_root = None
+    for root, dic_document in iter_root_docs:
+        if batch and (root != current_root or len(batch) == batch_size):
+            for dic_doc_tokens in analyzer.preprocess_documents(batch,
+                                                                current_root):
+                yield dic_doc_tokens
+            batch = []
+        current_root = root
+        batch.append(dic_document)
+    if batch:
+        for dic_doc_tokens in analyzer.preprocess_documents(batch,
+                                                            current_root):
+            yield dic_doc_tokens
+
+
+def query_analyzer(path_stop_words=PATH_STOP_WORDS):
+    """analyzer of queries, made once per process and shared by threads of
+    search server
+
+    Keyword Arguments:
+        path_stop_words {str} -- path to file contain stop word
+        (default: {PATH_STOP_WORDS})
+
+    Returns:
+        obj -- instance of Analyzer
+    """
+
+    with QUERY_STATE_LOCK:
+        if 'analyzer' not in QUERY_STATE:
+            prepare_nltk()
+            analyzer = Analyzer(read_stop_word(path_stop_words))
+            wordnet.ensure_loaded()
+            QUERY_STATE['analyzer'] = analyzer
+    return QUERY_STATE['analyzer']
+
+
+@metrics.profiled('normalizer.make_preprocessed_file')
+@metrics.timed('normalizer.make_preprocessed_file', memory=True)
+def make_preprocessed_file(workers=None, base_address=BASE_ADDRESS):
+    """start tokenizer_normalizer by path of json file and read stop words
+    after this for each json file run thread and store preprocessed file,
+    if number of workers is given preprocess files by pool of processes
+
+    Keyword Arguments:
+        workers {int} -- number of worker processes, 0 for number of cpu
+        cores and None for one thread per json file (default: {None})
+        base_address {str} -- directory of parsed and preprocessed
+        directories (default: {BASE_ADDRESS})
+    """
+
+    prepare_nltk()
+    stop_words = read_stop_word(PATH_STOP_WORDS)
+    list_file_names = sorted(os.listdir(base_address+'parsed'))
+    if workers is not None:
+        tokenizer_normalizer_pool(list_file_names, workers or cpu_count(),
+                                  base_address=base_address)
+        return
     wordnet_lemmatizer = WordNetLemmatizer()
     porter_stemmer = PorterStemmer()
     wordnet.ensure_loaded()
     list_thread = []
-    for data_file in os.listdir('data-files/json_data/cars/parsed'):
+    for data_file in list_file_names:
         # for each json file run thread
         list_thread.append(Thread(target=tokenizer_normalizer,
                                   args=(wordnet_lemmatizer, porter_stemmer,
-                                        data_file, stop_words)))
+                                        data_file, stop_words,
+                                        base_address)))
     for thread in list_thread:
         thread.start()
     for thread in list_thread:
@@ -303,4 +599,7 @@ def make_preprocessed_file():
 
 
 if __name__ == '__main__':
-    make_preprocessed_file()
+    if len(sys.argv) > 1:
+        make_preprocessed_file(int(sys.argv[1]))
+    else:
+        make_preprocessed_file()
@@ -0,0 +1,276 @@
+#!/usr/bin/env python
+# -*- encoding: utf8 -*-
+"""array-backed posting lists and vectorized ranked retrieval by numpy
+
+posting list of a term is decoded once to int32 arrays of doc ids and term
+frequencies, positions are kept in CSR style: one int32 array of positions
+of all documents and an offsets array where positions of idx-th document
+are positions[offsets[idx]:offsets[idx + 1]]. scores of all query terms are
+computed by array operations, merged by doc id and best k documents are
+picked by argpartition, so per-posting work is not done by interpreter
+
+    __author__ = "Erfan Rahnemoon"
+    __version__ = "0.0.1"
+    __maintainer__ = "Erfan Rahnemoon"
+    __email__ = "erfan@rahnemoon.name"
+"""
+import numpy as np
+
+import query_cache
+import ranking
+
+ARRAY_CACHE_BYTES = 64 * 1024 * 1024
+
+
+def bm25_weights(tfs, doc_lengths, avg_doc_length, k1=ranking.BM25_K1,
+                 b=ranking.BM25_B):
+    """BM25 weights of term frequencies in documents, same operations as
+    ranking.bm25_weight so scores are equal
+
+    Arguments:
+        tfs {ndarray} -- frequencies of term in documents
+        doc_lengths {ndarray} -- lengths of documents
+        avg_doc_length {float} -- average length of documents
+
+    Keyword Arguments:
+        k1 {float} -- saturation of term frequency (default: {BM25_K1})
+        b {float} -- strength of length normalization (default: {BM25_B})
+
+    Returns:
+        ndarray -- weights
+    """
+
+    norm = k1 * (1.0 - b + b * doc_lengths / avg_doc_length)
+    return tfs * (k1 + 1.0) / (tfs + norm)
+
+
+def tfidf_weights(tfs, doc_lengths, avg_doc_length):
+    """TF-IDF weights of term frequencies in documents, same operations as
+    ranking.tfidf_weight
+
+    Arguments:
+        tfs {ndarray} -- frequencies of term in documents
+        doc_lengths {ndarray} -- lengths of documents
+        avg_doc_length {float} -- average length of documents
+
+    Returns:
+        ndarray -- weights
+    """
+
+    norm = 1.0 - ranking.BM25_B + ranking.BM25_B * doc_lengths / \
+        avg_doc_length
+    return (1.0 + np.log(tfs)) / norm
+
+
+def term_weights(scorer):
+    """idf function and vectorized weight function of scorer
+
+    Arguments:
+        scorer {str} -- name of scorer, bm25 or tfidf
+
+    Returns:
+        (function, function) -- idf function and weight function
+    """
+
+    idf_fun, _ = ranking.term_scorer(scorer)
+    if scorer == 'bm25':
+        return idf_fun, bm25_weights
+    return idf_fun, tfidf_weights
+
+
+class ArrayPostings(object):
+    """posting list of one term in numpy arrays, positions are decoded to
+    CSR arrays just when they are asked
+    """
+
+    __slots__ = ('doc_ids', 'tfs', '_postings', '_positions',
+                 '_position_offsets')
+
+    def __init__(self, postings):
+        self.doc_ids = np.array(postings.doc_ids, dtype=np.int32)
+        self.tfs = np.array(postings.tfs, dtype=np.int32)
+        self._postings = postings
+        self._positions = None
+        self._position_offsets = None
+
+    def __len__(self):
+        return len(self.doc_ids)
+
+    def _decode_positions(self):
+        offsets = np.zeros(len(self.tfs) + 1, dtype=np.int64)
+        np.cumsum(self.tfs, out=offsets[1:])
+        positions = np.empty(offsets[-1], dtype=np.int32)
+        for idx in xrange(len(self.tfs)):
+            positions[offsets[idx]:offsets[idx + 1]] = \
+                self._postings.positions(idx)
+        self._positions = positions
+        self._position_offsets = offsets
+
+    @property
+    def positions(self):
+        """positions of all documents of posting list one after another
+        """
+
+        if self._positions is None:
+            self._decode_positions()
+        return self._positions
+
+    @property
+    def position_offsets(self):
+        """start of positions of each document in positions, and their end
+        as last item
+        """
+
+        if self._position_offsets is None:
+            self._decode_positions()
+        return self._position_offsets
+
+    def doc_positions(self, idx):
+        """positions of idx-th doc of posting list
+
+        Arguments:
+            idx {int} -- index of doc in posting list (not doc id)
+
+        Returns:
+            ndarray -- sorted positions of term in doc
+        """
+
+        offsets = self.position_offsets
+        return self.positions[offsets[idx]:offsets[idx + 1]]
+
+    def nbytes(self):
+        """size of arrays in bytes
+
+        Returns:
+            int -- size in bytes
+        """
+
+        size = self.doc_ids.nbytes + self.tfs.nbytes
+        if self._positions is not None:
+            size += self._positions.nbytes + self._position_offsets.nbytes
+        return size
+
+
+class ArrayIndex(object):
+    """numpy view of reader of inverted index, lengths of documents are in
+    an array indexed by doc id and posting lists of recently used terms are
+    kept as arrays in a cache bounded by bytes
+    """
+
+    def __init__(self, inverted_index, max_bytes=ARRAY_CACHE_BYTES):
+        self.inverted_index = inverted_index
+        self.num_docs = inverted_index.num_docs
+        self.avg_doc_length = inverted_index.avg_doc_length
+        docs = list(inverted_index.iter_docs())
+        max_doc_id = max(doc_id for doc_id, _, _ in docs) if docs else -1
+        self.doc_lengths = np.zeros(max_doc_id + 1, dtype=np.float64)
+        for doc_id, _, length in docs:
+            self.doc_lengths[doc_id] = length
+        self.array_cache = query_cache.LRUCache(
+            max_bytes, lambda postings: postings.nbytes())
+
+    def term_info(self, term):
+        """statistics of term
+
+        Arguments:
+            term {str} -- token
+
+        Returns:
+            TermInfo -- information of term or None if term is not in index
+        """
+
+        return self.inverted_index.term_info(term)
+
+    def postings(self, term):
+        """posting list of term in arrays, from cache or decoded from index
+
+        Arguments:
+            term {str} -- token
+
+        Returns:
+            ArrayPostings -- posting list or None if term is not in index
+        """
+
+        postings = self.array_cache.get(term)
+        if postings is None:
+            posting_list = self.inverted_index.posting_list(term)
+            if posting_list is None:
+                return None
+            postings = ArrayPostings(posting_list)
+            self.array_cache.put(term, postings)
+        return postings
+
+
+def top_k(k, doc_ids, scores):
+    """k best documents, on same score smaller doc id wins like ranking.top_k;
+    argpartition finds score of k-th document and just documents not worse
+    than it are sorted
+
+    Arguments:
+        k {int} -- number of results
+        doc_ids {ndarray} -- doc ids
+        scores {ndarray} -- score of each doc id
+
+    Returns:
+        list -- (score, doc_id) of best documents sorted by score
+    """
+
+    if k <= 0 or not len(doc_ids):
+        return []
+    if len(doc_ids) > k:
+        kth_score = scores[np.argpartition(-scores, k - 1)[k - 1]]
+        candidates = scores >= kth_score
+        doc_ids = doc_ids[candidates]
+        scores = scores[candidates]
+    # last key of lexsort is primary
+    order = np.lexsort((doc_ids, -scores))[:k]
+    return [(float(scores[idx]), int(doc_ids[idx])) for idx in order]
+
+
+def rank_vectorized(array_index, terms, k=10, scorer='bm25', stats=None):
+    """score all documents contain any term of query by array operations and
+    return k best of them, scores are same as ranking.rank
+
+    scores of each term are computed for its whole posting list at once,
+    then postings of all terms are merged by sorted doc ids and scores of
+    each doc are summed by bincount in order of terms
+
+    Arguments:
+        array_index {ArrayIndex} -- numpy view of inverted index
+        terms {list} -- terms of query
+
+    Keyword Arguments:
+        k {int} -- number of results (default: {10})
+        scorer {str} -- name of scorer, bm25 or tfidf (default: {'bm25'})
+        stats {dictionary} -- if given number of scored postings is stored in
+        it as postings_scored (default: {None})
+
+    Returns:
+        list -- (score, doc_id) of best documents sorted by score
+    """
+
+    idf_fun, weights_fun = term_weights(scorer)
+    list_doc_ids = []
+    list_scores = []
+    for term in terms:
+        info = array_index.term_info(term)
+        if info is None:
+            continue
+        postings = array_index.postings(term)
+        idf = idf_fun(array_index.num_docs, info.number_of_doc)
+        list_doc_ids.append(postings.doc_ids)
+        list_scores.append(idf * weights_fun(
+            postings.tfs, array_index.doc_lengths[postings.doc_ids],
+            array_index.avg_doc_length))
+    if stats is not None:
+        stats['postings_scored'] = sum(len(doc_ids)
+                                       for doc_ids in list_doc_ids)
+    if not list_doc_ids:
+        return []
+    if len(list_doc_ids) == 1:
+        return top_k(k, list_doc_ids[0], list_scores[0])
+    doc_ids, inverse = np.unique(np.concatenate(list_doc_ids),
+                                 return_inverse=True)
+    scores = np.bincount(inverse, weights=np.concatenate(list_scores),
+                         minlength=len(doc_ids))
+    return top_k(k, doc_ids, scores)
@@ -0,0 +1,195 @@
+#!/usr/bin/env python
+# -*- encoding: utf8 -*-
+"""wildcard index over vocabulary of inverted index, '*' matches any number of
+characters and '?' matches one character, like "*mobile", "tran*ion" or
+"hy*r*d"
+
+terms are padded by '$' and each k-gram of them points to sorted ids of terms
+contain it; k-grams of literal parts of pattern are intersected smallest
+first, literal prefix of pattern limits ids to a range of sorted vocabulary,
+and candidates are filtered by regular expression of pattern since k-grams
+do not keep their order
+
+    __author__ = "Erfan Rahnemoon"
+    __version__ = "0.0.1"
+    __maintainer__ = "Erfan Rahnemoon"
+    __email__ = "erfan@rahnemoon.name"
+"""
+import heapq
+import re
+from array import array
+from bisect import bisect_left
+
+import boolean_query
+
+BOUNDARY = '$'
+WILDCARDS = re.compile(r'([*?])')
+
+
+def pattern_regex(pattern):
+    """compile wildcard pattern to regular expression match whole term
+
+    Arguments:
+        pattern {str} -- wildcard pattern
+
+    Returns:
+        obj -- compiled regular expression
+    """
+
+    parts = []
+    for part in WILDCARDS.split(pattern):
+        if part == '*':
+            parts.append('.*')
+        elif part == '?':
+            parts.append('.')
+        else:
+            parts.append(re.escape(part))
+    return re.compile(''.join(parts) + r'\Z', re.DOTALL)
+
+
+def literal_prefix(pattern):
+    """part of pattern before first wildcard
+
+    Arguments:
+        pattern {str} -- wildcard pattern
+
+    Returns:
+        str -- literal prefix
+    """
+
+    return WILDCARDS.split(pattern, 1)[0]
+
+
+class KGramIndex(object):
+    """k-gram index of sorted vocabulary
+    """
+
+    def __init__(self, terms, k=3):
+        self.k = k
+        self.terms = sorted(str(term) for term in terms)
+        self.grams = {}
+        for term_id, term in enumerate(self.terms):
+            for gram in set(self.term_grams(BOUNDARY + term + BOUNDARY)):
+                term_ids = self.grams.get(gram)
+                if term_ids is None:
+                    term_ids = self.grams[gram] = array('I')
+                term_ids.append(term_id)
+
+    def __len__(self):
+        return len(self.terms)
+
+    def term_grams(self, text):
+        """k-grams of text
+
+        Arguments:
+            text {str} -- padded term or literal part of pattern
+
+        Returns:
+            list -- k-grams of text, empty if text is shorter than k
+        """
+
+        return [text[idx:idx + self.k]
+                for idx in xrange(len(text) - self.k + 1)]
+
+    def pattern_grams(self, pattern):
+        """k-grams every term match pattern must contain
+
+        Arguments:
+            pattern {str} -- wildcard pattern
+
+        Returns:
+            set -- k-grams of literal parts of padded pattern
+        """
+
+        grams = set()
+        for part in WILDCARDS.split(BOUNDARY + pattern + BOUNDARY):
+            if part not in ('*', '?'):
+                grams.update(self.term_grams(part))
+        return grams
+
+    def prefix_range(self, prefix):
+        """range of ids of terms start with prefix
+
+        Arguments:
+            prefix {str} -- literal prefix
+
+        Returns:
+            (int, int) -- first id and id after last one
+        """
+
+        if not prefix:
+            return 0, len(self.terms)
+        return (bisect_left(self.terms, prefix),
+                bisect_left(self.terms, prefix + '\xff'))
+
+    def candidates(self, pattern):
+        """ids of terms may match pattern
+
+        Arguments:
+            pattern {str} -- wildcard pattern
+
+        Returns:
+            list -- sorted term ids
+        """
+
+        low, high = self.prefix_range(literal_prefix(pattern))
+        list_term_ids = []
+        for gram in self.pattern_grams(pattern):
+            term_ids = self.grams.get(gram)
+            if term_ids is None:
+                return []
+            list_term_ids.append(term_ids)
+        if not list_term_ids:
+            return range(low, high)
+        list_term_ids.sort(key=len)
+        if high - low < len(list_term_ids[0]):
+            result = range(low, high)
+        else:
+            result = list_term_ids.pop(0)
+            result = result[bisect_left(result, low):bisect_left(result, high)]
+        for term_ids in list_term_ids:
+            if not result:
+                break
+            result = boolean_query.intersect(result, term_ids)
+        return result
+
+    def expand(self, pattern):
+        """terms of vocabulary match pattern
+
+        Arguments:
+            pattern {str} -- wildcard pattern
+
+        Returns:
+            list -- sorted terms match pattern
+        """
+
+        regex = pattern_regex(pattern)
+        return [self.terms[term_id] for term_id in self.candidates(pattern)
+                if regex.match(self.terms[term_id])]
+
+
+def wildcard_search(inverted_index, wildcard_index, pattern):
+    """documents contain any term match pattern
+
+    Arguments:
+        inverted_index {obj} -- reader of inverted index
+        wildcard_index {obj} -- k-gram index of vocabulary of inverted index
+        pattern {str} -- wildcard pattern
+
+    Returns:
+        list, list -- sorted terms match pattern and sorted doc ids of
+        documents contain them
+    """
+
+    terms = wildcard_index.expand(pattern.lower())
+    list_doc_ids = []
+    for term in terms:
+        postings = inverted_index.posting_list(term)
+        if postings is not None:
+            list_doc_ids.append(postings.doc_ids)
+    # k-way merge, pairwise union is quadratic for patterns match many terms
+    doc_ids = []
+    for doc_id in heapq.merge(*list_doc_ids):
+        if not doc_ids or doc_ids[-1] != doc_id:
+            doc_ids.append(doc_id)
+    return terms, doc_ids